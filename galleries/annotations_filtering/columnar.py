@@ -0,0 +1,179 @@
+import numbers
+from typing import Any, Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from galleries.annotations_filtering import ComparisonType, comparison_type_functions
+from galleries.annotations_filtering.filter import FilterStatement
+
+
+def _safe_compare(comparison_function, annotation_value, filter_value) -> bool:
+    try:
+        return bool(comparison_function(annotation_value, filter_value))
+    except TypeError:
+        return False
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, numbers.Number) and not isinstance(value, bool)
+
+
+class _NumericColumn:
+    """
+    Column of int or float annotations stored in a numpy array. Comparisons against numbers are numpy operations.
+    """
+
+    def __init__(self, values: np.ndarray):
+        self._values = values
+
+    def compare(self, comparison_type: ComparisonType, filter_value) -> np.ndarray:
+        comparison_function = comparison_type_functions[comparison_type]
+        if _is_number(filter_value) and comparison_type != ComparisonType.CONTAINS:
+            return np.asarray(comparison_function(self._values, filter_value), dtype=bool)
+        values = self._values.tolist()
+        return np.fromiter(
+            (_safe_compare(comparison_function, v, filter_value) for v in values), dtype=bool, count=len(values))
+
+
+class _CategoricalColumn:
+    """
+    Dictionary encoded column of hashable annotations (strings, booleans...). A comparison is evaluated once per
+    distinct value and the result is broadcast to the rows with a lookup of the codes.
+    """
+
+    def __init__(self, categories: list, codes: np.ndarray):
+        self._categories = categories
+        self._codes = codes
+
+    def compare(self, comparison_type: ComparisonType, filter_value) -> np.ndarray:
+        comparison_function = comparison_type_functions[comparison_type]
+        matches = np.fromiter(
+            (_safe_compare(comparison_function, category, filter_value) for category in self._categories),
+            dtype=bool,
+            count=len(self._categories)
+        )
+        return matches[self._codes]
+
+
+class _ObjectColumn:
+    """
+    Column of unhashable annotations (e.g. lists). Comparisons are evaluated row by row.
+    """
+
+    def __init__(self, values: list):
+        self._values = values
+
+    def compare(self, comparison_type: ComparisonType, filter_value) -> np.ndarray:
+        comparison_function = comparison_type_functions[comparison_type]
+        return np.fromiter(
+            (_safe_compare(comparison_function, v, filter_value) for v in self._values),
+            dtype=bool,
+            count=len(self._values)
+        )
+
+
+def _build_column(values: list, present: np.ndarray):
+    present_values = [v for v, p in zip(values, present) if p]
+    if all(_is_number(v) for v in present_values):
+        dtype = np.int64 if all(isinstance(v, numbers.Integral) for v in present_values) else np.float64
+        filled = [v if p else 0 for v, p in zip(values, present)]
+        try:
+            return _NumericColumn(np.array(filled, dtype=dtype))
+        except OverflowError:
+            pass
+    try:
+        categories = {}
+        codes = np.fromiter(
+            (categories.setdefault(v, len(categories)) if p else 0 for v, p in zip(values, present)),
+            dtype=np.int32,
+            count=len(values)
+        )
+        if len(categories) == 0:
+            categories[None] = 0
+        return _CategoricalColumn(list(categories.keys()), codes)
+    except TypeError:
+        return _ObjectColumn(values)
+
+
+class ColumnarAnnotations:
+    """
+    Annotations of a gallery stored by columns, one numpy array per annotation key, so filters are evaluated as boolean
+    mask operations over all the images at once instead of image by image. Statements of a group are combined with AND
+    and groups are combined with OR, as in does_annotations_meets_filter.
+
+    Unlike does_annotations_meets_filter, an image without the annotation of a statement does not meet that statement,
+    negated or not, instead of raising KeyError.
+    """
+
+    def __init__(self, indices: list, columns: Dict[str, Any], present: Dict[str, np.ndarray]):
+        self._indices = indices
+        self._columns = columns
+        self._present = present
+
+    @staticmethod
+    def from_annotations(indices_annots: Iterable[Tuple[Any, dict]]) -> 'ColumnarAnnotations':
+        """
+        Builds the columns from an iterable of (index, annotations) tuples.
+        :param indices_annots:
+        :return:
+        """
+        indices = []
+        rows_values: Dict[str, Dict[int, Any]] = {}
+        for row, (index, annotations) in enumerate(indices_annots):
+            indices.append(index)
+            for key, value in annotations.items():
+                rows_values.setdefault(key, {})[row] = value
+
+        count = len(indices)
+        columns = {}
+        present = {}
+        for key, key_values in rows_values.items():
+            key_present = np.zeros(count, dtype=bool)
+            key_present[list(key_values.keys())] = True
+            values = [key_values.get(row, None) for row in range(count)]
+            columns[key] = _build_column(values, key_present)
+            present[key] = key_present
+        return ColumnarAnnotations(indices, columns, present)
+
+    @property
+    def indices(self) -> list:
+        return self._indices
+
+    def __len__(self):
+        return len(self._indices)
+
+    def get_mask(self, filters: List[List[FilterStatement]] = None) -> np.ndarray:
+        """
+        Returns a boolean array with the images that meet the filters.
+        :param filters:
+        :return:
+        """
+        filters = filters or []
+        if len(filters) == 0:
+            return np.ones(len(self), dtype=bool)
+        mask = np.zeros(len(self), dtype=bool)
+        for and_conditions in filters:
+            group_mask = np.ones(len(self), dtype=bool)
+            for statement in and_conditions:
+                group_mask &= self.get_statement_mask(statement)
+            mask |= group_mask
+        return mask
+
+    def get_statement_mask(self, statement: FilterStatement) -> np.ndarray:
+        annotation_key, comparison_type, value, is_negated = statement
+        column = self._columns.get(annotation_key, None)
+        if column is None:
+            return np.zeros(len(self), dtype=bool)
+        met = column.compare(comparison_type, value)
+        if is_negated:
+            met = ~met
+        return met & self._present[annotation_key]
+
+    def count(self, filters: List[List[FilterStatement]] = None) -> int:
+        if not filters:
+            return len(self)
+        return int(np.count_nonzero(self.get_mask(filters)))
+
+    def filter_indices(self, filters: List[List[FilterStatement]] = None) -> list:
+        mask = self.get_mask(filters)
+        return [self._indices[i] for i in np.flatnonzero(mask)]
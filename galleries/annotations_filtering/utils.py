@@ -1,6 +1,6 @@
-from typing import List
+from typing import Callable, Dict, List, Optional, Tuple
 
-from galleries.annotations_filtering import comparison_type_functions
+from galleries.annotations_filtering import ComparisonType, comparison_type_functions
 from galleries.annotations_filtering.filter import FilterStatement
 
 
@@ -17,3 +17,143 @@ def does_annotations_meets_filter(annotations: dict, filters: List[List[FilterSt
             met_all &= met_condition
         met_any |= met_all
     return met_any
+
+
+# default fraction of images that meet a statement when there are no statistics, the lower the more selective
+default_selectivities = {
+    ComparisonType.EQUAL: 0.1,
+    ComparisonType.NOTEQUAL: 0.9,
+    ComparisonType.LESS: 0.3,
+    ComparisonType.GREATER: 0.3,
+    ComparisonType.GREATER_EQUAL: 0.3,
+    ComparisonType.LESS_EQUAL: 0.3,
+    ComparisonType.CONTAINS: 0.3,
+}
+
+# relative cost of evaluating each comparison, used to break selectivity ties
+comparison_type_costs = {
+    ComparisonType.EQUAL: 1,
+    ComparisonType.NOTEQUAL: 1,
+    ComparisonType.LESS: 1,
+    ComparisonType.GREATER: 1,
+    ComparisonType.GREATER_EQUAL: 1,
+    ComparisonType.LESS_EQUAL: 1,
+    ComparisonType.CONTAINS: 2,
+}
+
+
+def estimate_selectivity(
+        statement: FilterStatement,
+        discrete_values: Optional[Dict[str, list]] = None,
+        annotations_sample: Optional[List[dict]] = None) -> float:
+    """
+    Estimates the fraction of images that meet a statement.
+    :param statement:
+    :param discrete_values: possible values of each annotation, as returned by
+    IGallery.get_discrete_annotations_values. Equality statements over these annotations are assumed to be uniformly
+    distributed.
+    :param annotations_sample: annotations of some images. If given, the selectivity is measured on them.
+    :return:
+    """
+    annotation_key, comparison_type, value, is_negated = statement
+    if annotations_sample is not None and len(annotations_sample) > 0:
+        comparison_function = comparison_type_functions[comparison_type]
+        met = 0
+        for annotations in annotations_sample:
+            try:
+                met += bool(comparison_function(annotations[annotation_key], value)) ^ is_negated
+            except (KeyError, TypeError):
+                pass
+        return met / len(annotations_sample)
+
+    values = (discrete_values or {}).get(annotation_key, None)
+    if values and comparison_type in (ComparisonType.EQUAL, ComparisonType.NOTEQUAL):
+        selectivity = 1 / len(values)
+        if comparison_type == ComparisonType.NOTEQUAL:
+            selectivity = 1 - selectivity
+    else:
+        selectivity = default_selectivities[comparison_type]
+    return 1 - selectivity if is_negated else selectivity
+
+
+def _compile_statement(statement: FilterStatement) -> Callable[[dict], bool]:
+    annotation_key, comparison_type, value, is_negated = statement
+    # the common comparisons are inlined to avoid a function call per image
+    if comparison_type == ComparisonType.EQUAL:
+        if is_negated:
+            return lambda annotations: annotations[annotation_key] != value
+        return lambda annotations: annotations[annotation_key] == value
+    if comparison_type == ComparisonType.NOTEQUAL:
+        if is_negated:
+            return lambda annotations: annotations[annotation_key] == value
+        return lambda annotations: annotations[annotation_key] != value
+    if comparison_type == ComparisonType.CONTAINS:
+        if is_negated:
+            return lambda annotations: value not in annotations[annotation_key]
+        return lambda annotations: value in annotations[annotation_key]
+    comparison_function = comparison_type_functions[comparison_type]
+    if is_negated:
+        return lambda annotations: not comparison_function(annotations[annotation_key], value)
+    return lambda annotations: bool(comparison_function(annotations[annotation_key], value))
+
+
+def _compile_all(predicates: Tuple[Callable[[dict], bool], ...]) -> Callable[[dict], bool]:
+    if len(predicates) == 1:
+        return predicates[0]
+
+    def all_predicate(annotations):
+        for predicate in predicates:
+            if not predicate(annotations):
+                return False
+        return True
+    return all_predicate
+
+
+def _compile_any(predicates: Tuple[Callable[[dict], bool], ...]) -> Callable[[dict], bool]:
+    if len(predicates) == 1:
+        return predicates[0]
+
+    def any_predicate(annotations):
+        for predicate in predicates:
+            if predicate(annotations):
+                return True
+        return False
+    return any_predicate
+
+
+def compile_filters(
+        filters: List[List[FilterStatement]],
+        discrete_values: Optional[Dict[str, list]] = None,
+        annotations_sample: Optional[List[dict]] = None) -> Callable[[dict], bool]:
+    """
+    Compiles filters into a predicate over an image's annotations that is equivalent to does_annotations_meets_filter
+    but short-circuits. Statements of each AND group are ordered from the most to the least selective and OR groups
+    from the most to the least likely to be met, so failing or passing images are decided as soon as possible.
+    :param filters:
+    :param discrete_values: see estimate_selectivity.
+    :param annotations_sample: see estimate_selectivity.
+    :return:
+    """
+    filters = filters or []
+    if len(filters) == 0:
+        return lambda annotations: True
+
+    groups = []
+    for and_conditions in filters:
+        ordered = sorted(
+            (
+                (estimate_selectivity(statement, discrete_values, annotations_sample),
+                 comparison_type_costs[statement.comparison_type],
+                 i,
+                 statement)
+                for i, statement in enumerate(and_conditions)
+            ),
+            key=lambda item: item[:3]
+        )
+        group_selectivity = 1.0
+        for selectivity, _, _, _ in ordered:
+            group_selectivity *= selectivity
+        predicate = _compile_all(tuple(_compile_statement(statement) for _, _, _, statement in ordered))
+        groups.append((group_selectivity, predicate))
+    groups.sort(key=lambda group: -group[0])
+    return _compile_any(tuple(predicate for _, predicate in groups))
@@ -0,0 +1,181 @@
+import pickle
+import sqlite3
+import time
+from sqlite3 import Connection
+from typing import Any, Iterable, List, Optional
+
+from propsettings.configurable import register_as_setting
+from propsettings.setting_types.path_setting_type import Path
+
+from galleries import files_utils
+from galleries.annotations_filtering.columnar import ColumnarAnnotations
+from galleries.annotations_filtering.filter import FilterStatement
+from galleries.annotations_parsers.gallery_annots_parsers import GalleryAnnotationsParser
+
+
+class AnnotationsIndex:
+    """
+    Persistent index of the annotations of a gallery's images, stored in a sqlite database. Each row holds an image
+    index (usually its path), its modification time and its parsed annotations.
+
+    update only parses images that are new or whose modification time changed, so filtered queries are answered from
+    the database instead of parsing the annotations of every image. Filters are evaluated over a columnar copy of the
+    index that is kept in memory until the index changes. Indices that are not file paths have no
+    modification time and are parsed only once. The index is invalidated if the annotations parser changes, i.e. its
+    type or its fingerprint (see GalleryAnnotationsParser.get_fingerprint).
+    """
+
+    BATCH_SIZE = 10000
+
+    def __init__(self, database_path: str = "", refresh_interval: float = 10.0):
+        """
+        :param database_path:
+        :param refresh_interval: seconds during which the index is considered up to date after an update. An update
+        stats every image, so queries in this interval do not; images added or modified in it are found by the first
+        query after it. 0 to update the index in every query.
+        """
+        self._database_path = database_path
+        self._refresh_interval = refresh_interval
+        self._connection: Optional[Connection] = None
+        self._last_update = None
+        self._columnar: Optional[ColumnarAnnotations] = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_connection")  # do not serialize connection because it is not serializable
+        state["_last_update"] = None
+        state.pop("_columnar")
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__ = state
+        self._connection = None
+        self._columnar = None
+
+    @property
+    def database_path(self):
+        return self._database_path
+
+    @database_path.setter
+    def database_path(self, value):
+        self.close()
+        self._database_path = value
+        self._last_update = None
+        self._columnar = None
+
+    def update(self, indices: Iterable, annotations_parser: GalleryAnnotationsParser, force=False):
+        """
+        Synchronizes the index with the current images: new or modified images are parsed and images that no longer
+        exist are removed.
+        :param indices: current image indices.
+        :param annotations_parser: parser used to get the annotations of new or modified images.
+        :param force: update even if the last update is more recent than refresh_interval.
+        :return:
+        """
+        cur = self._get_connection().cursor()
+        parser_changed = self._check_parser(cur, annotations_parser)
+        now = time.monotonic()
+        recently_updated = self._last_update is not None and now - self._last_update < self._refresh_interval
+        if not force and not parser_changed and recently_updated:
+            return
+
+        stored = dict(cur.execute("SELECT path, mtime FROM Annotations").fetchall())
+        changed = []
+        for index in indices:
+            mtime = files_utils.get_file_mtime(index)
+            stored_mtime = stored.pop(index, -1)
+            if stored_mtime != -1 and stored_mtime == mtime:
+                continue
+            self._columnar = None
+            annotations = annotations_parser.get_annotations_by_image_index(index)
+            changed.append([index, mtime, pickle.dumps(annotations)])
+            if len(changed) >= self.BATCH_SIZE:
+                self._upsert(cur, changed)
+                changed = []
+        if len(changed) > 0:
+            self._upsert(cur, changed)
+
+        # the remaining stored indices do not exist anymore
+        if len(stored) > 0:
+            self._columnar = None
+        cur.executemany("DELETE FROM Annotations WHERE path = ?", [[index] for index in stored.keys()])
+        self._connection.commit()
+        self._last_update = time.monotonic()
+
+    def get_indices(self, filters: List[List[FilterStatement]] = None):
+        yield from self.get_columnar_annotations().filter_indices(filters)
+
+    def count(self, filters: List[List[FilterStatement]] = None) -> int:
+        """
+        Returns the number of indexed images that meet the filters, without building the list of their indices.
+        :param filters:
+        :return:
+        """
+        if not filters and self._columnar is None:
+            cur = self._get_connection().cursor()
+            count, = cur.execute("SELECT COUNT(*) FROM Annotations").fetchone()
+            return count
+        return self.get_columnar_annotations().count(filters)
+
+    def get_columnar_annotations(self) -> ColumnarAnnotations:
+        if self._columnar is None:
+            self._columnar = ColumnarAnnotations.from_annotations(self.get_indices_annots())
+        return self._columnar
+
+    def get_indices_annots(self):
+        cur = self._get_connection().cursor()
+        for index, annotations in cur.execute("SELECT path, annotations FROM Annotations ORDER BY rowid"):
+            yield index, pickle.loads(annotations)
+
+    def get_annotations_by_index(self, index: Any) -> Optional[dict]:
+        cur = self._get_connection().cursor()
+        row = cur.execute("SELECT annotations FROM Annotations WHERE path = ?", [index]).fetchone()
+        return pickle.loads(row[0]) if row is not None else None
+
+    def clear(self):
+        cur = self._get_connection().cursor()
+        cur.execute("DELETE FROM Annotations")
+        self._connection.commit()
+        self._last_update = None
+        self._columnar = None
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _get_connection(self) -> Connection:
+        if self._connection is None:
+            files_utils.create_dir_of_file(self._database_path)
+            self._connection = sqlite3.connect(self._database_path)
+            cur = self._connection.cursor()
+            cur.execute("CREATE TABLE IF NOT EXISTS Annotations (path PRIMARY KEY, mtime INTEGER, annotations BLOB)")
+            cur.execute("CREATE TABLE IF NOT EXISTS Metadata (key TEXT PRIMARY KEY, value)")
+            self._connection.commit()
+        return self._connection
+
+    def _check_parser(self, cur, annotations_parser: GalleryAnnotationsParser) -> bool:
+        """
+        Clears the index if the parser is not the one whose annotations are stored. Returns True if it was cleared.
+        """
+        parser_type = type(annotations_parser)
+        fingerprint = f"{parser_type.__module__}.{parser_type.__qualname__}"
+        get_fingerprint = getattr(annotations_parser, "get_fingerprint", None)
+        if get_fingerprint is not None:
+            fingerprint = f"{fingerprint}:{get_fingerprint()}"
+        row = cur.execute("SELECT value FROM Metadata WHERE key = 'parser'").fetchone()
+        if row is not None and row[0] == fingerprint:
+            return False
+        self._columnar = None
+        cur.execute("DELETE FROM Annotations")
+        cur.execute("INSERT OR REPLACE INTO Metadata (key, value) VALUES ('parser', ?)", [fingerprint])
+        self._connection.commit()
+        return True
+
+    @staticmethod
+    def _upsert(cur, rows):
+        cur.executemany("INSERT OR REPLACE INTO Annotations (path, mtime, annotations) VALUES (?, ?, ?)", rows)
+
+
+register_as_setting(AnnotationsIndex, "_database_path", setting_type=Path(False, []))
+register_as_setting(AnnotationsIndex, "_refresh_interval", setting_value_type=float)
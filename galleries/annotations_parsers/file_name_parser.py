@@ -35,6 +35,9 @@ class FileNameSepParser(GalleryAnnotationsParser):
 			annots[annot_name] = token
 		return annots
 
+	def get_fingerprint(self) -> str:
+		return repr((list(self.annot_names), self.sep))
+
 	def get_annotations_types(self) -> Optional[Dict[str, type]]:
 		return {annot_name: str for annot_name in self.annot_names}
 
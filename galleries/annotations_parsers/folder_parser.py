@@ -33,6 +33,9 @@ class FolderParser(GalleryAnnotationsParser):
 	def get_annotations_by_image_index(self, img_index: str) -> dict:
 		raise NotImplementedError
 
+	def get_fingerprint(self) -> str:
+		return repr((list(self.annot_names), self.sep))
+
 	def get_annotations_types(self) -> Optional[Dict[str, type]]:
 		return {annot_name: str for annot_name in self.annot_names}
 
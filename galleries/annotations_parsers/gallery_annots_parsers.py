@@ -30,3 +30,13 @@ class GalleryAnnotationsParser(abc.ABC):
 		:return:
 		"""
 		pass
+
+	def get_fingerprint(self) -> str:
+		"""
+		Returns a string that identifies the configuration of the parser, so persistent indices of the parsed
+		annotations, e.g. AnnotationsIndex, are invalidated when it changes. It is combined with the parser's type.
+		Parsers whose annotations depend on their attributes should override it, and may add a version to it when
+		their parsing changes.
+		:return:
+		"""
+		return ""
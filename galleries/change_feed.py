@@ -0,0 +1,175 @@
+import sqlite3
+from sqlite3 import Connection
+from typing import Any, Iterable, List, Optional, Tuple
+
+from propsettings.configurable import register_as_setting
+from propsettings.setting_types.path_setting_type import Path
+
+from galleries import files_utils
+
+
+INSERTED = 'I'
+UPDATED = 'U'
+DELETED = 'D'
+
+
+class GalleryChanges:
+    """
+    Indices added, removed and modified in a gallery since a version token. Pass token to the next get_changes call to
+    get the changes after these ones.
+    """
+
+    def __init__(self, token: int, added: List[Any] = None, removed: List[Any] = None, modified: List[Any] = None):
+        self.token = token
+        self.added = added or []
+        self.removed = removed or []
+        self.modified = modified or []
+
+    @property
+    def has_changes(self) -> bool:
+        return len(self.added) > 0 or len(self.removed) > 0 or len(self.modified) > 0
+
+    def __repr__(self):
+        return f"GalleryChanges(token={self.token}, added={len(self.added)}, removed={len(self.removed)}, " \
+               f"modified={len(self.modified)})"
+
+
+def collapse_changes(token: int, operations: Iterable[Tuple[Any, str]]) -> GalleryChanges:
+    """
+    Builds the changes of a sequence of (index, operation) tuples sorted by version, where operation is INSERTED,
+    UPDATED or DELETED. Several operations over the same index are collapsed, e.g. an index inserted and then deleted
+    is not reported.
+    :param token: token of the last operation.
+    :param operations:
+    :return:
+    """
+    first_operations = {}
+    last_operations = {}
+    for index, operation in operations:
+        first_operations.setdefault(index, operation)
+        last_operations[index] = operation
+    changes = GalleryChanges(token)
+    for index, first_operation in first_operations.items():
+        existed_before = first_operation != INSERTED
+        exists_now = last_operations[index] != DELETED
+        if existed_before and exists_now:
+            changes.modified.append(index)
+        elif existed_before:
+            changes.removed.append(index)
+        elif exists_now:
+            changes.added.append(index)
+    return changes
+
+
+class ChangeFeed:
+    """
+    Change log of a gallery stored in a sqlite database. synchronize compares the current indices of a gallery, with
+    a fingerprint of each one (e.g. its file modification time), against the last synchronization and logs the
+    insertions, updates and deletions with increasing versions. get_changes collapses the log after a version token.
+    """
+
+    BATCH_SIZE = 10000
+
+    def __init__(self, database_path: str = ""):
+        self._database_path = database_path
+        self._connection: Optional[Connection] = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_connection")  # do not serialize connection because it is not serializable
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__ = state
+        self._connection = None
+
+    @property
+    def database_path(self):
+        return self._database_path
+
+    def get_token(self) -> int:
+        cur = self._get_connection().cursor()
+        version, = cur.execute("SELECT MAX(version) FROM Changes").fetchone()
+        return version or 0
+
+    def synchronize(self, indices_fingerprints: Iterable[Tuple[Any, Any]]):
+        """
+        Logs the changes of the gallery since the last synchronization.
+        :param indices_fingerprints: (index, fingerprint) of every current index of the gallery.
+        :return:
+        """
+        cur = self._get_connection().cursor()
+        stored = dict(cur.execute("SELECT idx, fingerprint FROM Entries").fetchall())
+        operations = []
+        for index, fingerprint in indices_fingerprints:
+            if index not in stored:
+                operations.append((index, fingerprint, INSERTED))
+            elif stored.pop(index) != fingerprint:
+                operations.append((index, fingerprint, UPDATED))
+            if len(operations) >= self.BATCH_SIZE:
+                self._log(cur, operations)
+                operations = []
+        # the remaining stored indices do not exist anymore
+        operations.extend((index, None, DELETED) for index in stored.keys())
+        self._log(cur, operations)
+        self._connection.commit()
+
+    def get_changes(self, token: Optional[int] = None) -> GalleryChanges:
+        """
+        Returns the changes logged after token. If token is None all the current indices are returned as added.
+        :param token:
+        :return:
+        """
+        connection = self._get_connection()
+        cur = connection.cursor()
+        # the token and the changes are read in one transaction and the changes are bounded by the token, so the
+        # changes logged by a concurrent synchronize are returned by the next call only
+        if not connection.in_transaction:
+            cur.execute("BEGIN")
+        try:
+            current_token = self.get_token()
+            if token is None:
+                indices = [index for index, in cur.execute("SELECT idx FROM Entries ORDER BY rowid")]
+                return GalleryChanges(current_token, added=indices)
+            operations = cur.execute(
+                "SELECT idx, operation FROM Changes WHERE version > ? AND version <= ? ORDER BY version",
+                [token, current_token]
+            ).fetchall()
+            return collapse_changes(current_token, operations)
+        finally:
+            connection.commit()
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _log(self, cur, operations: List[Tuple[Any, Any, str]]):
+        if len(operations) == 0:
+            return
+        cur.executemany(
+            "INSERT OR REPLACE INTO Entries (idx, fingerprint) VALUES (?, ?)",
+            [(index, fingerprint) for index, fingerprint, operation in operations if operation != DELETED]
+        )
+        cur.executemany(
+            "DELETE FROM Entries WHERE idx = ?",
+            [(index,) for index, _, operation in operations if operation == DELETED]
+        )
+        cur.executemany(
+            "INSERT INTO Changes (idx, operation) VALUES (?, ?)",
+            [(index, operation) for index, _, operation in operations]
+        )
+
+    def _get_connection(self) -> Connection:
+        if self._connection is None:
+            files_utils.create_dir_of_file(self._database_path)
+            self._connection = sqlite3.connect(self._database_path)
+            cur = self._connection.cursor()
+            cur.execute("CREATE TABLE IF NOT EXISTS Entries (idx PRIMARY KEY, fingerprint)")
+            cur.execute(
+                "CREATE TABLE IF NOT EXISTS Changes (version INTEGER PRIMARY KEY AUTOINCREMENT, idx, operation TEXT)")
+            self._connection.commit()
+        return self._connection
+
+
+register_as_setting(ChangeFeed, "_database_path", setting_type=Path(False, []))
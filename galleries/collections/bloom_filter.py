@@ -0,0 +1,71 @@
+import hashlib
+import math
+import numbers
+import pickle
+from typing import Any, Iterable
+
+
+class BloomFilter:
+    """
+    Probabilistic set of keys. A key that was never added is reported as not contained with a probability of at
+    least 1 - error_rate, and a key that was added is always reported as contained.
+
+    Keys are hashed from their pickled representation, so the filter can be persisted and used by other processes.
+    """
+
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.01):
+        capacity = max(1, capacity)
+        self._capacity = capacity
+        self._error_rate = error_rate
+        bits_count = math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        self._bits_count = max(8, bits_count)
+        self._hashes_count = max(1, round(self._bits_count / capacity * math.log(2)))
+        self._bits = bytearray((self._bits_count + 7) // 8)
+        self._count = 0
+
+    @staticmethod
+    def from_keys(keys: Iterable, capacity: int, error_rate: float = 0.01) -> 'BloomFilter':
+        bloom_filter = BloomFilter(capacity, error_rate)
+        for key in keys:
+            bloom_filter.add(key)
+        return bloom_filter
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def error_rate(self):
+        return self._error_rate
+
+    @property
+    def count(self):
+        """
+        Number of keys added, including repeated ones.
+        :return:
+        """
+        return self._count
+
+    def is_full(self) -> bool:
+        """
+        Returns True if more keys than the capacity were added, so the error rate is no longer guaranteed.
+        :return:
+        """
+        return self._count > self._capacity
+
+    def add(self, key: Any):
+        for position in self._get_positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self._count += 1
+
+    def __contains__(self, key: Any) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._get_positions(key))
+
+    def _get_positions(self, key: Any):
+        if isinstance(key, numbers.Integral):
+            key = int(key)
+        digest = hashlib.blake2b(pickle.dumps(key), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self._hashes_count):
+            yield (h1 + i * h2) % self._bits_count
@@ -2,17 +2,23 @@ from typing import Any, Generator
 
 from mnd_utils.datastructures.circular_generator import CircularGenerator
 
-from galleries.data_read_write import default_reader_writer
+from galleries.data_read_write import PickleDataReaderWriter
 
 
 class FileStreamDictionary:
     """
-    Deprecated. Use StreamDictionary instead
+    Deprecated. Use StreamDictionary to read data or LogStructuredDictionary as a read-write store instead
     """
 
     def __init__(self, file_path, batch_size, append_buffer_size=5000, data_reader_writer=None):
+        """
+        :param file_path: pickle data file read and written if data_reader_writer is None.
+        :param batch_size:
+        :param append_buffer_size:
+        :param data_reader_writer: reader-writer of the data, its own file is used instead of file_path.
+        """
         self._file_path = file_path
-        self._data_reader_writer = data_reader_writer or default_reader_writer()
+        self._data_reader_writer = data_reader_writer or PickleDataReaderWriter(None, "", file_path)
         self._closed = False
         self._circular_generator = CircularGenerator(self._get_generator)
         self._all_loaded = False
@@ -34,7 +40,7 @@ class FileStreamDictionary:
         return self._closed
 
     def _get_generator(self):
-        yield from self._data_reader_writer.read_data(self._file_path)
+        yield from self._data_reader_writer.read_all_data()
 
     def _get_current_batch_dict(self):
         if self._current_batch is None:
@@ -59,7 +65,7 @@ class FileStreamDictionary:
 
         # append data
         data = ((index, d) for index, d in self._append_buffer.items())
-        self._data_reader_writer.write_data(data, self._file_path, append=True)
+        self._data_reader_writer.write_data(data)
 
         # reset
         self._circular_generator = CircularGenerator(self._get_generator)
@@ -78,11 +84,13 @@ class FileStreamDictionary:
         if self._closed:
             raise IOError("Error: reading closed stream")
 
+        if key in self._append_buffer:
+            return self._append_buffer[key]
+        if not self._data_reader_writer.may_contain(key):
+            raise KeyError(key)
         batch = self._get_current_batch_dict()
         if key in batch:
             return batch[key]
-        if key in self._append_buffer:
-            return self._append_buffer[key]
         # else
         if self._all_loaded:
             raise KeyError(key)
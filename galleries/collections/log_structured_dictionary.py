@@ -0,0 +1,258 @@
+import os
+import pickle
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+
+SEGMENT_EXT = 'seg'
+HINT_EXT = 'hint'
+COMPACTION_EXT = 'compact'
+
+
+class LogStructuredDictionary:
+    """
+    Persistent append only key-value store, intended to replace FileStreamDictionary as a checkpoint store.
+
+    Values are appended as pickled (key, value) records to segment files inside a directory. An in memory hash index
+    maps each key to the segment, offset and length of its last value, so both push_data and lookups cost O(1) and can
+    be interleaved freely. When the active segment reaches segment_size bytes it is sealed: a hint file with its part
+    of the index is written next to it, so the index is rebuilt from hints on open instead of from the segments.
+
+    Compaction rewrites the sealed segments keeping only the last value of each key. It can run in a background thread
+    and is started automatically when the number of sealed segments reaches compaction_threshold.
+    """
+
+    def __init__(
+            self,
+            directory: str,
+            segment_size: int = 64 * 1024 * 1024,
+            compaction_threshold: Optional[int] = 4,
+            background_compaction: bool = True):
+        self._directory = directory
+        self._segment_size = segment_size
+        self._compaction_threshold = compaction_threshold
+        self._background_compaction = background_compaction
+        self._lock = threading.RLock()
+        self._index: Dict[Any, Tuple[int, int, int]] = {}
+        self._sealed_segments = []
+        self._active_segment: int = 0
+        self._active_file = None
+        self._active_offsets: Dict[Any, Tuple[int, int]] = {}
+        self._read_files = {}
+        self._compaction_thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._open()
+
+    @property
+    def directory(self):
+        return self._directory
+
+    @property
+    def closed(self):
+        return self._closed
+
+    @property
+    def segments_count(self):
+        return len(self._sealed_segments) + 1
+
+    def try_get_item(self, key) -> (Any, bool):
+        try:
+            value = self[key]
+            return value, True
+        except KeyError:
+            return None, False
+
+    def __getitem__(self, key):
+        with self._lock:
+            if self._closed:
+                raise IOError("Error: reading closed stream")
+            segment, offset, length = self._index[key]
+            if segment == self._active_segment:
+                self._active_file.flush()
+            file = self._get_read_file(segment)
+            file.seek(offset)
+            _, value = pickle.loads(file.read(length))
+            return value
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def __iter__(self):
+        if self._closed:
+            raise IOError("Error: reading closed stream")
+        with self._lock:
+            keys = list(self._index.keys())
+        for key in keys:
+            value, success = self.try_get_item(key)
+            if success:
+                yield key, value
+
+    def push_data(self, index, data):
+        with self._lock:
+            if self._closed:
+                raise IOError("Error: writing closed stream")
+            offset = self._active_file.tell()
+            pickle.dump((index, data), self._active_file)
+            length = self._active_file.tell() - offset
+            self._index[index] = (self._active_segment, offset, length)
+            self._active_offsets[index] = (offset, length)
+            if self._active_file.tell() >= self._segment_size:
+                self._rotate()
+
+    def flush(self):
+        with self._lock:
+            self._active_file.flush()
+
+    def compact(self, wait=True) -> Optional[threading.Thread]:
+        """
+        Rewrites the sealed segments without superseded values.
+        :param wait: if False compaction runs in a background thread, which is returned.
+        :return:
+        """
+        with self._lock:
+            if self._compaction_thread is not None and self._compaction_thread.is_alive():
+                thread = self._compaction_thread
+            else:
+                thread = threading.Thread(target=self._compact, daemon=True)
+                self._compaction_thread = thread
+                thread.start()
+        if wait:
+            thread.join()
+            return None
+        return thread
+
+    def close(self):
+        if self._closed:
+            return
+        if self._compaction_thread is not None:
+            self._compaction_thread.join()
+        with self._lock:
+            self._active_file.close()
+            for file in self._read_files.values():
+                file.close()
+            self._read_files.clear()
+            self._closed = True
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self._directory, f'{segment:08d}.{SEGMENT_EXT}')
+
+    def _hint_path(self, segment: int) -> str:
+        return os.path.join(self._directory, f'{segment:08d}.{HINT_EXT}')
+
+    def _open(self):
+        os.makedirs(self._directory, exist_ok=True)
+        segments = sorted(
+            int(name.split('.')[0]) for name in os.listdir(self._directory) if name.endswith(f'.{SEGMENT_EXT}')
+        )
+        for name in os.listdir(self._directory):
+            if name.endswith(f'.{COMPACTION_EXT}'):
+                # leftovers of an interrupted compaction
+                os.remove(os.path.join(self._directory, name))
+
+        offsets = {}
+        for segment in segments:
+            hint_path = self._hint_path(segment)
+            if os.path.exists(hint_path):
+                with open(hint_path, 'rb') as file:
+                    offsets = pickle.load(file)
+            else:
+                offsets = self._scan_segment(segment)
+            for key, (offset, length) in offsets.items():
+                self._index[key] = (segment, offset, length)
+
+        if len(segments) > 0 and not os.path.exists(self._hint_path(segments[-1])):
+            self._sealed_segments = segments[:-1]
+            self._active_segment = segments[-1]
+            self._active_offsets = offsets
+        else:
+            self._sealed_segments = segments
+            self._active_segment = segments[-1] + 1 if len(segments) > 0 else 0
+        self._active_file = open(self._segment_path(self._active_segment), 'ab')
+
+    def _scan_segment(self, segment: int) -> Dict[Any, Tuple[int, int]]:
+        offsets = {}
+        path = self._segment_path(segment)
+        with open(path, 'rb') as file:
+            while True:
+                offset = file.tell()
+                try:
+                    key, _ = pickle.load(file)
+                except (EOFError, pickle.UnpicklingError):
+                    break
+                offsets[key] = (offset, file.tell() - offset)
+            end = offset
+        if end < os.path.getsize(path):
+            # drop a partially written record
+            with open(path, 'r+b') as file:
+                file.truncate(end)
+        return offsets
+
+    def _get_read_file(self, segment: int):
+        if segment not in self._read_files:
+            self._read_files[segment] = open(self._segment_path(segment), 'rb')
+        return self._read_files[segment]
+
+    def _write_hint(self, segment: int, offsets: Dict[Any, Tuple[int, int]], path: str = None):
+        with open(path or self._hint_path(segment), 'wb') as file:
+            pickle.dump(offsets, file)
+
+    def _rotate(self):
+        self._active_file.close()
+        self._write_hint(self._active_segment, self._active_offsets)
+        self._active_offsets = {}
+        self._sealed_segments.append(self._active_segment)
+        self._active_segment += 1
+        self._active_file = open(self._segment_path(self._active_segment), 'ab')
+        threshold = self._compaction_threshold
+        if threshold is not None and len(self._sealed_segments) >= threshold:
+            if self._background_compaction:
+                self.compact(wait=False)
+            else:
+                self._compact()
+
+    def _compact(self):
+        with self._lock:
+            segments = list(self._sealed_segments)
+            if len(segments) < 2:
+                return
+            segments_set = set(segments)
+            live = {key: location for key, location in self._index.items() if location[0] in segments_set}
+
+        # sealed segments are immutable, so they are read without holding the lock
+        target = segments[-1]
+        target_path = f'{self._segment_path(target)}.{COMPACTION_EXT}'
+        hint_path = f'{self._hint_path(target)}.{COMPACTION_EXT}'
+        offsets = {}
+        sources = {segment: open(self._segment_path(segment), 'rb') for segment in segments}
+        try:
+            with open(target_path, 'wb') as output:
+                for key, (segment, offset, length) in live.items():
+                    source = sources[segment]
+                    source.seek(offset)
+                    offsets[key] = (output.tell(), length)
+                    output.write(source.read(length))
+        finally:
+            for source in sources.values():
+                source.close()
+        self._write_hint(target, offsets, hint_path)
+
+        with self._lock:
+            for segment in segments:
+                file = self._read_files.pop(segment, None)
+                if file is not None:
+                    file.close()
+            # without a hint the segment is scanned on open, so a crash here never pairs a segment with a wrong hint
+            os.remove(self._hint_path(target))
+            os.replace(target_path, self._segment_path(target))
+            os.replace(hint_path, self._hint_path(target))
+            for segment in segments[:-1]:
+                os.remove(self._segment_path(segment))
+                os.remove(self._hint_path(segment))
+            for key, (offset, length) in offsets.items():
+                # keys written again during compaction already point to a newer segment
+                if self._index.get(key) == live[key]:
+                    self._index[key] = (target, offset, length)
+            self._sealed_segments = [target] + self._sealed_segments[len(segments):]
@@ -5,8 +5,15 @@ from mnd_utils.datastructures.circular_generator import CircularGenerator
 
 class StreamDictionary:
 
-    def __init__(self, generator_provider: Callable, batch_size):
+    def __init__(self, generator_provider: Callable, batch_size, key_filter: Callable[[Any], bool] = None):
+        """
+        :param generator_provider: function that returns a generator of (key, value) tuples.
+        :param batch_size: number of items kept in memory.
+        :param key_filter: optional function that returns False for keys known to not exist (e.g.
+        IDataReaderWriter.may_contain), so they are not searched in the stream.
+        """
         self._generator_provider = generator_provider
+        self._key_filter = key_filter
         self._circular_generator = CircularGenerator(self._get_generator)
         self._closed = False
         self._all_loaded = False
@@ -48,6 +55,8 @@ class StreamDictionary:
         if self._closed:
             raise IOError("Error: reading closed stream")
 
+        if self._key_filter is not None and not self._key_filter(key):
+            raise KeyError(key)
         batch = self._get_current_batch_dict()
         if key in batch:
             return batch[key]
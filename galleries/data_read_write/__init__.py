@@ -1,5 +1,8 @@
+from galleries.data_read_write.block_compressed_data_reader_writer import BlockCompressedDataReaderWriter
+from galleries.data_read_write.numpy_data_reader_writer import NumpyDataReaderWriter
 from galleries.data_read_write.pickle_data_reader_writer import PickleDataReaderWriter
-from galleries.data_read_write.sqlite_data_reader_writer import SqliteDataReaderWriter
+from galleries.data_read_write.sharded_data_reader_writer import ShardedDataReaderWriter
+from galleries.data_read_write.sqlite_data_reader_writer import SqliteBulkWriteOptions, SqliteDataReaderWriter
 
 
 def default_reader_writer():
@@ -0,0 +1,377 @@
+import io
+import lzma
+import mmap
+import os
+import pickle
+import struct
+import zlib
+from collections import OrderedDict
+from typing import Generator, List, Optional
+
+from galleries import files_utils
+from galleries.data_read_write import serialization
+from galleries.data_read_write.idata_reader_writer import IDataReaderWriter
+from galleries.data_read_write.offset_index import get_record_key
+from galleries.data_read_write.utils_file_data_readers_writers import *
+from galleries.parallel_utils import ordered_parallel_map
+
+
+BLOCK_INDEX_EXT = 'blocks'
+BLOCK_MAGIC = b'GBLK'
+
+_BLOCK_HEADER = struct.Struct('<4sBQI')  # magic, compression, compressed length, records count
+
+_COMPRESSIONS = {
+    'zlib': 1,
+    'lzma': 2,
+}
+
+
+def get_block_index_path(data_path: str) -> str:
+    return f'{data_path}.{BLOCK_INDEX_EXT}'
+
+
+def compress(data, compression: str, level: Optional[int] = None) -> bytes:
+    if compression == 'zlib':
+        return zlib.compress(data, 6 if level is None else level)
+    elif compression == 'lzma':
+        return lzma.compress(data, preset=level)
+    raise ValueError(f"Wrong compression {compression}. Valid compressions are {list(_COMPRESSIONS.keys())}")
+
+
+def decompress(data, compression_id: int) -> bytes:
+    if compression_id == _COMPRESSIONS['zlib']:
+        return zlib.decompress(data)
+    elif compression_id == _COMPRESSIONS['lzma']:
+        return lzma.decompress(data)
+    raise ValueError(f"Wrong compression id {compression_id}")
+
+
+class BlockInfo:
+
+    def __init__(self, offset: int, length: int, compression_id: int, count: int, first_key, last_key):
+        self.offset = offset
+        self.length = length
+        self.compression_id = compression_id
+        self.count = count
+        self.first_key = first_key
+        self.last_key = last_key
+
+
+class BlockIndex:
+    """
+    Sidecar index of a block compressed data file. It stores the offset, length and key range of each block and, for
+    each key, the block it belongs to and its offset and length inside the decompressed block.
+
+    The index file is a log of (indexed size, blocks, keys) pickles, as the offset index of pickle data files: save
+    appends only the blocks and keys added since the last save.
+    """
+
+    def __init__(self, data_path: str):
+        self._data_path = data_path
+        self._index_path = get_block_index_path(data_path)
+        self._blocks: List[BlockInfo] = []
+        self._keys = {}
+        self._indexed_size = 0
+        self._loaded = False
+        # blocks and keys added since the last save and whether the index file must be rewritten instead of appended to
+        self._saved_blocks_count = 0
+        self._unsaved_keys = {}
+        self._rewrite = False
+
+    @property
+    def data_path(self):
+        return self._data_path
+
+    @property
+    def blocks(self) -> List[BlockInfo]:
+        return self._blocks
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def keys(self):
+        return self._keys.keys()
+
+    def get(self, key):
+        """
+        Returns a (block number, offset, length) tuple or None if the key is not indexed.
+        """
+        return self._keys.get(key, None)
+
+    def add_block(self, block: BlockInfo, records_locations: list):
+        block_number = len(self._blocks)
+        self._blocks.append(block)
+        for key, offset, length in records_locations:
+            self._keys[key] = (block_number, offset, length)
+            self._unsaved_keys[key] = (block_number, offset, length)
+        self._indexed_size = block.offset + _BLOCK_HEADER.size + block.length
+
+    def update(self):
+        if not self._loaded:
+            self._load()
+        data_size = os.path.getsize(self._data_path) if os.path.exists(self._data_path) else 0
+        if data_size == self._indexed_size:
+            return
+        if data_size < self._indexed_size:
+            self._blocks = []
+            self._keys = {}
+            self._indexed_size = 0
+            self._rewrite = True
+        blocks_count = len(self._blocks)
+        self._index_tail()
+        # a partially written block at the end is not indexed, the index file only changes if some block was
+        if self._rewrite or len(self._blocks) > blocks_count:
+            self.save()
+
+    def save(self):
+        """
+        Appends the blocks and keys added since the last save to the index file, or rewrites it if it is invalid.
+        :return:
+        """
+        if self._rewrite or not os.path.exists(self._index_path):
+            with open(self._index_path, 'wb') as file:
+                blocks = [block.__dict__ for block in self._blocks]
+                pickle.dump((self._indexed_size, blocks, self._keys), file)
+        else:
+            with open(self._index_path, 'ab') as file:
+                blocks = [block.__dict__ for block in self._blocks[self._saved_blocks_count:]]
+                pickle.dump((self._indexed_size, blocks, self._unsaved_keys), file)
+        self._saved_blocks_count = len(self._blocks)
+        self._unsaved_keys = {}
+        self._rewrite = False
+
+    def clear(self):
+        self._blocks = []
+        self._keys = {}
+        self._indexed_size = 0
+        self._loaded = True
+        self._saved_blocks_count = 0
+        self._unsaved_keys = {}
+        self._rewrite = False
+        if os.path.exists(self._index_path):
+            os.remove(self._index_path)
+
+    def _load(self):
+        self._blocks = []
+        self._keys = {}
+        self._indexed_size = 0
+        if os.path.exists(self._index_path):
+            index_file_size = os.path.getsize(self._index_path)
+            with open(self._index_path, 'rb') as file:
+                while file.tell() < index_file_size:
+                    try:
+                        indexed_size, blocks, keys = pickle.load(file)
+                        blocks = [BlockInfo(**block) for block in blocks]
+                    except (EOFError, pickle.UnpicklingError, ValueError, TypeError):
+                        # corrupted or partially written entry, the data file after the last good entry is indexed
+                        # again and the index file is rewritten
+                        self._rewrite = True
+                        break
+                    self._blocks.extend(blocks)
+                    self._keys.update(keys)
+                    self._indexed_size = indexed_size
+        self._saved_blocks_count = len(self._blocks)
+        self._unsaved_keys = {}
+        self._loaded = True
+
+    def _index_tail(self):
+        with open(self._data_path, 'rb') as file:
+            file.seek(self._indexed_size)
+            while True:
+                offset = file.tell()
+                header = file.read(_BLOCK_HEADER.size)
+                if len(header) < _BLOCK_HEADER.size:
+                    break
+                magic, compression_id, length, count = _BLOCK_HEADER.unpack(header)
+                compressed = file.read(length)
+                if magic != BLOCK_MAGIC or len(compressed) < length:
+                    # partially written block at the end
+                    break
+                raw = decompress(compressed, compression_id)
+                locations = list(_iterate_records_locations(raw))
+                first_key = locations[0][0] if len(locations) > 0 else None
+                last_key = locations[-1][0] if len(locations) > 0 else None
+                self.add_block(BlockInfo(offset, length, compression_id, count, first_key, last_key), locations)
+
+
+def _iterate_records(raw):
+    stream = io.BytesIO(raw)
+    while True:
+        offset = stream.tell()
+        try:
+            record = serialization.load(stream, raw)
+        except EOFError:
+            break
+        yield offset, stream.tell() - offset, record
+
+
+def _iterate_records_locations(raw):
+    for offset, length, record in _iterate_records(raw):
+        key = get_record_key(record)
+        if key is not None:
+            yield key, offset, length
+
+
+class BlockCompressedDataReaderWriter(IDataReaderWriter):
+    """
+    Compressed container format for the data written by PickleDataReaderWriter. Records are grouped in blocks of about
+    block_size uncompressed bytes and each block is compressed independently with zlib or lzma. A sidecar block index
+    keeps the offset and key range of each block and the location of each key, so reading a record decompresses only
+    its block. Full scans can decompress blocks in parallel with decompression_workers threads.
+    """
+
+    BLOCKS_CACHE_SIZE = 4
+
+    def __init__(
+            self,
+            data_identifier,
+            root_folder: str,
+            file_path: str = None,
+            compression: str = 'zlib',
+            compression_level: Optional[int] = None,
+            block_size: int = 1024 * 1024,
+            decompression_workers: int = 1,
+            out_of_band_buffers=False):
+        super().__init__(data_identifier)
+        if compression not in _COMPRESSIONS:
+            raise ValueError(f"Wrong compression {compression}. Valid compressions are {list(_COMPRESSIONS.keys())}")
+        self._root_folder = root_folder
+        if file_path is None:
+            self.set_data_identifier(data_identifier)
+        else:
+            self._file_path = file_path
+
+        self._compression = compression
+        self._compression_level = compression_level
+        self._block_size = block_size
+        self._decompression_workers = decompression_workers
+        if out_of_band_buffers:
+            serialization.check_out_of_band_support()
+        self._out_of_band_buffers = out_of_band_buffers
+        self._block_index: Optional[BlockIndex] = None
+
+    def set_data_identifier(self, data_identifier: DataIdentifier):
+        indices = read_index_list(self._root_folder, self._data_identifier)
+        add_generator_to_indices_if_not_exists(self._data_identifier, indices)
+        write_indices(self._root_folder, self._data_identifier, indices)
+        file_path = get_data_path(self._root_folder, self._data_identifier, indices)
+        files_utils.create_file_if_doesnt_exist(file_path)
+        self._file_path = file_path
+        self._block_index = None
+
+    def read_all_data(self) -> Generator:
+        if not os.path.exists(self._file_path) or os.path.getsize(self._file_path) == 0:
+            return
+        block_index = self._get_block_index()
+        with open(self._file_path, "rb") as file:
+            memory = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        def read_block(block: BlockInfo):
+            return self._decompress_block(memory, block)
+
+        blocks = list(block_index.blocks)
+        workers = self._decompression_workers
+        for raw in ordered_parallel_map(read_block, blocks, workers):
+            for _, _, record in _iterate_records(raw):
+                yield record
+
+    def read_data(self, indices, keep_order=True) -> Generator:
+        if not os.path.exists(self._file_path) or os.path.getsize(self._file_path) == 0:
+            for index in indices:
+                yield index, None
+            return
+
+        block_index = self._get_block_index()
+        if not keep_order:
+            # each block is decompressed only once
+            indices = sorted(indices, key=lambda i: block_index.get(i) or (-1, 0, 0))
+        with open(self._file_path, "rb") as file:
+            memory = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        cache = OrderedDict()
+        for index in indices:
+            data = None
+            location = block_index.get(index)
+            if location is not None:
+                block_number, offset, length = location
+                if block_number in cache:
+                    cache.move_to_end(block_number)
+                else:
+                    cache[block_number] = self._decompress_block(memory, block_index.blocks[block_number])
+                    if len(cache) > self.BLOCKS_CACHE_SIZE:
+                        cache.popitem(last=False)
+                record = memoryview(cache[block_number])[offset:offset + length]
+                _, data = serialization.loads_record(record)
+            yield index, data
+
+    def may_contain(self, key) -> bool:
+        return key in self._get_block_index()
+
+    def write_data(self, data: Generator, notify_function=None, notify_rate=100):
+        if not os.path.exists(self._file_path):
+            files_utils.create_dir_of_file(self._file_path)
+        block_index = self._get_block_index()
+        buffer = io.BytesIO()
+        locations = []
+        records_count = [0]
+        file = open(self._file_path, "ab")
+
+        def flush():
+            raw = buffer.getbuffer()
+            compressed = compress(raw, self._compression, self._compression_level)
+            del raw
+            compression_id = _COMPRESSIONS[self._compression]
+            offset = file.tell()
+            file.write(_BLOCK_HEADER.pack(BLOCK_MAGIC, compression_id, len(compressed), records_count[0]))
+            file.write(compressed)
+            first_key = locations[0][0] if len(locations) > 0 else None
+            last_key = locations[-1][0] if len(locations) > 0 else None
+            block = BlockInfo(offset, len(compressed), compression_id, records_count[0], first_key, last_key)
+            block_index.add_block(block, locations)
+            buffer.seek(0)
+            buffer.truncate()
+            locations.clear()
+            records_count[0] = 0
+
+        def write(d):
+            offset = buffer.tell()
+            if self._out_of_band_buffers:
+                serialization.dump(d, buffer)
+            else:
+                pickle.dump(d, buffer)
+            records_count[0] += 1
+            key = get_record_key(d)
+            if key is not None:
+                locations.append((key, offset, buffer.tell() - offset))
+            if buffer.tell() >= self._block_size:
+                flush()
+
+        try:
+            IDataReaderWriter.write_data_with_notifications(data, write, notify_function, notify_rate)
+            if buffer.tell() > 0:
+                flush()
+        finally:
+            file.close()
+            block_index.save()
+
+    def clear_data(self):
+        file = open(self._file_path, "wb")
+        file.close()
+        self._get_block_index().clear()
+
+    def release(self):
+        pass
+
+    def _get_block_index(self) -> BlockIndex:
+        if self._block_index is None or self._block_index.data_path != self._file_path:
+            self._block_index = BlockIndex(self._file_path)
+        self._block_index.update()
+        return self._block_index
+
+    @staticmethod
+    def _decompress_block(memory, block: BlockInfo) -> bytes:
+        start = block.offset + _BLOCK_HEADER.size
+        return decompress(memoryview(memory)[start:start + block.length], block.compression_id)
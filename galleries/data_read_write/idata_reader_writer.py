@@ -36,9 +36,25 @@ class IDataReaderWriter:
         pass
 
     @abc.abstractmethod
-    def read_data(self, indices) -> Generator:
+    def read_data(self, indices, keep_order=True) -> Generator:
+        """
+        Yields (index, data) tuples for the given indices. data is None for indices that were not written.
+        :param indices:
+        :param keep_order: if False, implementations may yield the results in the order they are stored, which is
+        usually faster.
+        :return:
+        """
         pass
 
+    def may_contain(self, key) -> bool:
+        """
+        Returns False if it is known, without reading the data, that no data was written for the given key. A True
+        result does not guarantee that the key exists.
+        :param key:
+        :return:
+        """
+        return True
+
     @abc.abstractmethod
     def write_data(
             self,
@@ -65,6 +81,33 @@ class IDataReaderWriter:
             if count % notify_rate == 0:
                 notify_function(count)
 
+    @staticmethod
+    def read_data_in_single_pass(records, indices, keep_order=True):
+        """
+        Finds the given indices in a single pass over a stream of (index, data) records. Only the data of the
+        requested indices is kept in memory. When an index appears more than once the last occurrence wins, as in
+        read_data, so the whole stream is consumed before any result is yielded.
+        :param records: iterable of (index, data) records, in storage order.
+        :param indices: indices to find.
+        :param keep_order: if True results are yielded in the order of indices, otherwise in the order in which the
+        indices first appear in records. Indices not found are yielded at the end with None data.
+        :return:
+        """
+        indices = list(indices)
+        requested = set(indices)
+        found = {}
+        for index, data in records:
+            if index in requested:
+                found[index] = data
+        if keep_order:
+            for index in indices:
+                yield index, found.get(index, None)
+        else:
+            yield from found.items()
+            for index in indices:
+                if index not in found:
+                    yield index, None
+
     @staticmethod
     def _default_notify_function(count):
         print(f"Data written: {count}")
@@ -0,0 +1,207 @@
+import os
+import pickle
+from typing import Generator, List, Optional, Tuple
+
+import numpy as np
+
+from galleries import files_utils
+from galleries.data_read_write.idata_reader_writer import IDataReaderWriter
+from galleries.data_read_write.utils_file_data_readers_writers import *
+
+
+MATRIX_EXT = 'npy'
+
+
+def get_matrix_path(data_path: str) -> str:
+    root, _ = os.path.splitext(data_path)
+    return f'{root}.{MATRIX_EXT}'
+
+
+class NumpyDataReaderWriter(IDataReaderWriter):
+    """
+    Stores fixed shape arrays, one per key, as the rows of a single memory mapped .npy matrix. The data file of the
+    data identifier holds the keys in row order and the matrix is stored next to it with the .npy extension.
+
+    The matrix is preallocated and its capacity doubles when it gets full. Read methods return views of the memory
+    mapped matrix, so no data is copied until it is actually used.
+    """
+
+    def __init__(
+            self,
+            data_identifier,
+            root_folder: str,
+            file_path: str = None,
+            dtype=None,
+            initial_capacity: int = 1024):
+        super().__init__(data_identifier)
+        self._root_folder = root_folder
+        if file_path is None:
+            self.set_data_identifier(data_identifier)
+        else:
+            self._file_path = file_path
+
+        self._dtype = dtype
+        self._initial_capacity = initial_capacity
+        self._keys: List = []
+        self._rows = {}
+        self._keys_file_size = -1
+        self._keys_end = 0
+        self._matrix: Optional[np.memmap] = None
+
+    @property
+    def matrix_path(self):
+        return get_matrix_path(self._file_path)
+
+    def set_data_identifier(self, data_identifier: DataIdentifier):
+        indices = read_index_list(self._root_folder, self._data_identifier)
+        add_generator_to_indices_if_not_exists(self._data_identifier, indices)
+        write_indices(self._root_folder, self._data_identifier, indices)
+        file_path = get_data_path(self._root_folder, self._data_identifier, indices)
+        files_utils.create_file_if_doesnt_exist(file_path)
+        self._file_path = file_path
+        self._keys_file_size = -1
+        self.release()
+
+    def read_all_as_array(self) -> Tuple[list, np.ndarray]:
+        """
+        Returns the list of keys and a read only view of the matrix whose rows are the data of each key.
+        :return:
+        """
+        self._load_keys()
+        matrix = self._get_matrix()
+        if matrix is None:
+            return [], np.empty((0,))
+        return list(self._keys), matrix[:len(self._keys)]
+
+    def read_all_data(self) -> Generator:
+        keys, matrix = self.read_all_as_array()
+        for row, key in enumerate(keys):
+            yield key, matrix[row]
+
+    def read_data(self, indices, keep_order=True) -> Generator:
+        self._load_keys()
+        matrix = self._get_matrix()
+        if not keep_order:
+            indices = sorted(indices, key=lambda i: self._rows.get(i, -1))
+        for index in indices:
+            row = self._rows.get(index, None)
+            data = matrix[row] if row is not None and matrix is not None else None
+            yield index, data
+
+    def may_contain(self, key) -> bool:
+        self._load_keys()
+        return key in self._rows
+
+    def write_data(self, data: Generator, notify_function=None, notify_rate=100):
+        if not os.path.exists(self._file_path):
+            files_utils.create_dir_of_file(self._file_path)
+        self._load_keys()
+        self.release()
+        matrix = self._open_matrix_for_writing() if os.path.exists(self.matrix_path) else None
+        new_keys = []
+        state = {'matrix': matrix}
+
+        def write(d):
+            key, value = d
+            value = np.asarray(value)
+            if state['matrix'] is None:
+                state['matrix'] = self._create_matrix(value)
+            matrix = state['matrix']
+            if value.shape != matrix.shape[1:]:
+                raise ValueError(f"Wrong data shape {value.shape} for key {key}. Expected shape is {matrix.shape[1:]}")
+
+            capacity = matrix.shape[0]
+            # the old map must not be referenced while it is replaced
+            del matrix
+
+            row = self._rows.get(key, None)
+            if row is None:
+                row = len(self._keys)
+                if row == capacity:
+                    self._grow_matrix(state)
+                self._keys.append(key)
+                self._rows[key] = row
+                new_keys.append(key)
+            state['matrix'][row] = value
+
+        try:
+            IDataReaderWriter.write_data_with_notifications(data, write, notify_function, notify_rate)
+        finally:
+            if state['matrix'] is not None:
+                state['matrix'].flush()
+            # keys are written after the rows so a crash never leaves keys pointing to unwritten rows
+            if len(new_keys) > 0:
+                with open(self._file_path, "ab") as file:
+                    # drops a partial tail left by a crash so the new keys stay readable
+                    file.truncate(self._keys_end)
+                    pickle.dump(new_keys, file)
+                    self._keys_end = file.tell()
+            self._keys_file_size = os.path.getsize(self._file_path)
+            state.clear()
+            self.release()
+
+    def clear_data(self):
+        self.release()
+        file = open(self._file_path, "wb")
+        file.close()
+        if os.path.exists(self.matrix_path):
+            os.remove(self.matrix_path)
+        self._keys = []
+        self._rows = {}
+        self._keys_file_size = 0
+        self._keys_end = 0
+
+    def release(self):
+        self._matrix = None
+
+    def _load_keys(self):
+        size = os.path.getsize(self._file_path) if os.path.exists(self._file_path) else 0
+        if size == self._keys_file_size:
+            return
+        self._keys = []
+        self._rows = {}
+        self._keys_end = 0
+        if size > 0:
+            with open(self._file_path, "rb") as file:
+                while True:
+                    try:
+                        keys = pickle.load(file)
+                    except (EOFError, pickle.UnpicklingError):
+                        # a partial tail left by a crash is ignored, as in the offset index
+                        break
+                    for key in keys:
+                        self._rows[key] = len(self._keys)
+                        self._keys.append(key)
+                    self._keys_end = file.tell()
+        self._keys_file_size = size
+        self._matrix = None
+
+    def _get_matrix(self) -> Optional[np.memmap]:
+        if self._matrix is None and os.path.exists(self.matrix_path):
+            self._matrix = np.load(self.matrix_path, mmap_mode='r')
+        return self._matrix
+
+    def _open_matrix_for_writing(self) -> np.memmap:
+        return np.load(self.matrix_path, mmap_mode='r+')
+
+    def _create_matrix(self, value: np.ndarray) -> np.memmap:
+        dtype = self._dtype if self._dtype is not None else value.dtype
+        shape = (self._initial_capacity, *value.shape)
+        return np.lib.format.open_memmap(self.matrix_path, mode='w+', dtype=dtype, shape=shape)
+
+    def _grow_matrix(self, state: dict):
+        """
+        Doubles the capacity of state['matrix']. The old map is flushed and every reference to it is dropped before
+        replacing its file, because a mapped file can not be replaced on Windows.
+        """
+        matrix = state.pop('matrix')
+        capacity = max(1, matrix.shape[0] * 2)
+        tmp_path = f'{self.matrix_path}.tmp'
+        grown = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=matrix.dtype, shape=(capacity, *matrix.shape[1:]))
+        grown[:matrix.shape[0]] = matrix
+        grown.flush()
+        matrix.flush()
+        del grown
+        del matrix
+        os.replace(tmp_path, self.matrix_path)
+        state['matrix'] = self._open_matrix_for_writing()
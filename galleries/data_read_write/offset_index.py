@@ -0,0 +1,156 @@
+import os
+import pickle
+from typing import Any, Optional, Tuple
+
+from galleries.data_read_write import serialization
+
+
+INDEX_EXT = 'idx'
+
+
+def get_offset_index_path(data_path: str) -> str:
+    return f'{data_path}.{INDEX_EXT}'
+
+
+def get_record_key(record) -> Any:
+    """
+    Returns the key of a (key, value) record or None if the record does not have that shape.
+    :param record:
+    :return:
+    """
+    try:
+        key, _ = record
+        return key
+    except (TypeError, ValueError):
+        return None
+
+
+class OffsetIndex:
+    """
+    Sidecar index of a pickle data file. Maps each record's key to the (byte offset, length) of the record inside
+    the data file, so a record can be read with a single seek instead of a scan of the whole file.
+
+    The index remembers the size of the data file it covers. If the data file grew without updating the index (e.g.
+    old files written before indexes existed) the missing tail is indexed lazily the next time the index is used.
+
+    The index file is a log of (indexed size, offsets) pickles: save appends only the offsets added since the last
+    save, so writing to a big data file does not rewrite the whole index.
+    """
+
+    def __init__(self, data_path: str):
+        self._data_path = data_path
+        self._index_path = get_offset_index_path(data_path)
+        self._offsets = {}
+        self._indexed_size = 0
+        self._loaded = False
+        # offsets added since the last save and whether the index file must be rewritten instead of appended to
+        self._unsaved_offsets = {}
+        self._rewrite = False
+
+    @property
+    def data_path(self):
+        return self._data_path
+
+    @property
+    def indexed_size(self):
+        return self._indexed_size
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __contains__(self, key):
+        return key in self._offsets
+
+    def keys(self):
+        return self._offsets.keys()
+
+    def items(self):
+        return self._offsets.items()
+
+    def get(self, key) -> Optional[Tuple[int, int]]:
+        return self._offsets.get(key, None)
+
+    def add(self, key, offset: int, length: int):
+        self._offsets[key] = (offset, length)
+        self._unsaved_offsets[key] = (offset, length)
+        self._indexed_size = max(self._indexed_size, offset + length)
+
+    def update(self):
+        """
+        Loads the index from disk and indexes the records of the data file that are not indexed yet.
+        :return:
+        """
+        if not self._loaded:
+            self._load()
+        data_size = os.path.getsize(self._data_path) if os.path.exists(self._data_path) else 0
+        if data_size == self._indexed_size:
+            return
+        if data_size < self._indexed_size:
+            # the data file was truncated or replaced, the whole index is invalid
+            self._offsets = {}
+            self._indexed_size = 0
+            self._rewrite = True
+        indexed_size = self._indexed_size
+        self._index_tail()
+        # a partially written record at the end is not indexed, the index file only changes if some record was
+        if self._rewrite or self._indexed_size != indexed_size:
+            self.save()
+
+    def save(self):
+        """
+        Appends the offsets added since the last save to the index file, or rewrites it if it is invalid.
+        :return:
+        """
+        if self._rewrite or not os.path.exists(self._index_path):
+            with open(self._index_path, 'wb') as file:
+                pickle.dump((self._indexed_size, self._offsets), file)
+        else:
+            with open(self._index_path, 'ab') as file:
+                pickle.dump((self._indexed_size, self._unsaved_offsets), file)
+        self._unsaved_offsets = {}
+        self._rewrite = False
+
+    def clear(self):
+        self._offsets = {}
+        self._indexed_size = 0
+        self._loaded = True
+        self._unsaved_offsets = {}
+        self._rewrite = False
+        if os.path.exists(self._index_path):
+            os.remove(self._index_path)
+
+    def _load(self):
+        self._offsets = {}
+        self._indexed_size = 0
+        if os.path.exists(self._index_path):
+            index_file_size = os.path.getsize(self._index_path)
+            with open(self._index_path, 'rb') as file:
+                while file.tell() < index_file_size:
+                    try:
+                        indexed_size, offsets = pickle.load(file)
+                        self._offsets.update(offsets)
+                    except (EOFError, pickle.UnpicklingError, ValueError, TypeError):
+                        # corrupted or partially written entry, the data file after the last good entry is indexed
+                        # again and the index file is rewritten
+                        self._rewrite = True
+                        break
+                    self._indexed_size = indexed_size
+        self._unsaved_offsets = {}
+        self._loaded = True
+
+    def _index_tail(self):
+        with open(self._data_path, 'rb') as file:
+            file.seek(self._indexed_size)
+            while True:
+                offset = file.tell()
+                try:
+                    record = serialization.load(file)
+                except (EOFError, pickle.UnpicklingError):
+                    # end of file or a partially written record at the end
+                    break
+                length = file.tell() - offset
+                key = get_record_key(record)
+                if key is not None:
+                    self._offsets[key] = (offset, length)
+                    self._unsaved_offsets[key] = (offset, length)
+                self._indexed_size = offset + length
@@ -1,16 +1,39 @@
+import mmap
 import os
 import pickle
-from typing import Generator
+from typing import Generator, Optional
 
 from galleries import files_utils
-from galleries.collections.stream_dictionary import StreamDictionary
+from galleries.collections.bloom_filter import BloomFilter
 from galleries.data_read_write.idata_reader_writer import IDataReaderWriter
+from galleries.data_read_write import serialization
+from galleries.data_read_write.offset_index import OffsetIndex, get_record_key
 from galleries.data_read_write.utils_file_data_readers_writers import *
 
 
+BLOOM_FILTER_EXT = 'bloom'
+
+
+def get_bloom_filter_path(data_path: str) -> str:
+    return f'{data_path}.{BLOOM_FILTER_EXT}'
+
+
 class PickleDataReaderWriter(IDataReaderWriter):
+    BLOOM_FILTER_MIN_CAPACITY = 100000
+    BLOOM_FILTER_ERROR_RATE = 0.01
 
-    def __init__(self, data_identifier, root_folder: str, file_path: str = None, batch_size=100000):
+    def __init__(
+            self,
+            data_identifier,
+            root_folder: str,
+            file_path: str = None,
+            batch_size=100000,
+            out_of_band_buffers=False):
+        """
+        :param out_of_band_buffers: if True records are written as out-of-band frames (see serialization module), so
+        the numpy arrays they hold are read as views over the file memory instead of being copied. Files can mix both
+        kinds of records.
+        """
         super().__init__(data_identifier)
         self._root_folder = root_folder
         if file_path is None:
@@ -19,7 +42,13 @@ class PickleDataReaderWriter(IDataReaderWriter):
             self._file_path = file_path
 
         self._batch_size = batch_size
+        if out_of_band_buffers:
+            serialization.check_out_of_band_support()
+        self._out_of_band_buffers = out_of_band_buffers
         self._file = None
+        self._offset_index = None
+        self._bloom_filter: Optional[BloomFilter] = None
+        self._bloom_filter_data_size = -1
 
     def set_data_identifier(self, data_identifier: DataIdentifier):
         indices = read_index_list(self._root_folder, self._data_identifier)
@@ -28,45 +57,196 @@ class PickleDataReaderWriter(IDataReaderWriter):
         file_path = get_data_path(self._root_folder, self._data_identifier, indices)
         files_utils.create_file_if_doesnt_exist(file_path)
         self._file_path = file_path
+        self._offset_index = None
+        self._bloom_filter = None
 
     def read_all_data(self) -> Generator:
         if os.path.exists(self._file_path):
             self.release()
             self._file = open(self._file_path, "rb")
+            memory = self._map_file(self._file)
             end_reached = False
             try:
                 while not end_reached:
                     try:
-                        row_data = pickle.load(self._file)
+                        row_data = serialization.load(self._file, memory)
                         yield row_data
                     except EOFError:
                         end_reached = True
             finally:
                 self.release()
 
-    def read_data(self, indices) -> Generator:
-        sd = StreamDictionary(self.read_all_data, self._batch_size)
-        for index in indices:
-            data, success = sd.try_get_item(index)
-            yield index, data
+    def read_data(self, indices, keep_order=True) -> Generator:
+        if not os.path.exists(self._file_path):
+            for index in indices:
+                yield index, None
+            return
+
+        offset_index = None
+        if not keep_order:
+            # read in file order so the file is traversed once, sequentially
+            offset_index = self._get_offset_index()
+            indices = sorted(indices, key=lambda i: offset_index.get(i) or (-1, 0))
+        bloom_filter = self._get_bloom_filter()
+        with open(self._file_path, "rb") as file:
+            memory = self._map_file(file)
+            for index in indices:
+                data = None
+                if index in bloom_filter:
+                    # the offset index is only loaded if some index may exist
+                    if offset_index is None:
+                        offset_index = self._get_offset_index()
+                    location = offset_index.get(index)
+                    if location is not None:
+                        _, data = self._read_record(file, memory, *location)
+                yield index, data
+
+    def may_contain(self, key) -> bool:
+        return key in self._get_bloom_filter()
+
+    def contains(self, key) -> bool:
+        """
+        Returns True if a record with key was written. Unlike may_contain it has no false positives, the offset index is
+        only checked if the Bloom filter may contain the key.
+        :param key:
+        :return:
+        """
+        return len(self.get_contained_keys([key])) > 0
+
+    def get_contained_keys(self, keys) -> list:
+        """
+        Returns the keys that were written, in the order of keys. The Bloom filter and the offset index are brought up
+        to date once for all the keys.
+        :param keys:
+        :return:
+        """
+        bloom_filter = self._get_bloom_filter()
+        offset_index = None
+        contained = []
+        for key in keys:
+            if key in bloom_filter:
+                if offset_index is None:
+                    offset_index = self._get_offset_index()
+                if key in offset_index:
+                    contained.append(key)
+        return contained
 
     def write_data(self, data: Generator, notify_function=None, notify_rate=100):
         if not os.path.exists(self._file_path):
             files_utils.create_dir_of_file(self._file_path)
+        offset_index = self._get_offset_index()
+        bloom_filter = self._get_bloom_filter()
+        added_keys = []
         file = open(self._file_path, "ab")
         try:
             def write(d):
-                pickle.dump(d, file)
+                offset = file.tell()
+                if self._out_of_band_buffers:
+                    serialization.dump(d, file)
+                else:
+                    pickle.dump(d, file)
+                key = get_record_key(d)
+                if key is not None:
+                    offset_index.add(key, offset, file.tell() - offset)
+                    bloom_filter.add(key)
+                    added_keys.append(key)
 
             IDataReaderWriter.write_data_with_notifications(data, write, notify_function, notify_rate)
         finally:
             file.close()
+            # sidecars are appended to, so a write costs the same regardless of the size of the data file
+            offset_index.save()
+            self._bloom_filter_data_size = self._get_data_size()
+            if bloom_filter.is_full():
+                self._rebuild_bloom_filter()
+            else:
+                self._append_bloom_filter_keys(added_keys)
 
     def clear_data(self):
         file = open(self._file_path, "wb")
         file.close()
+        self._get_offset_index().clear()
+        self._bloom_filter = None
+        bloom_filter_path = get_bloom_filter_path(self._file_path)
+        if os.path.exists(bloom_filter_path):
+            os.remove(bloom_filter_path)
 
     def release(self):
         if self._file is not None:
             self._file.close()
             self._file = None
+
+    def _get_offset_index(self) -> OffsetIndex:
+        if self._offset_index is None or self._offset_index.data_path != self._file_path:
+            self._offset_index = OffsetIndex(self._file_path)
+        self._offset_index.update()
+        return self._offset_index
+
+    @staticmethod
+    def _map_file(file) -> Optional[mmap.mmap]:
+        """
+        Maps a data file in memory, so out-of-band frames are read as views over it. The map is not closed explicitly
+        because the arrays read may still reference it, it is released when they are garbage collected.
+        """
+        if os.fstat(file.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @staticmethod
+    def _read_record(file, memory, offset: int, length: int):
+        if memory is not None:
+            data = memoryview(memory)[offset:offset + length]
+        else:
+            file.seek(offset)
+            data = file.read(length)
+        return serialization.loads_record(data)
+
+    def _get_data_size(self) -> int:
+        return os.path.getsize(self._file_path) if os.path.exists(self._file_path) else 0
+
+    def _get_bloom_filter(self) -> BloomFilter:
+        if self._bloom_filter is None:
+            self._load_bloom_filter()
+        if self._bloom_filter is None or self._bloom_filter_data_size != self._get_data_size():
+            # missing filter or data written without updating it
+            self._rebuild_bloom_filter()
+        return self._bloom_filter
+
+    def _load_bloom_filter(self):
+        """
+        Loads the Bloom filter file, a (data size, filter) pickle followed by the (data size, keys) pickles appended by
+        each write.
+        """
+        bloom_filter_path = get_bloom_filter_path(self._file_path)
+        if os.path.exists(bloom_filter_path):
+            bloom_filter_file_size = os.path.getsize(bloom_filter_path)
+            try:
+                with open(bloom_filter_path, "rb") as file:
+                    self._bloom_filter_data_size, self._bloom_filter = pickle.load(file)
+                    if not isinstance(self._bloom_filter, BloomFilter):
+                        raise ValueError("The Bloom filter file does not start with a filter")
+                    while file.tell() < bloom_filter_file_size:
+                        self._bloom_filter_data_size, keys = pickle.load(file)
+                        for key in keys:
+                            self._bloom_filter.add(key)
+            except (EOFError, pickle.UnpicklingError, ValueError, TypeError):
+                self._bloom_filter = None
+
+    def _rebuild_bloom_filter(self):
+        offset_index = self._get_offset_index()
+        capacity = max(self.BLOOM_FILTER_MIN_CAPACITY, 2 * len(offset_index))
+        self._bloom_filter = BloomFilter.from_keys(offset_index.keys(), capacity, self.BLOOM_FILTER_ERROR_RATE)
+        self._bloom_filter_data_size = self._get_data_size()
+        self._save_bloom_filter()
+
+    def _save_bloom_filter(self):
+        with open(get_bloom_filter_path(self._file_path), "wb") as file:
+            pickle.dump((self._bloom_filter_data_size, self._bloom_filter), file)
+
+    def _append_bloom_filter_keys(self, keys: list):
+        bloom_filter_path = get_bloom_filter_path(self._file_path)
+        if not os.path.exists(bloom_filter_path):
+            self._save_bloom_filter()
+            return
+        with open(bloom_filter_path, "ab") as file:
+            pickle.dump((self._bloom_filter_data_size, keys), file)
@@ -0,0 +1,155 @@
+import pickle
+import struct
+import sys
+from typing import Any, List
+
+if sys.version_info >= (3, 8):
+    _pickle5 = pickle
+else:
+    try:
+        import pickle5 as _pickle5
+    except ImportError:
+        _pickle5 = None
+
+
+# Records are pickled with protocol 5 keeping the buffers of contiguous arrays out of the pickle stream. A frame
+# stores them after it, aligned:
+#     magic | pickle length | buffers count | buffers lengths | pickle bytes | buffer 0 | buffer 1 | ...
+# When a frame is loaded from a memory buffer (bytes, mmap, ...) the arrays are views over it instead of copies.
+OUT_OF_BAND_MAGIC = b'\x00GOB'
+ALIGNMENT = 64
+
+# out-of-band frames need pickle protocol 5, available from Python 3.8 or with the pickle5 backport
+OUT_OF_BAND_SUPPORTED = _pickle5 is not None
+
+_HEADER = struct.Struct('<4sQI')
+_BUFFER_LENGTH = struct.Struct('<Q')
+
+
+def check_out_of_band_support():
+    if not OUT_OF_BAND_SUPPORTED:
+        raise RuntimeError("Out-of-band buffers need Python 3.8 or later, or the pickle5 package")
+
+
+def _align(position: int) -> int:
+    return (position + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _get_layout(pickle_length: int, buffers_lengths: List[int]):
+    """
+    Returns the offset of the pickle bytes, the offsets of each buffer and the total length of a frame.
+    """
+    header_length = _HEADER.size + _BUFFER_LENGTH.size * len(buffers_lengths)
+    pickle_offset = _align(header_length)
+    position = pickle_offset + pickle_length
+    buffers_offsets = []
+    for length in buffers_lengths:
+        position = _align(position)
+        buffers_offsets.append(position)
+        position += length
+    return pickle_offset, buffers_offsets, position
+
+
+def _get_frame_parts(obj: Any):
+    check_out_of_band_support()
+    buffers = []
+    pickle_bytes = _pickle5.dumps(obj, protocol=5, buffer_callback=buffers.append)
+    raw_buffers = [buffer.raw() for buffer in buffers]
+    buffers_lengths = [raw.nbytes for raw in raw_buffers]
+    header = _HEADER.pack(OUT_OF_BAND_MAGIC, len(pickle_bytes), len(raw_buffers))
+    header += b''.join(_BUFFER_LENGTH.pack(length) for length in buffers_lengths)
+    pickle_offset, buffers_offsets, total_length = _get_layout(len(pickle_bytes), buffers_lengths)
+
+    parts = [header]
+    position = len(header)
+    for offset, part in zip([pickle_offset] + buffers_offsets, [pickle_bytes] + raw_buffers):
+        parts.append(b'\0' * (offset - position))
+        parts.append(part)
+        position = offset + memoryview(part).nbytes
+    return parts
+
+
+def is_out_of_band(data) -> bool:
+    return bytes(data[:len(OUT_OF_BAND_MAGIC)]) == OUT_OF_BAND_MAGIC
+
+
+def dump(obj: Any, file):
+    """
+    Writes obj to file as an out-of-band frame. Array buffers are written directly, without copying them.
+    :param obj:
+    :param file:
+    :return:
+    """
+    for part in _get_frame_parts(obj):
+        file.write(part)
+
+
+def dumps(obj: Any) -> bytes:
+    return b''.join(_get_frame_parts(obj))
+
+
+def loads(data) -> Any:
+    """
+    Loads an out-of-band frame. The arrays of the returned object are views over data.
+    :param data: bytes-like object holding a frame.
+    :return:
+    """
+    check_out_of_band_support()
+    data = memoryview(data)
+    magic, pickle_length, buffers_count = _HEADER.unpack_from(data, 0)
+    if magic != OUT_OF_BAND_MAGIC:
+        raise pickle.UnpicklingError("Data is not an out-of-band frame")
+    buffers_lengths = [
+        _BUFFER_LENGTH.unpack_from(data, _HEADER.size + i * _BUFFER_LENGTH.size)[0] for i in range(buffers_count)
+    ]
+    pickle_offset, buffers_offsets, _ = _get_layout(pickle_length, buffers_lengths)
+    buffers = [data[offset:offset + length] for offset, length in zip(buffers_offsets, buffers_lengths)]
+    return _pickle5.loads(data[pickle_offset:pickle_offset + pickle_length], buffers=buffers)
+
+
+def loads_record(data) -> Any:
+    """
+    Loads a record that can be either pickled or an out-of-band frame.
+    :param data: bytes-like object holding the record.
+    :return:
+    """
+    if is_out_of_band(data):
+        return loads(data)
+    return pickle.loads(data)
+
+
+def load(file, memory=None) -> Any:
+    """
+    Loads the next record of a file that may hold both pickled records and out-of-band frames.
+    :param file: binary file positioned at the start of a record.
+    :param memory: optional bytes-like object with the whole file content (e.g. an mmap of it). If given, the arrays
+    of out-of-band frames are views over it instead of copies.
+    :return:
+    """
+    position = file.tell()
+    head = file.read(_HEADER.size)
+    if len(head) == 0:
+        raise EOFError
+    if not head.startswith(OUT_OF_BAND_MAGIC):
+        file.seek(position)
+        return pickle.load(file)
+
+    if len(head) < _HEADER.size:
+        raise pickle.UnpicklingError("Truncated out-of-band frame")
+    _, pickle_length, buffers_count = _HEADER.unpack(head)
+    lengths_bytes = file.read(_BUFFER_LENGTH.size * buffers_count)
+    if len(lengths_bytes) < _BUFFER_LENGTH.size * buffers_count:
+        raise pickle.UnpicklingError("Truncated out-of-band frame")
+    buffers_lengths = [length for length, in _BUFFER_LENGTH.iter_unpack(lengths_bytes)]
+    _, _, total_length = _get_layout(pickle_length, buffers_lengths)
+
+    if memory is not None:
+        data = memoryview(memory)[position:position + total_length]
+        file.seek(position + total_length)
+    else:
+        file.seek(position)
+        data = bytearray(total_length)
+        data = memoryview(data)[:file.readinto(data)]
+    if len(data) < total_length:
+        raise pickle.UnpicklingError("Truncated out-of-band frame")
+    return loads(data)
@@ -0,0 +1,210 @@
+import argparse
+import os
+import shutil
+import socket
+from typing import Generator, List
+
+from galleries import files_utils
+from galleries.data_read_write.idata_reader_writer import IDataReaderWriter
+from galleries.data_read_write.offset_index import get_offset_index_path, get_record_key
+from galleries.data_read_write.pickle_data_reader_writer import PickleDataReaderWriter, get_bloom_filter_path
+from galleries.data_read_write.utils_file_data_readers_writers import *
+
+
+SHARDS_DIRECTORY_EXT = 'shards.d'
+
+
+def get_shards_directory(data_path: str) -> str:
+    root, _ = os.path.splitext(data_path)
+    return f'{root}.{SHARDS_DIRECTORY_EXT}'
+
+
+def get_shard_path(data_path: str, shard_id: str) -> str:
+    root, ext = os.path.splitext(data_path)
+    return f'{root}.{shard_id}{ext}'
+
+
+def get_default_shard_id() -> str:
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+class ShardedDataReaderWriter(IDataReaderWriter):
+    """
+    Pickle data split in shards so several processes, even in different nodes, can write data of the same data
+    identifier at the same time. Each writer appends to its own shard file, next to the data file, and registers it
+    with an empty marker file in a shards directory, so registrations never write to a shared file. Readers merge the
+    data file and all the registered shards; when a key is in several of them, the shard registered last wins, even if
+    an earlier registered shard wrote the key again afterwards. Shards are ordered by the modification time of their
+    markers, i.e. the time they were registered, ties broken by name. The data file is older than every shard.
+
+    merge_shards folds the shards back into the data file. It must run when no writer is active.
+    """
+
+    def __init__(
+            self,
+            data_identifier,
+            root_folder: str,
+            file_path: str = None,
+            shard_id: str = None,
+            out_of_band_buffers=False):
+        super().__init__(data_identifier)
+        self._root_folder = root_folder
+        self._readers_writers = {}
+        if file_path is None:
+            self.set_data_identifier(data_identifier)
+        else:
+            self._file_path = file_path
+
+        self._shard_id = shard_id or get_default_shard_id()
+        self._out_of_band_buffers = out_of_band_buffers
+
+    @property
+    def shard_id(self):
+        return self._shard_id
+
+    @property
+    def shards_directory(self):
+        return get_shards_directory(self._file_path)
+
+    def set_data_identifier(self, data_identifier: DataIdentifier):
+        indices = read_index_list(self._root_folder, self._data_identifier)
+        add_generator_to_indices_if_not_exists(self._data_identifier, indices)
+        write_indices(self._root_folder, self._data_identifier, indices)
+        file_path = get_data_path(self._root_folder, self._data_identifier, indices)
+        files_utils.create_file_if_doesnt_exist(file_path)
+        self._file_path = file_path
+        self.release()
+        self._readers_writers = {}
+
+    def read_shards_list(self) -> List[str]:
+        """
+        Returns the paths of the registered shards in registration order.
+        :return:
+        """
+        if not os.path.isdir(self.shards_directory):
+            return []
+        folder = os.path.dirname(self._file_path)
+        markers = []
+        with os.scandir(self.shards_directory) as entries:
+            for entry in entries:
+                try:
+                    markers.append((entry.stat().st_mtime_ns, entry.name))
+                except OSError:
+                    # removed by a concurrent merge
+                    continue
+        return [os.path.join(folder, name) for _, name in sorted(markers)]
+
+    def read_all_data(self) -> Generator:
+        """
+        Yields the records of the shards, last registered shard first, and then the data file. A key written in several
+        of them is only yielded from the last registered one. The keys of the files already read are kept in memory.
+        :return:
+        """
+        newer_keys = set()
+        for file_path in reversed(self._get_files_paths()):
+            file_keys = set()
+            for record in self._get_reader_writer(file_path).read_all_data():
+                key = get_record_key(record)
+                if key is not None:
+                    if key in newer_keys:
+                        continue
+                    file_keys.add(key)
+                yield record
+            newer_keys |= file_keys
+
+    def read_data(self, indices, keep_order=True) -> Generator:
+        indices = list(indices)
+        found = {}
+        for file_path in reversed(self._get_files_paths()):
+            reader_writer = self._get_reader_writer(file_path)
+            # membership is checked in the offset index, a None value written in a later registered shard hides the
+            # values of the older ones
+            present = reader_writer.get_contained_keys(index for index in indices if index not in found)
+            if len(present) == 0:
+                continue
+            for index, data in reader_writer.read_data(present, keep_order=False):
+                found[index] = data
+        for index in indices:
+            yield index, found.get(index, None)
+
+    def may_contain(self, key) -> bool:
+        return any(self._get_reader_writer(file_path).may_contain(key) for file_path in self._get_files_paths())
+
+    def write_data(self, data: Generator, notify_function=None, notify_rate=100):
+        shard_path = get_shard_path(self._file_path, self._shard_id)
+        self._register_shard(shard_path)
+        self._get_reader_writer(shard_path).write_data(data, notify_function, notify_rate)
+
+    def merge_shards(self, notify_function=None, notify_rate=100000):
+        """
+        Appends the data of all shards to the data file and removes the shards. Must not run while other processes
+        write to the shards.
+        :return:
+        """
+        shards = self.read_shards_list()
+        if len(shards) == 0:
+            return
+        data = (record for shard_path in shards for record in self._get_reader_writer(shard_path).read_all_data())
+        self._get_reader_writer(self._file_path).write_data(data, notify_function, notify_rate)
+        for shard_path in shards:
+            self._remove_shard(shard_path)
+        self._remove_registrations()
+
+    def clear_data(self):
+        for shard_path in self.read_shards_list():
+            self._remove_shard(shard_path)
+        self._remove_registrations()
+        self._get_reader_writer(self._file_path).clear_data()
+
+    def release(self):
+        for reader_writer in self._readers_writers.values():
+            reader_writer.release()
+
+    def _get_files_paths(self) -> List[str]:
+        return [self._file_path] + self.read_shards_list()
+
+    def _get_reader_writer(self, file_path: str) -> PickleDataReaderWriter:
+        if file_path not in self._readers_writers:
+            self._readers_writers[file_path] = PickleDataReaderWriter(
+                self._data_identifier,
+                self._root_folder,
+                file_path,
+                out_of_band_buffers=self._out_of_band_buffers
+            )
+        return self._readers_writers[file_path]
+
+    def _register_shard(self, shard_path: str):
+        if shard_path in self.read_shards_list():
+            return
+        # each writer creates its own marker, no file is written by several writers, e.g. in different nfs clients
+        os.makedirs(self.shards_directory, exist_ok=True)
+        marker_path = os.path.join(self.shards_directory, os.path.basename(shard_path))
+        try:
+            open(marker_path, 'x').close()
+        except FileExistsError:
+            pass
+
+    def _remove_registrations(self):
+        if os.path.isdir(self.shards_directory):
+            shutil.rmtree(self.shards_directory)
+
+    def _remove_shard(self, shard_path: str):
+        reader_writer = self._readers_writers.pop(shard_path, None)
+        if reader_writer is not None:
+            reader_writer.release()
+        for path in [shard_path, get_offset_index_path(shard_path), get_bloom_filter_path(shard_path)]:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Merges the shards of a data identifier into its data file.")
+    parser.add_argument('root_folder')
+    parser.add_argument('gallery_name')
+    parser.add_argument('data_type_id')
+    parser.add_argument('algorithm_id')
+    args = parser.parse_args()
+
+    identifier = DataIdentifier(args.gallery_name, args.data_type_id, args.algorithm_id)
+    sharded = ShardedDataReaderWriter(identifier, args.root_folder)
+    sharded.merge_shards(notify_function=lambda count: print(f"Data merged: {count}"))
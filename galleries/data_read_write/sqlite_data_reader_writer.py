@@ -1,4 +1,5 @@
 import io
+import numbers
 import pickle
 
 import numpy as np
@@ -8,7 +9,7 @@ from sqlite3 import Connection
 from typing import Generator, Optional
 
 from galleries import files_utils
-from galleries.collections.stream_dictionary import StreamDictionary
+from galleries.data_read_write import serialization
 from galleries.data_read_write.idata_reader_writer import IDataReaderWriter
 from galleries.data_read_write.utils_file_data_readers_writers import *
 
@@ -19,11 +20,14 @@ def adapt_array(arr):
     """
     out = io.BytesIO()
     np.save(out, arr)
-    out.seek(0)
-    return sqlite3.Binary(out.read())
+    return sqlite3.Binary(out.getbuffer())
 
 
 def convert_array(text):
+    """
+    Reads an array saved by adapt_array. The array is a writable copy; values written with out_of_band_buffers are
+    the ones read as views (see SqliteDataReaderWriter).
+    """
     out = io.BytesIO(text)
     out.seek(0)
     return np.load(out)
@@ -35,10 +39,114 @@ sqlite3.register_adapter(np.ndarray, adapt_array)
 sqlite3.register_converter("array", convert_array)
 
 
+def encode_key(key):
+    """
+    Encodes a record key as a value that can be stored in the key column. Integers, floats and strings are stored as
+    they are so they can be compared and indexed by sqlite, any other key is pickled.
+    :param key:
+    :return:
+    """
+    if isinstance(key, numbers.Integral):
+        return int(key)
+    if isinstance(key, (float, str)):
+        return key
+    return pickle.dumps(key)
+
+
+def decode_key(value):
+    if isinstance(value, bytes):
+        return pickle.loads(value)
+    return value
+
+
+class SqliteBulkWriteOptions:
+    """
+    Settings of SqliteDataReaderWriter.write_data for bulk ingestion.
+
+    Records are inserted with executemany in batches of batch_size. A commit is made each time commit_rows records or
+    commit_bytes bytes of values were written since the last commit (only at the end if both are None).
+    journal_mode and synchronous are applied as sqlite pragmas (None keeps sqlite defaults). If defer_index is True the
+    key index is dropped during the load and created once at the end.
+    """
+
+    JOURNAL_MODES = ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF")
+    SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+    def __init__(
+            self,
+            batch_size: int = 10000,
+            commit_rows: Optional[int] = None,
+            commit_bytes: Optional[int] = None,
+            journal_mode: Optional[str] = "WAL",
+            synchronous: Optional[str] = "NORMAL",
+            cache_size_kib: Optional[int] = None,
+            defer_index: bool = False):
+        if journal_mode is not None and journal_mode.upper() not in self.JOURNAL_MODES:
+            raise ValueError(f"Wrong journal mode {journal_mode}. Valid modes are {self.JOURNAL_MODES}")
+        if synchronous is not None and synchronous.upper() not in self.SYNCHRONOUS_LEVELS:
+            raise ValueError(f"Wrong synchronous level {synchronous}. Valid levels are {self.SYNCHRONOUS_LEVELS}")
+        self._batch_size = batch_size
+        self._commit_rows = commit_rows
+        self._commit_bytes = commit_bytes
+        self._journal_mode = journal_mode.upper() if journal_mode is not None else None
+        self._synchronous = synchronous.upper() if synchronous is not None else None
+        self._cache_size_kib = cache_size_kib
+        self._defer_index = defer_index
+
+    @property
+    def batch_size(self):
+        return self._batch_size
+
+    @property
+    def commit_rows(self):
+        return self._commit_rows
+
+    @property
+    def commit_bytes(self):
+        return self._commit_bytes
+
+    @property
+    def journal_mode(self):
+        return self._journal_mode
+
+    @property
+    def synchronous(self):
+        return self._synchronous
+
+    @property
+    def cache_size_kib(self):
+        return self._cache_size_kib
+
+    @property
+    def defer_index(self):
+        return self._defer_index
+
+    def exceeds_commit_budget(self, rows: int, size: int) -> bool:
+        exceeds_rows = self._commit_rows is not None and rows >= self._commit_rows
+        exceeds_bytes = self._commit_bytes is not None and size >= self._commit_bytes
+        return exceeds_rows or exceeds_bytes
+
+
+_DEFAULT_WRITE_OPTIONS = SqliteBulkWriteOptions(batch_size=1000, journal_mode=None, synchronous=None)
+
+
 class SqliteDataReaderWriter(IDataReaderWriter):
     TABLE_NAME = "Data"
+    KEY_INDEX_NAME = "Data_key"
+    IN_QUERY_CHUNK_SIZE = 500
 
-    def __init__(self, data_identifier, root_folder: str, file_path: str = None, batch_size=100000):
+    def __init__(
+            self,
+            data_identifier,
+            root_folder: str,
+            file_path: str = None,
+            batch_size=100000,
+            bulk_options: SqliteBulkWriteOptions = None,
+            out_of_band_buffers=False):
+        """
+        :param out_of_band_buffers: if True values are stored as out-of-band frames (see serialization module), so
+        the numpy arrays they hold are read as views over the blobs instead of being copied.
+        """
         super().__init__(data_identifier)
         self._root_folder = root_folder
         if file_path is None:
@@ -47,8 +155,20 @@ class SqliteDataReaderWriter(IDataReaderWriter):
             self._file_path = file_path
 
         self._batch_size = batch_size
+        self._bulk_options = bulk_options
+        if out_of_band_buffers:
+            serialization.check_out_of_band_support()
+        self._out_of_band_buffers = out_of_band_buffers
         self._connection: Optional[Connection] = None
 
+    @property
+    def bulk_options(self) -> Optional[SqliteBulkWriteOptions]:
+        return self._bulk_options
+
+    @bulk_options.setter
+    def bulk_options(self, value: Optional[SqliteBulkWriteOptions]):
+        self._bulk_options = value
+
     def set_data_identifier(self, data_identifier: DataIdentifier):
         indices = read_index_list(self._root_folder, self._data_identifier)
         add_generator_to_indices_if_not_exists(self._data_identifier, indices)
@@ -62,19 +182,52 @@ class SqliteDataReaderWriter(IDataReaderWriter):
         self._connect(self._file_path)
         cur = self._connection.cursor()
         try:
-            data = cur.execute("SELECT * FROM Data")
-            for d in data:
-                yield pickle.loads(d[0])
-        except:
+            if self._is_legacy_table(cur):
+                data = cur.execute("SELECT data FROM Data")
+                for d in data:
+                    yield pickle.loads(d[0])
+            else:
+                data = cur.execute("SELECT key, data FROM Data")
+                for key, value in data:
+                    yield decode_key(key), serialization.loads_record(value)
+        except sqlite3.OperationalError:
             pass
         finally:
             self.release()
 
-    def read_data(self, indices) -> Generator:
-        sd = StreamDictionary(self.read_all_data, self._batch_size)
-        for index in indices:
-            data, success = sd.try_get_item(index)
-            yield index, data
+    def read_data(self, indices, keep_order=True) -> Generator:
+        self.release()
+        self._connect(self._file_path)
+        cur = self._connection.cursor()
+        try:
+            legacy = self._is_legacy_table(cur)
+            exists_table = self._exists_table(cur)
+        finally:
+            self.release()
+
+        if legacy:
+            yield from self.read_data_in_single_pass(self.read_all_data(), indices, keep_order)
+        elif not exists_table:
+            for index in indices:
+                yield index, None
+        else:
+            yield from self._read_data_by_key(indices)
+
+    def may_contain(self, key) -> bool:
+        if not os.path.exists(self._file_path):
+            return False
+        # the connection is reused and not released, it may be in use by a read_all_data generator, e.g. in a
+        # StreamDictionary that uses may_contain as key filter. It is closed by release.
+        if self._connection is None:
+            self._connect(self._file_path)
+        cur = self._connection.cursor()
+        try:
+            if self._is_legacy_table(cur):
+                return True
+            row = cur.execute("SELECT 1 FROM Data WHERE key = ?", [encode_key(key)]).fetchone()
+            return row is not None
+        except sqlite3.OperationalError:
+            return False
 
     def write_data(self, data: Generator, notify_function=None, notify_rate=100):
         self.release()
@@ -82,31 +235,58 @@ class SqliteDataReaderWriter(IDataReaderWriter):
         if not exists:
             files_utils.create_dir_of_file(self._file_path)
 
+        options = self._bulk_options or _DEFAULT_WRITE_OPTIONS
         try:
             self._connect(self._file_path)
+            self._apply_pragmas(options)
             cur = self._connection.cursor()
-            exists_table = False
-            try:
-                tables = cur.execute("""SELECT name FROM sqlite_master WHERE type='table' AND name='Data'; """).fetchall()
-                exists_table = tables != []
-            except sqlite3.OperationalError:
-                pass
-            if not exists_table:
-                cur.execute("CREATE TABLE Data (data BLOB)")
+            if self._is_legacy_table(cur):
+                self._migrate_legacy_table(cur)
+            self._create_table_if_not_exists(cur, create_index=not options.defer_index)
+            if options.defer_index:
+                cur.execute(f"DROP INDEX IF EXISTS {self.KEY_INDEX_NAME}")
+
+            buffer = []
+            uncommitted = [0, 0]  # rows and bytes written since the last commit
+
+            def flush():
+                cur.executemany("INSERT OR REPLACE INTO Data (key, data) VALUES(?, ?)", buffer)
+                buffer.clear()
+                if options.exceeds_commit_budget(*uncommitted):
+                    self._connection.commit()
+                    uncommitted[0] = uncommitted[1] = 0
 
             def write(d):
-                bd = pickle.dumps(d)
-                cur.execute("INSERT INTO Data (data) VALUES(?)", [bd])
-            self.write_data_with_notifications(data, write, notify_function, notify_rate)
+                key, value = d
+                blob = self._encode_value(value)
+                buffer.append([encode_key(key), blob])
+                uncommitted[0] += 1
+                uncommitted[1] += len(blob)
+                if len(buffer) >= options.batch_size:
+                    flush()
 
-            self._connection.commit()
+            try:
+                self.write_data_with_notifications(data, write, notify_function, notify_rate)
+                if len(buffer) > 0:
+                    flush()
+                self._connection.commit()
+            finally:
+                if options.defer_index:
+                    self._create_key_index(cur)
+                    self._connection.commit()
         finally:
             self.release()
 
     def clear_data(self):
         self._connect(self._file_path)
         cur = self._connection.cursor()
-        cur.execute("DELETE FROM Data")
+        try:
+            cur.execute("DELETE FROM Data")
+            self._connection.commit()
+        except sqlite3.OperationalError:
+            pass
+        finally:
+            self.release()
 
     def release(self):
         if self._connection is not None:
@@ -116,3 +296,85 @@ class SqliteDataReaderWriter(IDataReaderWriter):
     def _connect(self, file_path):
         self.release()
         self._connection = sqlite3.connect(file_path, detect_types=sqlite3.PARSE_DECLTYPES)
+
+    def _read_data_by_key(self, indices):
+        self._connect(self._file_path)
+        cur = self._connection.cursor()
+        try:
+            chunk = []
+            for index in indices:
+                chunk.append(index)
+                if len(chunk) == self.IN_QUERY_CHUNK_SIZE:
+                    yield from self._read_chunk(cur, chunk)
+                    chunk = []
+            if len(chunk) > 0:
+                yield from self._read_chunk(cur, chunk)
+        finally:
+            self.release()
+
+    @staticmethod
+    def _read_chunk(cur, indices):
+        keys = list({encode_key(index) for index in indices})
+        placeholders = ", ".join("?" * len(keys))
+        rows = cur.execute(f"SELECT key, data FROM Data WHERE key IN ({placeholders})", keys).fetchall()
+        values = {key: value for key, value in rows}
+        for index in indices:
+            value = values.get(encode_key(index), None)
+            data = serialization.loads_record(value) if value is not None else None
+            yield index, data
+
+    def _encode_value(self, value) -> bytes:
+        if self._out_of_band_buffers:
+            return serialization.dumps(value)
+        return pickle.dumps(value)
+
+    @staticmethod
+    def _exists_table(cur) -> bool:
+        tables = cur.execute("""SELECT name FROM sqlite_master WHERE type='table' AND name='Data'; """).fetchall()
+        return tables != []
+
+    @staticmethod
+    def _get_columns(cur):
+        return [column[1] for column in cur.execute("PRAGMA table_info(Data)").fetchall()]
+
+    @staticmethod
+    def _is_legacy_table(cur) -> bool:
+        """
+        Tables written by older versions only have a data column holding the whole pickled record.
+        """
+        columns = SqliteDataReaderWriter._get_columns(cur)
+        return len(columns) > 0 and "key" not in columns
+
+    def _create_table_if_not_exists(self, cur, create_index=True):
+        cur.execute("CREATE TABLE IF NOT EXISTS Data (key, data BLOB)")
+        if create_index:
+            self._create_key_index(cur)
+
+    def _create_key_index(self, cur):
+        exists_index = cur.execute(
+            "SELECT name FROM sqlite_master WHERE type='index' AND name=?", [self.KEY_INDEX_NAME]
+        ).fetchall() != []
+        if not exists_index:
+            # rows loaded without the index may have repeated keys, keep the last written one
+            cur.execute("DELETE FROM Data WHERE rowid NOT IN (SELECT MAX(rowid) FROM Data GROUP BY key)")
+            cur.execute(f"CREATE UNIQUE INDEX {self.KEY_INDEX_NAME} ON Data (key)")
+
+    def _apply_pragmas(self, options: 'SqliteBulkWriteOptions'):
+        if options.journal_mode is not None:
+            self._connection.execute(f"PRAGMA journal_mode={options.journal_mode}")
+        if options.synchronous is not None:
+            self._connection.execute(f"PRAGMA synchronous={options.synchronous}")
+        if options.cache_size_kib is not None:
+            self._connection.execute(f"PRAGMA cache_size=-{int(options.cache_size_kib)}")
+
+    def _migrate_legacy_table(self, cur):
+        cur.execute("ALTER TABLE Data RENAME TO Data_legacy")
+        self._create_table_if_not_exists(cur)
+        legacy_rows = self._connection.execute("SELECT data FROM Data_legacy")
+        records = (pickle.loads(row[0]) for row in legacy_rows)
+        cur.executemany(
+            "INSERT OR REPLACE INTO Data (key, data) VALUES(?, ?)",
+            ([encode_key(key), self._encode_value(value)] for key, value in records)
+        )
+        cur.execute("DROP TABLE Data_legacy")
+        self._connection.commit()
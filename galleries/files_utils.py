@@ -1,34 +1,180 @@
 import os
+import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
 
 
 image_types = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff")
 
 
-def list_images(basePath, contains=None, recursive=True):
+def list_images(basePath, contains=None, recursive=True, scanner: Optional['DirectoryScanner'] = None):
     # return the set of files that are valid
-    return list_files(basePath, validExts=image_types, contains=contains, recursive=recursive)
+    return list_files(basePath, validExts=image_types, contains=contains, recursive=recursive, scanner=scanner)
 
 
-def list_files(basePath, validExts=None, contains=None, recursive=True):
-    # loop over the directory structure
-    for (rootDir, dirNames, filenames) in os.walk(basePath):
-        # loop over the filenames in the current directory
-        for filename in filenames:
-            # if the contains string is not none and the filename does not contain
-            # the supplied string, then ignore the file
-            if contains is not None and filename.find(contains) == -1:
+def list_files(basePath, validExts=None, contains=None, recursive=True, scanner: Optional['DirectoryScanner'] = None):
+    """
+    Lists the files of a directory.
+    :param basePath: directory to list.
+    :param validExts: tuple of valid lower case extensions. None to list all files.
+    :param contains: if it is not None, only files whose name contains it are listed.
+    :param recursive: list the files of the subdirectories too.
+    :param scanner: scanner to reuse between listings, so unchanged directories are not listed again.
+    :return:
+    """
+    scanner = scanner or DirectoryScanner()
+    for imagePath in scanner.scan(basePath, recursive=recursive):
+        filename = os.path.basename(imagePath)
+        # if the contains string is not none and the filename does not contain
+        # the supplied string, then ignore the file
+        if contains is not None and filename.find(contains) == -1:
+            continue
+
+        # determine the file extension of the current file
+        ext = filename[filename.rfind("."):].lower()
+
+        # check to see if the file is an image and should be processed
+        if validExts is None or ext.endswith(validExts):
+            yield imagePath
+
+
+class DirectoryScanner:
+    """
+    Lists the files of a directory tree with os.scandir, scanning the directories of each level of the tree in a pool
+    of threads. It keeps a snapshot of each scanned directory with its modification time, files and subdirectories, so
+    a rescan only stats each directory and lists again the ones whose modification time changed. The snapshot can be
+    persisted in snapshot_path to be reused between processes.
+
+    Files are listed in the same order as os.walk: the files of a directory, then the files of each of its
+    subdirectories.
+    """
+
+    # directories modified this recently are listed again in the next scan, because file systems with coarse time
+    # resolution may not change their modification time if they are modified again
+    UNTRUSTED_MTIME_SECONDS = 2
+
+    def __init__(self, snapshot_path: Optional[str] = None, workers: int = 16):
+        """
+        :param snapshot_path: file to persist the snapshot. None to keep it only in memory.
+        :param workers: number of threads that scan directories.
+        """
+        self._snapshot_path = snapshot_path
+        self._workers = workers
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_snapshot'] = None  # it is loaded again from snapshot_path
+        state.pop('_lock')
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__ = state
+        self._lock = threading.Lock()
+
+    @property
+    def snapshot_path(self):
+        return self._snapshot_path
+
+    def scan(self, base_path: str, recursive: bool = True) -> List[str]:
+        """
+        Returns the paths of the files in base_path.
+        :param base_path:
+        :param recursive: include the files of the subdirectories.
+        :return:
+        """
+        with self._lock:
+            snapshot = self._get_snapshot()
+            tree = {}
+            changed = [False]
+
+            def scan_directory(directory):
+                entry, directory_changed = self._scan_directory(directory, snapshot.get(directory, None))
+                changed[0] |= directory_changed
+                return entry
+
+            level = [base_path]
+            with ThreadPoolExecutor(max(1, self._workers)) as executor:
+                while len(level) > 0:
+                    next_level = []
+                    for directory, entry in zip(level, executor.map(scan_directory, level)):
+                        if entry is None:
+                            continue
+                        tree[directory] = entry
+                        if recursive:
+                            next_level.extend(entry[2])
+                    level = next_level
+
+            if recursive:
+                # subdirectories that do not exist anymore
+                prefix = os.path.join(base_path, '')
+                removed = [d for d in snapshot if d.startswith(prefix) and d not in tree]
+                for directory in removed:
+                    del snapshot[directory]
+                changed[0] |= len(removed) > 0
+            snapshot.update(tree)
+            if changed[0]:
+                self._save_snapshot()
+
+        return list(self._walk(tree, base_path))
+
+    @staticmethod
+    def _walk(tree: dict, base_path: str):
+        stack = [base_path]
+        while len(stack) > 0:
+            entry = tree.get(stack.pop(), None)
+            if entry is None:
                 continue
+            _, files, subdirectories = entry
+            yield from files
+            stack.extend(reversed(subdirectories))
 
-            # determine the file extension of the current file
-            ext = filename[filename.rfind("."):].lower()
+    def _scan_directory(self, directory: str, snapshot_entry) -> Tuple[Optional[tuple], bool]:
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return None, snapshot_entry is not None
+        if snapshot_entry is not None and snapshot_entry[0] == mtime:
+            return snapshot_entry, False
 
-            # check to see if the file is an image and should be processed
-            if validExts is None or ext.endswith(validExts):
-                # construct the path to the image and yield it
-                imagePath = os.path.join(rootDir, filename)
-                yield imagePath
-        if not recursive:
-            break
+        files = []
+        subdirectories = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirectories.append(entry.path)
+                    elif entry.is_file():
+                        files.append(entry.path)
+        except OSError:
+            return None, snapshot_entry is not None
+        if time.time_ns() - mtime < self.UNTRUSTED_MTIME_SECONDS * 10 ** 9:
+            mtime = None
+        return (mtime, files, subdirectories), True
+
+    def _get_snapshot(self) -> dict:
+        if self._snapshot is None:
+            self._snapshot = {}
+            if self._snapshot_path is not None and os.path.exists(self._snapshot_path):
+                try:
+                    with open(self._snapshot_path, 'rb') as file:
+                        self._snapshot = pickle.load(file)
+                except (EOFError, pickle.UnpicklingError, ValueError):
+                    # corrupted snapshot, the directories are scanned again
+                    self._snapshot = {}
+        return self._snapshot
+
+    def _save_snapshot(self):
+        if self._snapshot_path is None:
+            return
+        create_dir_of_file(self._snapshot_path)
+        temp_path = f"{self._snapshot_path}.tmp"
+        with open(temp_path, 'wb') as file:
+            pickle.dump(self._snapshot, file)
+        os.replace(temp_path, self._snapshot_path)
 
 
 def create_dir_of_file(file):
@@ -46,3 +192,15 @@ def create_file_if_doesnt_exist(file_path: str):
     create_dir_of_file(file_path)
     if not os.path.exists(file_path):
         open(file_path, "w").close()
+
+
+def get_file_mtime(file_path) -> Optional[int]:
+    """
+    Returns the modification time, in nanoseconds, of a file or None if file_path is not a path of an existing file.
+    :param file_path:
+    :return:
+    """
+    try:
+        return os.stat(file_path).st_mtime_ns
+    except (TypeError, ValueError, OSError):
+        return None
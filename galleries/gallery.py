@@ -1,27 +1,53 @@
 import numpy as np
-from typing import Any, Dict, Optional, List
+from typing import Any, Dict, Optional, List, Sequence
 
+from galleries import files_utils
 from galleries.annotations_filtering.filter import FilterStatement
-from galleries.annotations_filtering.utils import does_annotations_meets_filter
+from galleries.annotations_index import AnnotationsIndex
 from galleries.annotations_parsers.file_name_parser import FileNameSepParser
+from galleries.change_feed import ChangeFeed, GalleryChanges
+from galleries.images_providers.decode_options import DecodeOptions
+from galleries.images_providers.regions import BoundingBox
 from galleries.images_providers.local_files_image_providers import LocalFilesImageProvider
 
 from galleries.annotations_parsers.gallery_annots_parsers import GalleryAnnotationsParser
 from galleries.igallery import IGallery
 from galleries.images_providers.gallery_images_provider import GalleryImagesProvider
+from galleries.parallel_utils import ordered_parallel_map
+from galleries.sampling import sample_sequence
+from galleries.sharding import shard_indices
 
 
 class Gallery(IGallery):
 
+	# threads that stat the files of the gallery in get_changes
+	STAT_WORKERS = 16
+
+	# galleries serialized before these attributes existed do not have them
+	_annotations_index: Optional[AnnotationsIndex] = None
+	_change_feed: Optional[ChangeFeed] = None
+
 	def __init__(
 			self,
 			name: str = "",
 			images_provider: GalleryImagesProvider = LocalFilesImageProvider(),
-			annots_parser: GalleryAnnotationsParser = FileNameSepParser()
+			annots_parser: GalleryAnnotationsParser = FileNameSepParser(),
+			annotations_index: Optional[AnnotationsIndex] = None,
+			change_feed: Optional[ChangeFeed] = None
 	):
+		"""
+		:param name:
+		:param images_provider:
+		:param annots_parser:
+		:param annotations_index: optional persistent index of the annotations. If it is set, filtered queries are
+		answered from the index and only new or modified images are parsed.
+		:param change_feed: optional change feed to track the added, removed and modified images, see get_changes.
+		"""
 		self._name = name
 		self._images_provider = images_provider
 		self._annots_parser = annots_parser
+		self._annotations_index = annotations_index
+		self._change_feed = change_feed
 
 	@property
 	def images_provider(self):
@@ -39,6 +65,42 @@ class Gallery(IGallery):
 	def annotations_parser(self, value):
 		self._annots_parser = value
 
+	@property
+	def annotations_index(self):
+		return self._annotations_index
+
+	@annotations_index.setter
+	def annotations_index(self, value):
+		self._annotations_index = value
+
+	@property
+	def change_feed(self):
+		return self._change_feed
+
+	@change_feed.setter
+	def change_feed(self, value):
+		self._change_feed = value
+
+	def get_change_feed(self) -> Optional[ChangeFeed]:
+		return self._change_feed
+
+	def get_changes(self, token: Optional[int] = None) -> GalleryChanges:
+		"""
+		Get the images added, removed and modified since token. Images are listed with the provider, which reuses its
+		directory snapshot, and an image is modified if its file modification time changed. Annotations are not parsed.
+
+		Every call stats every image file to detect modifications, which costs about as much as listing the gallery
+		again (STAT_WORKERS threads). Do not poll it in a tight loop, call it at intervals that amortize that cost.
+		:param token:
+		:return:
+		"""
+		if self._change_feed is None:
+			raise NotImplementedError("Set a change feed to the gallery to track its changes")
+		indices = list(self._images_provider.get_indices())
+		mtimes = ordered_parallel_map(files_utils.get_file_mtime, indices, self.STAT_WORKERS, prefetch=1024)
+		self._change_feed.synchronize(zip(indices, mtimes))
+		return self._change_feed.get_changes(token)
+
 	def get_name(self) -> str:
 		return self._name
 
@@ -48,15 +110,82 @@ class Gallery(IGallery):
 	def get_indices(self, filters: List[List[FilterStatement]] = None):
 		indices = self._images_provider.get_indices()
 		filters = filters or []
+		if self._annotations_index is not None:
+			self._annotations_index.update(indices, self._annots_parser)
+			yield from self._annotations_index.get_indices(filters)
+			return
+		yield from self._filter_indices(indices, filters)
+
+	def get_indices_shard(
+			self,
+			shard: int,
+			num_shards: int,
+			seed: Optional[int] = None,
+			filters: List[List[FilterStatement]] = None
+	):
+		"""
+		Without annotations index the provider's indices are sharded before filtering, so only the annotations of the
+		shard's images are parsed.
+		"""
+		if self._annotations_index is not None:
+			return super().get_indices_shard(shard, num_shards, seed, filters)
+		indices = shard_indices(self._images_provider.get_indices(), shard, num_shards, seed)
+		return self._filter_indices(indices, filters or [])
+
+	def _filter_indices(self, indices, filters: List[List[FilterStatement]]):
+		if len(filters) == 0:
+			yield from indices
+			return
+		predicate = self.get_filter_predicate(filters)
 		for index in indices:
 			annotations = self.get_annotations_by_index(index)
-			meets_filter = does_annotations_meets_filter(annotations, filters)
-			if meets_filter:
+			if predicate(annotations):
 				yield index
 
+	def count(self, filters: List[List[FilterStatement]] = None) -> int:
+		"""
+		Returns the number of images that meet the filters. With an annotations index the count is computed from the
+		index, otherwise, without filters, it is the provider's count and annotations are not parsed.
+		:param filters:
+		:return:
+		"""
+		if self._annotations_index is not None:
+			self._annotations_index.update(self._images_provider.get_indices(), self._annots_parser)
+			return self._annotations_index.count(filters)
+		if not filters:
+			return self._images_provider.count()
+		return super().count(filters)
+
+	def sample(self, n: int, filters: List[List[FilterStatement]] = None, seed: Optional[int] = None) -> list:
+		"""
+		Samples by position from the annotations index if it is set. Otherwise the indices are sampled with reservoir
+		sampling in a single pass over the provider's indices, annotations are only parsed if there are filters.
+		:param n:
+		:param filters:
+		:param seed:
+		:return:
+		"""
+		if self._annotations_index is not None:
+			self._annotations_index.update(self._images_provider.get_indices(), self._annots_parser)
+			columnar = self._annotations_index.get_columnar_annotations()
+			rows = np.flatnonzero(columnar.get_mask(filters))
+			return [columnar.indices[row] for row in sample_sequence(rows, n, seed)]
+		return super().sample(n, filters, seed)
+
 	def get_image_by_index(self, index: Any) -> np.ndarray:
 		return self._images_provider.get_image_by_index(index)
 
+	def get_image_by_index_with_options(self, index: Any, decode_options: Optional[DecodeOptions] = None) -> np.ndarray:
+		return self._images_provider.get_image_by_index_with_options(index, decode_options)
+
+	def get_image_regions(
+			self,
+			index: Any,
+			bboxes: Sequence[BoundingBox],
+			decode_options: Optional[DecodeOptions] = None
+	) -> List[np.ndarray]:
+		return self._images_provider.get_image_regions(index, bboxes, decode_options)
+
 	def get_annotations_by_index(self, img_index):
 		return self._annots_parser.get_annotations_by_image_index(img_index)
 
@@ -0,0 +1,200 @@
+import os
+import pickle
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from galleries.annotations_filtering.columnar import ColumnarAnnotations
+from galleries.annotations_filtering.filter import FilterStatement
+from galleries.igallery import IGallery
+from galleries.images_providers.decode_options import DecodeOptions, fit_image
+from galleries.sampling import sample_sequence
+
+
+IMAGES_FILE_NAME = 'images.npy'
+ANNOTATIONS_FILE_NAME = 'annotations.pkl'
+
+
+class GalleryMemmap(IGallery):
+	"""
+	Gallery of images of the same shape stored in a single (N, height, width, channels) uint8 .npy file, memory mapped,
+	and a table with the annotations of each image. Getting an image is a slice of the memory map, without decoding,
+	and get_images_batch gets several images with a single fancy indexing. Create it from another gallery with
+	from_gallery.
+
+	Images are mapped copy-on-write, so modifying a returned image does not modify the gallery.
+	"""
+
+	def __init__(self, name: str = "", directory: str = ""):
+		"""
+		:param name:
+		:param directory: directory with the images and annotations files written by from_gallery.
+		"""
+		self._name = name
+		self._directory = directory
+		self._init_data()
+
+	def _init_data(self):
+		self._images: Optional[np.ndarray] = None
+		self._table: Optional[dict] = None
+		self._rows: Optional[dict] = None
+		self._columnar: Optional[ColumnarAnnotations] = None
+
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		for attribute in ['_images', '_table', '_rows', '_columnar']:
+			state.pop(attribute)  # the data is loaded again from the directory
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__ = state
+		self._init_data()
+
+	@property
+	def directory(self):
+		return self._directory
+
+	@directory.setter
+	def directory(self, value):
+		self._directory = value
+		self._init_data()
+
+	@property
+	def image_shape(self) -> Tuple[int, int, int]:
+		return self._get_images().shape[1:]
+
+	def get_name(self) -> str:
+		return self._name
+
+	def set_name(self, name: str):
+		self._name = name
+
+	def get_indices(self, filters: List[List[FilterStatement]] = None):
+		if not filters:
+			yield from self._get_table()['indices']
+			return
+		yield from self._get_columnar().filter_indices(filters)
+
+	def count(self, filters: List[List[FilterStatement]] = None) -> int:
+		if not filters:
+			return len(self._get_table()['indices'])
+		return self._get_columnar().count(filters)
+
+	def sample(self, n: int, filters: List[List[FilterStatement]] = None, seed: Optional[int] = None) -> list:
+		if not filters:
+			return sample_sequence(self._get_table()['indices'], n, seed)
+		columnar = self._get_columnar()
+		rows = np.flatnonzero(columnar.get_mask(filters))
+		return [columnar.indices[row] for row in sample_sequence(rows, n, seed)]
+
+	def get_annotations_by_index(self, img_index) -> dict:
+		return self._get_table()['annotations'][self._get_rows()[img_index]]
+
+	def get_image_by_index(self, index: Any) -> np.ndarray:
+		return self._get_images()[self._get_rows()[index]]
+
+	def get_images_batch(self, indices: List[Any]) -> np.ndarray:
+		"""
+		Returns the images of indices in a single (len(indices), height, width, channels) array.
+		:param indices:
+		:return:
+		"""
+		rows = self._get_rows()
+		return self._get_images()[[rows[index] for index in indices]]
+
+	def get_annotations_types(self) -> Optional[Dict[str, type]]:
+		return self._get_table()['annotations_types']
+
+	def get_discrete_annotations_values(self) -> Dict[str, list]:
+		return self._get_table()['discrete_annotations_values']
+
+	# --- Overrides -----------------------------------------------------------
+
+	def get_images_by_indices(
+			self,
+			indices: List[Any],
+			workers: Optional[int] = None,
+			prefetch: Optional[int] = None,
+			decode_options: Optional[DecodeOptions] = None):
+		if decode_options is not None:
+			yield from super().get_images_by_indices(indices, workers, prefetch, decode_options)
+			return
+		indices = list(indices)
+		batch_size = 1024
+		for start in range(0, len(indices), batch_size):
+			yield from self.get_images_batch(indices[start:start + batch_size])
+
+	# -------------------------------------------------------------------------
+
+	@staticmethod
+	def from_gallery(
+			gallery: IGallery,
+			directory: str,
+			image_shape: Tuple[int, int, int],
+			filters: List[List[FilterStatement]] = None,
+			workers: Optional[int] = None,
+			notify_function=None,
+			notify_rate=1000) -> 'GalleryMemmap':
+		"""
+		Converts a gallery into a GalleryMemmap. Images are resized to image_shape if needed.
+		:param gallery: gallery to convert.
+		:param directory: directory to write the images and annotations files.
+		:param image_shape: (height, width, channels) of the images.
+		:param filters: convert only the images that meet the filters.
+		:param workers: number of threads that load the images of the source gallery.
+		:param notify_function: function called with the number of converted images every notify_rate images.
+		:param notify_rate:
+		:return:
+		"""
+		indices = list(gallery.get_indices(filters))
+		os.makedirs(directory, exist_ok=True)
+		images = np.lib.format.open_memmap(
+			os.path.join(directory, IMAGES_FILE_NAME),
+			mode='w+',
+			dtype=np.uint8,
+			shape=(len(indices),) + tuple(image_shape)
+		)
+		annotations = []
+		images_annotations = gallery.get_images_and_annotations_by_indices(indices, workers=workers)
+		for row, (image, image_annotations) in enumerate(images_annotations):
+			if image is None:
+				images[row] = 0
+			else:
+				images[row] = fit_image(image, image_shape)
+			annotations.append(image_annotations)
+			if notify_function is not None and (row + 1) % notify_rate == 0:
+				notify_function(row + 1)
+		images.flush()
+		del images
+
+		table = {
+			'indices': indices,
+			'annotations': annotations,
+			'annotations_types': gallery.get_annotations_types(),
+			'discrete_annotations_values': gallery.get_discrete_annotations_values(),
+		}
+		with open(os.path.join(directory, ANNOTATIONS_FILE_NAME), 'wb') as file:
+			pickle.dump(table, file)
+		return GalleryMemmap(gallery.get_name(), directory)
+
+	def _get_images(self) -> np.ndarray:
+		if self._images is None:
+			self._images = np.load(os.path.join(self._directory, IMAGES_FILE_NAME), mmap_mode='c')
+		return self._images
+
+	def _get_table(self) -> dict:
+		if self._table is None:
+			with open(os.path.join(self._directory, ANNOTATIONS_FILE_NAME), 'rb') as file:
+				self._table = pickle.load(file)
+		return self._table
+
+	def _get_rows(self) -> dict:
+		if self._rows is None:
+			self._rows = {index: row for row, index in enumerate(self._get_table()['indices'])}
+		return self._rows
+
+	def _get_columnar(self) -> ColumnarAnnotations:
+		if self._columnar is None:
+			table = self._get_table()
+			self._columnar = ColumnarAnnotations.from_annotations(zip(table['indices'], table['annotations']))
+		return self._columnar
@@ -5,7 +5,9 @@ from typing import Dict, Optional, Any, List
 import numpy as np
 
 from galleries.annotations_filtering.filter import FilterStatement
+from galleries.change_feed import GalleryChanges
 from galleries.igallery import IGallery
+from galleries.images_providers.decode_options import DecodeOptions, apply_decode_options
 from galleries.sql.connectors import GallerySqlConnector
 from galleries.sql.connectors.sqlite_connector import SqliteConnector
 from galleries.sql.queries import SqlDataRetriever
@@ -25,7 +27,7 @@ class GallerySql(IGallery):
         self._connection: Optional[Connection] = None
 
     def __getstate__(self):
-        state = self.__dict__
+        state = self.__dict__.copy()
         state.pop("_connection")  # do not serialize connection because it is not serializable
         return state
 
@@ -49,6 +51,16 @@ class GallerySql(IGallery):
         cur = self._get_connection.cursor()
         return self._data_retriever.get_indices(cur, filters)
 
+    def get_indices_shard(
+            self,
+            shard: int,
+            num_shards: int,
+            seed: Optional[int] = None,
+            filters: List[List[FilterStatement]] = None
+    ):
+        cur = self._get_connection.cursor()
+        return self._data_retriever.get_indices_shard(cur, shard, num_shards, seed, filters)
+
     def get_annotations_by_index(self, index: Any) -> dict:
         cur = self._get_connection.cursor()
         return self._data_retriever.get_annotations_by_index(cur, index)
@@ -64,33 +76,83 @@ class GallerySql(IGallery):
         return self._data_retriever.get_discrete_annotations_values()
 
     # --- Overrides -----------------------------------------------------------
+    # the connection can not be shared between threads, so workers and prefetch are accepted but images are always
+    # loaded in the calling thread
 
     def get_indices_annots(self, filters: List[List[FilterStatement]] = None):
         cur = self._get_connection.cursor()
         return self._data_retriever.get_indices_annots(cur, filters)
 
-    def get_images(self, filters: List[List[FilterStatement]] = None):
+    def get_images(
+            self,
+            filters: List[List[FilterStatement]] = None,
+            workers: Optional[int] = None,
+            prefetch: Optional[int] = None,
+            decode_options: Optional[DecodeOptions] = None):
         cur = self._get_connection.cursor()
-        return self._data_retriever.get_images(cur, filters)
+        images = self._data_retriever.get_images(cur, filters)
+        return self._apply_decode_options(images, decode_options)
 
-    def get_images_annots(self, filters: List[List[FilterStatement]] = None):
+    def get_images_annots(
+            self,
+            filters: List[List[FilterStatement]] = None,
+            workers: Optional[int] = None,
+            prefetch: Optional[int] = None,
+            decode_options: Optional[DecodeOptions] = None):
         cur = self._get_connection.cursor()
-        return self._data_retriever.get_images_annots(cur, filters)
+        images_annots = self._data_retriever.get_images_annots(cur, filters)
+        return self._apply_decode_options_to_pairs(images_annots, decode_options)
 
-    def get_images_by_indices(self, indices: List[Any]):
+    def get_images_by_indices(
+            self,
+            indices: List[Any],
+            workers: Optional[int] = None,
+            prefetch: Optional[int] = None,
+            decode_options: Optional[DecodeOptions] = None):
         cur = self._get_connection.cursor()
-        return self._data_retriever.get_images_by_indices(cur, indices)
+        images = self._data_retriever.get_images_by_indices(cur, indices)
+        return self._apply_decode_options(images, decode_options)
 
     def get_annotations_by_indices(self, indices: List[Any]):
         cur = self._get_connection.cursor()
         return self._data_retriever.get_annotations_by_indices(cur, indices)
 
-    def get_images_and_annotations_by_indices(self, indices: List[Any]):
+    def get_images_and_annotations_by_indices(
+            self,
+            indices: List[Any],
+            workers: Optional[int] = None,
+            prefetch: Optional[int] = None,
+            decode_options: Optional[DecodeOptions] = None):
         cur = self._get_connection.cursor()
-        return self._data_retriever.get_images_and_annotations_by_indices(cur, indices)
+        images_annots = self._data_retriever.get_images_and_annotations_by_indices(cur, indices)
+        return self._apply_decode_options_to_pairs(images_annots, decode_options)
+
+    def count(self, filters: List[List[FilterStatement]] = None) -> int:
+        cur = self._get_connection.cursor()
+        return self._data_retriever.count(cur, filters)
+
+    def sample(self, n: int, filters: List[List[FilterStatement]] = None, seed: Optional[int] = None) -> list:
+        cur = self._get_connection.cursor()
+        return self._data_retriever.sample(cur, n, filters, seed)
+
+    def get_changes(self, token: Optional[int] = None) -> GalleryChanges:
+        cur = self._get_connection.cursor()
+        return self._data_retriever.get_changes(cur, token)
 
     # -------------------------------------------------------------------------
 
+    @staticmethod
+    def _apply_decode_options(images, decode_options: Optional[DecodeOptions]):
+        if decode_options is None:
+            return images
+        return (apply_decode_options(image, decode_options) for image in images)
+
+    @staticmethod
+    def _apply_decode_options_to_pairs(images_annots, decode_options: Optional[DecodeOptions]):
+        if decode_options is None:
+            return images_annots
+        return ((apply_decode_options(image, decode_options), annots) for image, annots in images_annots)
+
     def _is_connected(self):
         return self._connection is not None
 
@@ -1,11 +1,19 @@
 import abc
+import hashlib
 import jsonpickle
 import numpy as np
 import pickle
-from typing import Any, Optional, Dict, List
+from typing import Any, Callable, Optional, Dict, Iterable, List, Sequence, Tuple
 
 from galleries import files_utils
 from galleries.annotations_filtering.filter import FilterStatement
+from galleries.annotations_filtering.utils import compile_filters
+from galleries.change_feed import ChangeFeed, GalleryChanges
+from galleries.images_providers.decode_options import DecodeOptions, apply_decode_options
+from galleries.images_providers.regions import BoundingBox, get_regions_from_image
+from galleries.parallel_utils import ordered_parallel_map
+from galleries.sampling import reservoir_sample
+from galleries.sharding import shard_indices
 
 
 class IGallery(abc.ABC):
@@ -38,6 +46,26 @@ class IGallery(abc.ABC):
 		"""
 		pass
 
+	def get_indices_shard(
+			self,
+			shard: int,
+			num_shards: int,
+			seed: Optional[int] = None,
+			filters: List[List[FilterStatement]] = None
+	):
+		"""
+		Get the indices of a shard, in [0, num_shards), that meet the filters. Indices are partitioned by a stable hash
+		(see galleries.sharding), so workers get disjoint shards without communicating. By default the indices are
+		enumerated with get_indices and the ones of other shards are discarded, galleries that can select a shard in
+		their storage override it.
+		:param shard:
+		:param num_shards:
+		:param seed: shuffles the partition and the order of the shard's indices, e.g. use the epoch number.
+		:param filters:
+		:return:
+		"""
+		return shard_indices(self.get_indices(filters), shard, num_shards, seed)
+
 	@abc.abstractmethod
 	def get_annotations_by_index(self, img_index) -> dict:
 		"""
@@ -56,6 +84,39 @@ class IGallery(abc.ABC):
 		"""
 		pass
 
+	def get_image_by_index_with_options(self, index: Any, decode_options: Optional[DecodeOptions] = None) -> np.ndarray:
+		"""
+		Get an image based on an index, decoded with decode_options (size, scale, grayscale...). By default the image is
+		decoded by get_image_by_index and then converted, galleries that can decode at a lower resolution override it.
+		:param index:
+		:param decode_options:
+		:return:
+		"""
+		return apply_decode_options(self.get_image_by_index(index), decode_options)
+
+	def get_image_regions(
+			self,
+			index: Any,
+			bboxes: Sequence[BoundingBox],
+			decode_options: Optional[DecodeOptions] = None
+	) -> List[np.ndarray]:
+		"""
+		Get several regions of an image, decoding it once.
+		:param index:
+		:param bboxes: (x, y, width, height) bounding boxes in the coordinates of the full resolution image.
+		:param decode_options: options applied to each region, e.g. its size.
+		:return:
+		"""
+		return get_regions_from_image(self.get_image_by_index(index), bboxes, decode_options)
+
+	def get_image_region(
+			self,
+			index: Any,
+			bbox: BoundingBox,
+			decode_options: Optional[DecodeOptions] = None
+	) -> np.ndarray:
+		return self.get_image_regions(index, [bbox], decode_options)[0]
+
 	@abc.abstractmethod
 	def get_annotations_types(self) -> Optional[Dict[str, type]]:
 		"""
@@ -74,32 +135,170 @@ class IGallery(abc.ABC):
 		"""
 		pass
 
+	def count(self, filters: List[List[FilterStatement]] = None) -> int:
+		"""
+		Returns the number of images that meet the filters. By default the indices are enumerated, galleries that can
+		count without enumerating them override it.
+		:param filters:
+		:return:
+		"""
+		return sum(1 for _ in self.get_indices(filters))
+
+	def sample(self, n: int, filters: List[List[FilterStatement]] = None, seed: Optional[int] = None) -> list:
+		"""
+		Returns the indices of n random images that meet the filters, or all of them if there are fewer, in random order.
+		By default the indices are sampled with reservoir sampling in a single pass that keeps at most n indices in
+		memory, galleries that know their count or can sample in their storage override it.
+		:param n:
+		:param filters:
+		:param seed: seed of the sample, None for a different sample in each call.
+		:return:
+		"""
+		return reservoir_sample(self.get_indices(filters), n, seed)
+
+	def __len__(self):
+		return self.count()
+
+	def __bool__(self):
+		# a gallery is truthy even if it is empty, so truth tests do not count its images
+		return True
+
+	def get_filter_predicate(
+			self,
+			filters: List[List[FilterStatement]] = None,
+			annotations_sample: Optional[List[dict]] = None
+	) -> Callable[[dict], bool]:
+		"""
+		Compiles filters into a predicate over an image's annotations. Statements are ordered by their estimated
+		selectivity, obtained from the annotations_sample if given or from get_discrete_annotations_values otherwise.
+		Compile the filters once per query and reuse the predicate for every image.
+		:param filters:
+		:param annotations_sample:
+		:return:
+		"""
+		discrete_values = self.get_discrete_annotations_values() if annotations_sample is None else None
+		return compile_filters(filters, discrete_values, annotations_sample)
+
+	def get_change_feed(self) -> Optional[ChangeFeed]:
+		"""
+		Returns the change feed used by the default implementation of get_changes, or None if the gallery does not track
+		changes.
+		:return:
+		"""
+		return None
+
+	def get_changes(self, token: Optional[int] = None) -> GalleryChanges:
+		"""
+		Get the indices added, removed and modified since a version token returned by a previous call. If token is None
+		all the indices are returned as added.
+
+		By default the gallery's change feed is synchronized with all the indices and a fingerprint of their
+		annotations on every call, galleries that can track changes more efficiently override it.
+		:param token:
+		:return:
+		"""
+		change_feed = self.get_change_feed()
+		if change_feed is None:
+			raise NotImplementedError(f"{type(self).__name__} does not track changes, it needs a change feed")
+		change_feed.synchronize(
+			(index, hashlib.sha1(pickle.dumps(annotations)).hexdigest())
+			for index, annotations in self.get_indices_annots()
+		)
+		return change_feed.get_changes(token)
+
 	def get_indices_annots(self, filters: List[List[FilterStatement]] = None):
 		for img_index in self.get_indices(filters):
 			yield img_index, self.get_annotations_by_index(img_index)
 
-	def get_images(self, filters: List[List[FilterStatement]] = None):
-		for img_index in self.get_indices(filters):
-			yield self.get_image_by_index(img_index)
+	def get_images(
+			self,
+			filters: List[List[FilterStatement]] = None,
+			workers: Optional[int] = None,
+			prefetch: Optional[int] = None,
+			decode_options: Optional[DecodeOptions] = None
+	):
+		"""
+		Get the images that meet the filters.
+		:param filters:
+		:param workers: number of threads that load images in parallel. By default images are loaded one by one in the
+		calling thread. Images are yielded in the same order either way.
+		:param prefetch: maximum number of images loaded ahead of the consumer. Defaults to 2 * workers.
+		:param decode_options: see get_image_by_index_with_options.
+		:return:
+		"""
+		indices = self.get_indices(filters)
+		yield from ordered_parallel_map(self._get_image_loader(decode_options), indices, workers, prefetch)
 
-	def get_images_annots(self, filters: List[List[FilterStatement]] = None):
-		for img_index, annots in self.get_indices_annots(filters):
-			img = self.get_image_by_index(img_index)
-			yield img, annots
+	def get_images_annots(
+			self,
+			filters: List[List[FilterStatement]] = None,
+			workers: Optional[int] = None,
+			prefetch: Optional[int] = None,
+			decode_options: Optional[DecodeOptions] = None
+	):
+		load_image = self._get_image_loader(decode_options)
 
-	def get_images_by_indices(self, indices: List[Any]):
-		for index in indices:
-			yield self.get_image_by_index(index)
+		def load(index_annots):
+			img_index, annots = index_annots
+			return load_image(img_index), annots
+
+		indices_annots = self.get_indices_annots(filters)
+		yield from ordered_parallel_map(load, indices_annots, workers, prefetch)
+
+	def get_images_by_indices(
+			self,
+			indices: List[Any],
+			workers: Optional[int] = None,
+			prefetch: Optional[int] = None,
+			decode_options: Optional[DecodeOptions] = None
+	):
+		yield from ordered_parallel_map(self._get_image_loader(decode_options), indices, workers, prefetch)
+
+	def get_images_regions(
+			self,
+			indices_bboxes: Iterable[Tuple[Any, Sequence[BoundingBox]]],
+			workers: Optional[int] = None,
+			prefetch: Optional[int] = None,
+			decode_options: Optional[DecodeOptions] = None
+	):
+		"""
+		Batched version of get_image_regions. Yields the list of regions of each (index, bboxes) tuple in order.
+		:param indices_bboxes:
+		:param workers: see get_images.
+		:param prefetch: see get_images.
+		:param decode_options:
+		:return:
+		"""
+		def load(index_bboxes):
+			index, bboxes = index_bboxes
+			return self.get_image_regions(index, bboxes, decode_options)
+
+		yield from ordered_parallel_map(load, indices_bboxes, workers, prefetch)
 
 	def get_annotations_by_indices(self, indices: List[Any]):
 		for index in indices:
 			yield self.get_annotations_by_index(index)
 
-	def get_images_and_annotations_by_indices(self, indices: List[Any]):
-		for index in indices:
-			image = self.get_image_by_index(index)
+	def get_images_and_annotations_by_indices(
+			self,
+			indices: List[Any],
+			workers: Optional[int] = None,
+			prefetch: Optional[int] = None,
+			decode_options: Optional[DecodeOptions] = None
+	):
+		load_image = self._get_image_loader(decode_options)
+
+		def load(index):
+			image = load_image(index)
 			annotations = self.get_annotations_by_index(index)
-			yield image, annotations
+			return image, annotations
+
+		yield from ordered_parallel_map(load, indices, workers, prefetch)
+
+	def _get_image_loader(self, decode_options: Optional[DecodeOptions]) -> Callable[[Any], np.ndarray]:
+		if decode_options is None:
+			return self.get_image_by_index
+		return lambda index: self.get_image_by_index_with_options(index, decode_options)
 
 	@staticmethod
 	def write_gallery(gallery: 'IGallery', file_path: str, nice_format=False):
@@ -0,0 +1,220 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+from propsettings.configurable import register_as_setting
+from propsettings.setting_types.path_setting_type import Path
+
+from galleries import files_utils
+from galleries.images_providers.decode_options import DecodeOptions
+from galleries.images_providers.gallery_images_provider import GalleryImagesProvider
+
+
+class CachedImagesProvider(GalleryImagesProvider):
+    """
+    Wraps an images provider with a cache of decoded images. It has two tiers:
+        - an in-memory LRU cache bounded by the total bytes of the cached images.
+        - an optional on-disk cache of raw decoded arrays saved as .npy files in cache_directory.
+
+    Entries are keyed by the image index, its modification time if the index is a file path, the decode options and the
+    fingerprint of the wrapped provider (see GalleryImagesProvider.get_fingerprint), computed in each lookup, so
+    modified images and changes in the provider's decoding parameters are not served stale. Disk entries are memory
+    mapped, not read. The disk tier is not bounded, remove cache_directory to clear it.
+    """
+
+    def __init__(
+            self,
+            images_provider: GalleryImagesProvider = None,
+            memory_bytes: int = 512 * 1024 * 1024,
+            cache_directory: Optional[str] = None,
+            copy: bool = True):
+        """
+        :param images_provider: provider to cache.
+        :param memory_bytes: maximum bytes of the images in the memory tier. 0 disables it.
+        :param cache_directory: directory of the disk tier. None disables it.
+        :param copy: return copies of the cached images, so callers can modify them without corrupting the cache.
+        """
+        self._images_provider = images_provider
+        self._memory_bytes = memory_bytes
+        self._cache_directory = cache_directory
+        self._copy = copy
+        self._init_cache()
+
+    def _init_cache(self):
+        self._lock = threading.Lock()
+        self._memory_cache = OrderedDict()
+        self._cached_bytes = 0
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for attribute in ["_lock", "_memory_cache", "_cached_bytes", "_hits", "_disk_hits", "_misses", "_evictions"]:
+            state.pop(attribute)  # the cache itself is not serialized
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__ = state
+        self._init_cache()
+
+    @property
+    def images_provider(self):
+        return self._images_provider
+
+    @images_provider.setter
+    def images_provider(self, value):
+        self._images_provider = value
+        self.clear()
+
+    @property
+    def cache_directory(self):
+        return self._cache_directory
+
+    @property
+    def hits(self) -> int:
+        """
+        Images served from the memory tier.
+        """
+        return self._hits
+
+    @property
+    def disk_hits(self) -> int:
+        """
+        Images served from the disk tier.
+        """
+        return self._disk_hits
+
+    @property
+    def misses(self) -> int:
+        """
+        Images requested to the wrapped provider, including the ones it did not find.
+        """
+        return self._misses
+
+    @property
+    def evictions(self) -> int:
+        """
+        Images evicted from the memory tier.
+        """
+        return self._evictions
+
+    @property
+    def cached_bytes(self) -> int:
+        return self._cached_bytes
+
+    def get_statistics(self) -> dict:
+        return {
+            "hits": self._hits,
+            "disk_hits": self._disk_hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+            "cached_images": len(self._memory_cache),
+            "cached_bytes": self._cached_bytes,
+        }
+
+    def reset_statistics(self):
+        with self._lock:
+            self._hits = 0
+            self._disk_hits = 0
+            self._misses = 0
+            self._evictions = 0
+
+    def clear(self):
+        """
+        Clears the memory tier. The disk tier is kept because its entries are keyed by the provider's fingerprint.
+        :return:
+        """
+        with self._lock:
+            self._memory_cache.clear()
+            self._cached_bytes = 0
+
+    def get_indices(self):
+        return self._images_provider.get_indices()
+
+    def count(self) -> int:
+        return self._images_provider.count()
+
+    def get_fingerprint(self) -> str:
+        return self._images_provider.get_fingerprint()
+
+    def get_image_by_index(self, img_index):
+        return self.get_image_by_index_with_options(img_index)
+
+    def get_image_by_index_with_options(self, img_index, decode_options: Optional[DecodeOptions] = None):
+        key = self._get_key(img_index, decode_options)
+        image = self._get_from_memory(key)
+        if image is None:
+            image = self._get_from_disk(key)
+            if image is None:
+                image = self._images_provider.get_image_by_index_with_options(img_index, decode_options)
+                with self._lock:
+                    self._misses += 1
+                if image is None:
+                    return None
+                self._save_to_disk(key, image)
+            else:
+                with self._lock:
+                    self._disk_hits += 1
+            self._save_to_memory(key, image)
+        return image.copy() if self._copy else image
+
+    def _get_key(self, img_index, decode_options: Optional[DecodeOptions] = None) -> str:
+        fingerprint = self._images_provider.get_fingerprint()
+        mtime = files_utils.get_file_mtime(img_index)
+        key = f"{fingerprint}|{mtime}|{decode_options!r}|{img_index!r}"
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def _get_from_memory(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            image = self._memory_cache.get(key, None)
+            if image is not None:
+                self._memory_cache.move_to_end(key)
+                self._hits += 1
+            return image
+
+    def _save_to_memory(self, key: str, image: np.ndarray):
+        if image.nbytes > self._memory_bytes:
+            return
+        with self._lock:
+            if key in self._memory_cache:
+                return
+            self._memory_cache[key] = image
+            self._cached_bytes += image.nbytes
+            while self._cached_bytes > self._memory_bytes:
+                _, evicted = self._memory_cache.popitem(last=False)
+                self._cached_bytes -= evicted.nbytes
+                self._evictions += 1
+
+    def _get_disk_path(self, key: str) -> str:
+        return os.path.join(self._cache_directory, key[:2], f"{key}.npy")
+
+    def _get_from_disk(self, key: str) -> Optional[np.ndarray]:
+        if self._cache_directory is None:
+            return None
+        path = self._get_disk_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            return np.load(path, mmap_mode='r')
+        except (OSError, ValueError):
+            # partially written or corrupted entry, it is decoded again
+            return None
+
+    def _save_to_disk(self, key: str, image: np.ndarray):
+        if self._cache_directory is None:
+            return
+        path = self._get_disk_path(key)
+        files_utils.create_dir_of_file(path)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as file:
+            np.save(file, image)
+        os.replace(temp_path, path)
+
+
+register_as_setting(CachedImagesProvider, "_memory_bytes", setting_value_type=int)
+register_as_setting(CachedImagesProvider, "_cache_directory", setting_type=Path(True, []))
@@ -0,0 +1,181 @@
+from typing import Callable, Optional, Tuple
+
+import cv2 as cv
+import numpy as np
+
+from galleries.images_providers.image_headers import JPEG, ImageHeader, get_image_header, read_image_header_from_bytes
+
+
+_REDUCED_COLOR_FLAGS = {
+    1: cv.IMREAD_COLOR,
+    2: cv.IMREAD_REDUCED_COLOR_2,
+    4: cv.IMREAD_REDUCED_COLOR_4,
+    8: cv.IMREAD_REDUCED_COLOR_8,
+}
+
+_REDUCED_GRAYSCALE_FLAGS = {
+    1: cv.IMREAD_GRAYSCALE,
+    2: cv.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+
+class DecodeOptions:
+    """
+    How to decode an image.
+        - size: (width, height) of the decoded image. If one of them is None the aspect ratio is kept.
+        - scale: factor applied to the original size. It can not be used together with size.
+        - grayscale: decode a single channel image.
+        - interpolation: OpenCV interpolation used to resize to the exact size.
+    """
+
+    def __init__(
+            self,
+            size: Optional[Tuple[Optional[int], Optional[int]]] = None,
+            scale: Optional[float] = None,
+            grayscale: bool = False,
+            interpolation: int = cv.INTER_AREA):
+        if size is not None and scale is not None:
+            raise ValueError("size and scale can not be used at the same time")
+        if size is not None and size[0] is None and size[1] is None:
+            size = None
+        self.size = size
+        self.scale = scale
+        self.grayscale = grayscale
+        self.interpolation = interpolation
+
+    def __eq__(self, other):
+        return isinstance(other, DecodeOptions) and self.__dict__ == other.__dict__
+
+    def __hash__(self):
+        return hash((self.size, self.scale, self.grayscale, self.interpolation))
+
+    def __repr__(self):
+        return f"DecodeOptions(size={self.size!r}, scale={self.scale!r}, grayscale={self.grayscale!r}, " \
+               f"interpolation={self.interpolation!r})"
+
+    def get_target_size(self, width: int, height: int) -> Tuple[int, int]:
+        """
+        Returns the (width, height) of an image of the given size decoded with these options.
+        """
+        if self.scale is not None:
+            return max(1, round(width * self.scale)), max(1, round(height * self.scale))
+        if self.size is None:
+            return width, height
+        target_width, target_height = self.size
+        if target_width is None:
+            target_width = max(1, round(width * target_height / height))
+        elif target_height is None:
+            target_height = max(1, round(height * target_width / width))
+        return target_width, target_height
+
+
+def get_reduction_factor(width: int, height: int, target_width: int, target_height: int) -> int:
+    """
+    Returns the largest factor among 1, 2, 4 and 8 such that the image reduced by it is not smaller than the target.
+    """
+    for factor in (8, 4, 2):
+        if width // factor >= target_width and height // factor >= target_height:
+            return factor
+    return 1
+
+
+def get_imread_flags(grayscale: bool, reduction_factor: int = 1) -> int:
+    """
+    Returns the cv.imread flags to decode an image reduced by a factor of 1, 2, 4 or 8.
+    """
+    flags = _REDUCED_GRAYSCALE_FLAGS if grayscale else _REDUCED_COLOR_FLAGS
+    return flags[reduction_factor]
+
+
+def apply_decode_options(image: Optional[np.ndarray], options: Optional[DecodeOptions]) -> Optional[np.ndarray]:
+    """
+    Converts an already decoded image as if it was decoded with options.
+    :param image:
+    :param options:
+    :return:
+    """
+    if image is None or options is None:
+        return image
+    if options.grayscale and image.ndim == 3:
+        image = cv.cvtColor(image, cv.COLOR_BGR2GRAY)
+    height, width = image.shape[:2]
+    target_width, target_height = options.get_target_size(width, height)
+    if (target_width, target_height) != (width, height):
+        image = cv.resize(image, (target_width, target_height), interpolation=options.interpolation)
+    return image
+
+
+def fit_image(image: np.ndarray, shape: Tuple[int, int, int]) -> np.ndarray:
+    """
+    Resizes an image to a (height, width, channels) shape and converts it between grayscale and color if needed.
+    :param image:
+    :param shape:
+    :return:
+    """
+    height, width, channels = shape
+    if image.shape[:2] != (height, width):
+        image = cv.resize(image, (width, height), interpolation=cv.INTER_AREA)
+    if image.ndim == 2:
+        image = image[..., np.newaxis]
+    if image.shape[2] != channels:
+        if image.shape[2] == 1:
+            image = np.repeat(image, channels, axis=2)
+        elif channels == 1:
+            image = cv.cvtColor(image, cv.COLOR_BGR2GRAY)[..., np.newaxis]
+        else:
+            raise ValueError(f"Can not convert an image with {image.shape[2]} channels to {channels} channels")
+    return image
+
+
+HEADER_PREFIX_SIZE = 256 * 1024
+
+
+def read_image(file_path: str, options: Optional[DecodeOptions] = None) -> Optional[np.ndarray]:
+    """
+    Reads an image from disk applying the decode options. JPEG images that are decoded to a smaller size use OpenCV's
+    IMREAD_REDUCED_* flags, which decode directly at 1/2, 1/4 or 1/8 of the resolution, and are resized to the exact
+    size afterwards.
+    :param file_path:
+    :param options:
+    :return:
+    """
+    header = get_image_header(file_path) if _needs_header(options) else None
+    return _decode(lambda flags: cv.imread(file_path, flags), header, options)
+
+
+def decode_image(data: np.ndarray, options: Optional[DecodeOptions] = None) -> Optional[np.ndarray]:
+    """
+    Same as read_image but decodes the encoded bytes of an image in a uint8 array.
+    :param data:
+    :param options:
+    :return:
+    """
+    header = read_image_header_from_bytes(data[:HEADER_PREFIX_SIZE].tobytes()) if _needs_header(options) else None
+    return _decode(lambda flags: cv.imdecode(data, flags), header, options)
+
+
+def _needs_header(options: Optional[DecodeOptions]) -> bool:
+    return options is not None and (options.size is not None or options.scale is not None)
+
+
+def _decode(
+        decode: Callable[[int], Optional[np.ndarray]],
+        header: Optional[ImageHeader],
+        options: Optional[DecodeOptions]) -> Optional[np.ndarray]:
+    if options is None:
+        return decode(cv.IMREAD_COLOR)
+    # other formats are decoded at full resolution by OpenCV anyway and then resized with lower quality
+    if header is not None and header.format == JPEG:
+        # OpenCV applies the exif orientation, the target size is the one of the rotated image
+        width, height = header.get_oriented_size()
+        target_width, target_height = options.get_target_size(width, height)
+        factor = get_reduction_factor(width, height, target_width, target_height)
+        image = decode(get_imread_flags(options.grayscale, factor))
+        if image is None:
+            return None
+        if (image.shape[1], image.shape[0]) != (target_width, target_height):
+            image = cv.resize(image, (target_width, target_height), interpolation=options.interpolation)
+        return image
+    return apply_decode_options(decode(get_imread_flags(options.grayscale)), options)
@@ -1,4 +1,10 @@
 import abc
+import hashlib
+import pickle
+from typing import List, Optional, Sequence
+
+from galleries.images_providers.decode_options import DecodeOptions, apply_decode_options
+from galleries.images_providers.regions import BoundingBox, get_regions_from_image
 
 
 class GalleryImagesProvider(abc.ABC):
@@ -10,3 +16,54 @@ class GalleryImagesProvider(abc.ABC):
     @abc.abstractmethod
     def get_image_by_index(self, img_index):
         pass
+
+    def count(self) -> int:
+        """
+        Returns the number of images. By default the indices are enumerated, providers that know their size should
+        override it.
+        :return:
+        """
+        return sum(1 for _ in self.get_indices())
+
+    def get_fingerprint(self) -> str:
+        """
+        Returns a string that changes when the configuration of the provider, e.g. its root or decode options, changes
+        the images it provides, so caches of its images, e.g. CachedImagesProvider, are not served stale. By default it
+        is a hash of the pickled provider, providers should override it with their configuration when that is cheaper
+        or their pickle holds state that is not configuration.
+        :return:
+        """
+        try:
+            state = pickle.dumps(self)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            state = repr(type(self)).encode()
+        return hashlib.sha1(state).hexdigest()
+
+    def get_image_by_index_with_options(self, img_index, decode_options: Optional[DecodeOptions] = None):
+        """
+        Get an image decoded with decode_options. By default the image is decoded by get_image_by_index and then
+        converted, providers that can decode at a lower resolution should override it.
+        :param img_index:
+        :param decode_options:
+        :return:
+        """
+        return apply_decode_options(self.get_image_by_index(img_index), decode_options)
+
+    def get_image_regions(
+            self,
+            img_index,
+            bboxes: Sequence[BoundingBox],
+            decode_options: Optional[DecodeOptions] = None) -> List:
+        """
+        Get several (x, y, width, height) regions of an image, decoding it once. decode_options apply to each region.
+        By default the whole image is decoded by get_image_by_index and cropped, providers that can decode only part of
+        an image should override it.
+        :param img_index:
+        :param bboxes:
+        :param decode_options:
+        :return:
+        """
+        return get_regions_from_image(self.get_image_by_index(img_index), bboxes, decode_options)
+
+    def get_image_region(self, img_index, bbox: BoundingBox, decode_options: Optional[DecodeOptions] = None):
+        return self.get_image_regions(img_index, [bbox], decode_options)[0]
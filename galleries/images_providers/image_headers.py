@@ -0,0 +1,207 @@
+import functools
+import io
+import struct
+from typing import BinaryIO, Optional, Tuple
+
+from galleries import files_utils
+
+
+JPEG = 'jpeg'
+PNG = 'png'
+BMP = 'bmp'
+TIFF = 'tiff'
+
+HEADERS_CACHE_SIZE = 65536
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# start of frame markers, the ones that hold the image size
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_JPEG_APP1_MARKER = 0xE1
+_EXIF_SIGNATURE = b'Exif\x00\x00'
+_EXIF_ORIENTATION_TAG = 0x0112
+# exif orientations that rotate the image 90 or 270 degrees
+_TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+class ImageHeader:
+    """
+    Format and size of an image. width and height are the ones stored in the file; OpenCV applies the exif orientation
+    when decoding, so decoded images have get_oriented_size.
+    """
+
+    def __init__(self, image_format: str, width: int, height: int, orientation: int = 1):
+        self.format = image_format
+        self.width = width
+        self.height = height
+        self.orientation = orientation
+
+    def get_oriented_size(self) -> Tuple[int, int]:
+        """
+        Returns the (width, height) of the image after applying its exif orientation.
+        """
+        if self.orientation in _TRANSPOSED_ORIENTATIONS:
+            return self.height, self.width
+        return self.width, self.height
+
+    def __repr__(self):
+        return f"ImageHeader({self.format!r}, {self.width}, {self.height}, {self.orientation})"
+
+
+def read_image_header(file_path: str) -> Optional[ImageHeader]:
+    """
+    Reads the format and size of an image from its header, without decoding it. Supports jpeg, png, bmp and tiff.
+    Returns None for other formats or invalid files.
+    :param file_path:
+    :return:
+    """
+    try:
+        with open(file_path, 'rb') as file:
+            return _read_header(file)
+    except OSError:
+        return None
+
+
+def read_image_header_from_bytes(data) -> Optional[ImageHeader]:
+    """
+    Same as read_image_header but reads the header from the encoded bytes of an image. The header of most images is
+    in their first 64 KiB, so a prefix of the data is enough.
+    :param data:
+    :return:
+    """
+    return _read_header(io.BytesIO(data))
+
+
+def _read_header(file: BinaryIO) -> Optional[ImageHeader]:
+    orientation = 1
+    try:
+        signature = file.read(8)
+        if signature[:2] == b'\xff\xd8':
+            file.seek(2)
+            size, orientation = _read_jpeg_size(file)
+            image_format = JPEG
+        elif signature == _PNG_SIGNATURE:
+            size = _read_png_size(file)
+            image_format = PNG
+        elif signature[:2] == b'BM':
+            file.seek(0)
+            size = _read_bmp_size(file)
+            image_format = BMP
+        elif signature[:4] in (b'II*\x00', b'MM\x00*'):
+            file.seek(0)
+            size = _read_tiff_size(file)
+            image_format = TIFF
+        else:
+            return None
+    except (OSError, struct.error):
+        return None
+    if size is None:
+        return None
+    width, height = size
+    return ImageHeader(image_format, width, height, orientation)
+
+
+def get_image_header(file_path: str) -> Optional[ImageHeader]:
+    """
+    Cached version of read_image_header. Headers are cached by path and modification time, so modified files are read
+    again.
+    :param file_path:
+    :return:
+    """
+    return _read_image_header_cached(file_path, files_utils.get_file_mtime(file_path))
+
+
+@functools.lru_cache(maxsize=HEADERS_CACHE_SIZE)
+def _read_image_header_cached(file_path: str, mtime: Optional[int]) -> Optional[ImageHeader]:
+    return read_image_header(file_path)
+
+
+def _read_jpeg_size(file: BinaryIO) -> Tuple[Optional[Tuple[int, int]], int]:
+    """
+    Returns the size of a jpeg image, or None, and its exif orientation, which is in an APP1 segment before the frame
+    header.
+    """
+    orientation = 1
+    while True:
+        byte = file.read(1)
+        while byte == b'\xff':
+            byte = file.read(1)  # fill bytes
+        if byte == b'':
+            return None, orientation
+        marker = byte[0]
+        if marker == 0xD8 or 0xD0 <= marker <= 0xD7 or marker == 0x01:
+            # markers without payload
+            continue
+        if marker == 0xD9 or marker == 0xDA:
+            # end of image or start of scan before any frame header
+            return None, orientation
+        length, = struct.unpack('>H', file.read(2))
+        if marker in _JPEG_SOF_MARKERS:
+            _, height, width = struct.unpack('>BHH', file.read(5))
+            return (width, height), orientation
+        if marker == _JPEG_APP1_MARKER:
+            segment = file.read(length - 2)
+            if segment.startswith(_EXIF_SIGNATURE):
+                orientation = _read_exif_orientation(segment[len(_EXIF_SIGNATURE):])
+        else:
+            file.seek(length - 2, 1)
+        if file.read(1) != b'\xff':
+            return None, orientation
+
+
+def _read_exif_orientation(tiff: bytes) -> int:
+    """
+    Returns the orientation tag of the first image file directory of exif data, or 1 if it does not have it.
+    """
+    byte_order = '<' if tiff[:2] == b'II' else '>'
+    try:
+        ifd_offset, = struct.unpack_from(f'{byte_order}I', tiff, 4)
+        entries_count, = struct.unpack_from(f'{byte_order}H', tiff, ifd_offset)
+        for i in range(entries_count):
+            tag, _, _, value = struct.unpack_from(f'{byte_order}HHIH', tiff, ifd_offset + 2 + 12 * i)
+            if tag == _EXIF_ORIENTATION_TAG:
+                return value if 1 <= value <= 8 else 1
+    except struct.error:
+        # malformed exif data, the size of the image is still valid
+        pass
+    return 1
+
+
+def _read_png_size(file: BinaryIO) -> Optional[Tuple[int, int]]:
+    _, chunk_type, width, height = struct.unpack('>I4sII', file.read(16))
+    if chunk_type != b'IHDR':
+        return None
+    return width, height
+
+
+def _read_bmp_size(file: BinaryIO) -> Optional[Tuple[int, int]]:
+    header = file.read(26)
+    header_size, = struct.unpack('<I', header[14:18])
+    if header_size == 12:
+        width, height = struct.unpack('<HH', header[18:22])
+    else:
+        width, height = struct.unpack('<ii', header[18:26])
+    return width, abs(height)
+
+
+def _read_tiff_size(file: BinaryIO) -> Optional[Tuple[int, int]]:
+    byte_order = '<' if file.read(2) == b'II' else '>'
+    version, ifd_offset = struct.unpack(f'{byte_order}HI', file.read(6))
+    if version != 42:
+        # big tiff
+        return None
+    file.seek(ifd_offset)
+    entries_count, = struct.unpack(f'{byte_order}H', file.read(2))
+    width = height = None
+    for _ in range(entries_count):
+        tag, field_type, _, value = struct.unpack(f'{byte_order}HHI4s', file.read(12))
+        if tag in (256, 257):
+            # short or long value stored in the entry itself
+            value_format = f'{byte_order}H' if field_type == 3 else f'{byte_order}I'
+            value, = struct.unpack_from(value_format, value)
+            if tag == 256:
+                width = value
+            else:
+                height = value
+    if width is None or height is None:
+        return None
+    return width, height
@@ -1,16 +1,37 @@
-import cv2 as cv
+from typing import List, Optional, Sequence
+
 from propsettings.configurable import register_as_setting
 from propsettings.setting_types.path_setting_type import Path
 
 from galleries import files_utils
+from galleries.images_providers.decode_options import DecodeOptions, read_image
 from galleries.images_providers.gallery_images_provider import GalleryImagesProvider
+from galleries.images_providers.regions import BoundingBox, read_image_regions
 
 
 class LocalFilesImageProvider(GalleryImagesProvider):
 
-    def __init__(self,  directory="", recursive=False):
+    # providers serialized before these attributes existed do not have them
+    _decode_options: Optional[DecodeOptions] = None
+    _scanner: Optional[files_utils.DirectoryScanner] = None
+
+    def __init__(
+            self,
+            directory="",
+            recursive=False,
+            decode_options: Optional[DecodeOptions] = None,
+            snapshot_path: Optional[str] = None):
+        """
+        :param directory:
+        :param recursive:
+        :param decode_options: default options to decode the images. If None images are decoded at full resolution.
+        :param snapshot_path: optional file to persist the snapshot of the directory tree, so listing the images in
+        another process only lists again the directories that changed. The snapshot is always kept in memory.
+        """
         self._directory = directory
         self._recursive = recursive
+        self._decode_options = decode_options
+        self._scanner = files_utils.DirectoryScanner(snapshot_path)
 
     @property
     def directory(self):
@@ -28,12 +49,46 @@ class LocalFilesImageProvider(GalleryImagesProvider):
     def recursive(self, value):
         self._recursive = value
 
+    @property
+    def decode_options(self):
+        return self._decode_options
+
+    @decode_options.setter
+    def decode_options(self, value):
+        self._decode_options = value
+
+    def get_fingerprint(self) -> str:
+        return repr((self._directory, self._recursive, self._decode_options))
+
     def get_indices(self):
-        return files_utils.list_images(self._directory, recursive=self._recursive)
+        if self._scanner is None:
+            self._scanner = files_utils.DirectoryScanner()
+        return files_utils.list_images(self._directory, recursive=self._recursive, scanner=self._scanner)
+
+    def count(self) -> int:
+        """
+        Returns the number of images in the directory. The images are counted in the scanner's snapshot, so only the
+        directories modified since the last listing are listed again.
+        :return:
+        """
+        return sum(1 for _ in self.get_indices())
 
     def get_image_by_index(self, img_index):
         img_path: str = img_index
-        return cv.imread(img_path)
+        return read_image(img_path, self._decode_options)
+
+    def get_image_by_index_with_options(self, img_index, decode_options: Optional[DecodeOptions] = None):
+        img_path: str = img_index
+        return read_image(img_path, decode_options or self._decode_options)
+
+    def get_image_regions(
+            self,
+            img_index,
+            bboxes: Sequence[BoundingBox],
+            decode_options: Optional[DecodeOptions] = None) -> List:
+        # the provider's default decode options are not applied to regions, their size is usually unrelated
+        img_path: str = img_index
+        return read_image_regions(img_path, bboxes, decode_options)
 
 
 register_as_setting(LocalFilesImageProvider, "_directory", setting_type=Path(True, []))
@@ -0,0 +1,213 @@
+import argparse
+import mmap
+import os
+import pickle
+from typing import Iterable, Optional
+
+import numpy as np
+from propsettings.configurable import register_as_setting
+from propsettings.setting_types.path_setting_type import Path
+
+from galleries import files_utils
+from galleries.images_providers.decode_options import DecodeOptions, decode_image
+from galleries.images_providers.gallery_images_provider import GalleryImagesProvider
+
+
+SHARD_EXT = 'shard'
+PACK_INDEX_EXT = 'pack'
+
+
+def get_pack_index_path(directory: str, name: str) -> str:
+    return os.path.join(directory, f'{name}.{PACK_INDEX_EXT}')
+
+
+def get_shard_file_name(name: str, shard_number: int) -> str:
+    return f'{name}-{shard_number:05d}.{SHARD_EXT}'
+
+
+def pack_images(
+        indices: Iterable[str],
+        directory: str,
+        name: str = 'images',
+        shard_size: int = 1024 * 1024 * 1024,
+        notify_function=None,
+        notify_rate=1000) -> str:
+    """
+    Writes the encoded bytes of image files into a few large shard files and an index that maps each image path to its
+    (shard, offset, length). Images are not decoded nor re-encoded. The index is written last, so an interrupted pack
+    is never used.
+    :param indices: paths of the images, e.g. LocalFilesImageProvider.get_indices(). They are kept as the indices of
+    PackedShardsImagesProvider.
+    :param directory: directory of the shards and the index.
+    :param name: name of the pack.
+    :param shard_size: approximate maximum size of a shard in bytes.
+    :param notify_function: function called with the number of packed images every notify_rate images.
+    :param notify_rate:
+    :return: path of the index.
+    """
+    os.makedirs(directory, exist_ok=True)
+    shards = []
+    entries = {}
+    file = None
+    try:
+        for count, img_path in enumerate(indices, 1):
+            with open(img_path, 'rb') as image_file:
+                data = image_file.read()
+            if file is None or (file.tell() > 0 and file.tell() + len(data) > shard_size):
+                if file is not None:
+                    file.close()
+                shards.append(get_shard_file_name(name, len(shards)))
+                file = open(os.path.join(directory, shards[-1]), 'wb')
+            entries[img_path] = (len(shards) - 1, file.tell(), len(data))
+            file.write(data)
+            if notify_function is not None and count % notify_rate == 0:
+                notify_function(count)
+    finally:
+        if file is not None:
+            file.close()
+
+    index_path = get_pack_index_path(directory, name)
+    temp_path = f'{index_path}.tmp'
+    with open(temp_path, 'wb') as index_file:
+        pickle.dump({'shards': shards, 'entries': entries}, index_file)
+    os.replace(temp_path, index_path)
+    return index_path
+
+
+class PackedShardsImagesProvider(GalleryImagesProvider):
+    """
+    Provides images packed with pack_images. Shards are memory mapped and images are decoded with cv.imdecode from
+    slices of the mapping, so reading an image does not open a file. Indices are the original paths of the images, so
+    annotations parsers that parse paths keep working.
+    """
+
+    def __init__(self, index_path: str = "", decode_options: Optional[DecodeOptions] = None):
+        """
+        :param index_path: path of the index written by pack_images.
+        :param decode_options: default options to decode the images.
+        """
+        self._index_path = index_path
+        self._decode_options = decode_options
+        self._init_mappings()
+
+    def _init_mappings(self):
+        self._shards = None
+        self._entries = None
+        self._mappings = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for attribute in ['_shards', '_entries', '_mappings']:
+            state.pop(attribute)  # memory mappings are not serializable
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__ = state
+        self._init_mappings()
+
+    @property
+    def index_path(self):
+        return self._index_path
+
+    @index_path.setter
+    def index_path(self, value):
+        self.release()
+        self._index_path = value
+
+    @property
+    def decode_options(self):
+        return self._decode_options
+
+    @decode_options.setter
+    def decode_options(self, value):
+        self._decode_options = value
+
+    def get_fingerprint(self) -> str:
+        return repr((self._index_path, self._decode_options))
+
+    def __contains__(self, img_index):
+        return img_index in self._get_entries()
+
+    def __len__(self):
+        return len(self._get_entries())
+
+    def count(self) -> int:
+        return len(self._get_entries())
+
+    def get_indices(self):
+        return iter(list(self._get_entries().keys()))
+
+    def get_encoded_image(self, img_index) -> Optional[np.ndarray]:
+        """
+        Returns a uint8 view of the encoded bytes of an image, or None if the image is not in the pack.
+        :param img_index:
+        :return:
+        """
+        entry = self._get_entries().get(img_index, None)
+        if entry is None:
+            return None
+        shard_number, offset, length = entry
+        return np.frombuffer(self._get_mapping(shard_number), dtype=np.uint8, count=length, offset=offset)
+
+    def get_image_by_index(self, img_index):
+        return self.get_image_by_index_with_options(img_index)
+
+    def get_image_by_index_with_options(self, img_index, decode_options: Optional[DecodeOptions] = None):
+        data = self.get_encoded_image(img_index)
+        if data is None:
+            return None
+        return decode_image(data, decode_options or self._decode_options)
+
+    def release(self):
+        """
+        Closes the memory mappings of the shards. Arrays returned by get_encoded_image must not be used afterwards.
+        :return:
+        """
+        for mapping in self._mappings.values():
+            try:
+                mapping.close()
+            except BufferError:
+                # an encoded image view is still referenced, the mapping is closed when it is released
+                pass
+        self._init_mappings()
+
+    def _get_entries(self) -> dict:
+        if self._entries is None:
+            with open(self._index_path, 'rb') as file:
+                index = pickle.load(file)
+            self._shards = index['shards']
+            self._entries = index['entries']
+        return self._entries
+
+    def _get_mapping(self, shard_number: int) -> mmap.mmap:
+        mapping = self._mappings.get(shard_number, None)
+        if mapping is None:
+            shard_path = os.path.join(os.path.dirname(self._index_path), self._shards[shard_number])
+            with open(shard_path, 'rb') as file:
+                mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            # concurrent threads may map the same shard, only one mapping is kept
+            mapping = self._mappings.setdefault(shard_number, mapping)
+        return mapping
+
+
+register_as_setting(PackedShardsImagesProvider, "_index_path", setting_type=Path(False, []))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Packs the images of a directory into shard files.")
+    parser.add_argument('images_directory')
+    parser.add_argument('output_directory')
+    parser.add_argument('--name', default='images')
+    parser.add_argument('--recursive', action='store_true')
+    parser.add_argument('--shard_size', type=int, default=1024 * 1024 * 1024)
+    args = parser.parse_args()
+
+    images = files_utils.list_images(args.images_directory, recursive=args.recursive)
+    pack_path = pack_images(
+        images,
+        args.output_directory,
+        args.name,
+        args.shard_size,
+        notify_function=lambda count: print(f"Images packed: {count}")
+    )
+    print(f"Pack index written to {pack_path}")
@@ -0,0 +1,132 @@
+import math
+from typing import List, Optional, Sequence, Tuple
+
+import cv2 as cv
+import numpy as np
+
+from galleries.images_providers.decode_options import (
+    DecodeOptions, apply_decode_options, get_imread_flags, get_reduction_factor
+)
+from galleries.images_providers.image_headers import JPEG, TIFF, get_image_header
+
+try:
+    import tifffile
+    import zarr
+except ImportError:
+    tifffile = None
+    zarr = None
+
+
+BoundingBox = Tuple[int, int, int, int]  # x, y, width, height
+
+
+def clip_bbox(bbox: BoundingBox, width: int, height: int) -> BoundingBox:
+    """
+    Clips a (x, y, width, height) bounding box to the limits of an image.
+    """
+    x, y, w, h = bbox
+    x0, y0 = min(max(0, x), width), min(max(0, y), height)
+    x1, y1 = min(max(0, x + w), width), min(max(0, y + h), height)
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def crop_image(image: Optional[np.ndarray], bbox: BoundingBox) -> Optional[np.ndarray]:
+    """
+    Returns the region of an image inside a (x, y, width, height) bounding box. The bounding box is clipped to the
+    image.
+    :param image:
+    :param bbox:
+    :return:
+    """
+    if image is None:
+        return None
+    x, y, w, h = clip_bbox(bbox, image.shape[1], image.shape[0])
+    return image[y:y + h, x:x + w]
+
+
+def get_regions_from_image(
+        image: Optional[np.ndarray],
+        bboxes: Sequence[BoundingBox],
+        decode_options: Optional[DecodeOptions] = None) -> List[Optional[np.ndarray]]:
+    return [apply_decode_options(crop_image(image, bbox), decode_options) for bbox in bboxes]
+
+
+def read_image_regions(
+        file_path: str,
+        bboxes: Sequence[BoundingBox],
+        decode_options: Optional[DecodeOptions] = None) -> List[Optional[np.ndarray]]:
+    """
+    Reads regions of an image decoding as little as its format allows. Bounding boxes are (x, y, width, height) in the
+    coordinates of the full resolution image and decode_options apply to each region, e.g. its size is the size of
+    each returned region.
+        - jpeg: if the regions are resized down, the image is decoded with OpenCV's IMREAD_REDUCED_* flags and the
+        bounding boxes are rescaled.
+        - tiff: only the tiles or strips that overlap each region are read, if tifffile and zarr are installed.
+        - other formats: the whole image is decoded once for all the regions.
+    :param file_path:
+    :param bboxes:
+    :param decode_options:
+    :return:
+    """
+    if len(bboxes) == 0:
+        return []
+    header = get_image_header(file_path)
+    if header is not None and header.format == JPEG and decode_options is not None:
+        # OpenCV applies the exif orientation, bounding boxes are in the coordinates of the rotated image
+        width, height = header.get_oriented_size()
+        bboxes = [clip_bbox(bbox, width, height) for bbox in bboxes]
+        return _read_jpeg_regions(file_path, bboxes, decode_options)
+    if header is not None and header.format == TIFF and tifffile is not None:
+        regions = _read_tiff_regions(file_path, bboxes, header.width, header.height)
+        if regions is not None:
+            return [apply_decode_options(region, decode_options) for region in regions]
+    grayscale = decode_options is not None and decode_options.grayscale
+    image = cv.imread(file_path, get_imread_flags(grayscale))
+    return get_regions_from_image(image, bboxes, decode_options)
+
+
+def _read_jpeg_regions(file_path: str, bboxes: Sequence[BoundingBox], decode_options: DecodeOptions):
+    # a single factor that does not reduce any region below its target size
+    factor = 8
+    for _, _, w, h in bboxes:
+        target_width, target_height = decode_options.get_target_size(max(1, w), max(1, h))
+        factor = min(factor, get_reduction_factor(w, h, target_width, target_height))
+    image = cv.imread(file_path, get_imread_flags(decode_options.grayscale, factor))
+    if image is None:
+        return [None] * len(bboxes)
+    regions = []
+    for x, y, w, h in bboxes:
+        target_width, target_height = decode_options.get_target_size(max(1, w), max(1, h))
+        x0, y0 = x // factor, y // factor
+        x1, y1 = math.ceil((x + w) / factor), math.ceil((y + h) / factor)
+        region = crop_image(image, (x0, y0, x1 - x0, y1 - y0))
+        if region.size > 0 and (region.shape[1], region.shape[0]) != (target_width, target_height):
+            region = cv.resize(region, (target_width, target_height), interpolation=decode_options.interpolation)
+        regions.append(region)
+    return regions
+
+
+def _read_tiff_regions(file_path: str, bboxes: Sequence[BoundingBox], width: int, height: int):
+    try:
+        with tifffile.imread(file_path, aszarr=True) as store:
+            array = zarr.open(store, mode='r')
+            if not hasattr(array, 'shape'):
+                # pyramidal tiff, the first level has the full resolution
+                array = array['0']
+            regions = []
+            for bbox in bboxes:
+                x, y, w, h = clip_bbox(bbox, width, height)
+                region = np.asarray(array[y:y + h, x:x + w])
+                regions.append(_rgb_to_bgr(region))
+            return regions
+    except (ImportError, NotImplementedError, ValueError, KeyError):
+        # unsupported layout or compression (tifffile's errors are ValueErrors), the image is decoded by OpenCV
+        return None
+
+
+def _rgb_to_bgr(image: np.ndarray) -> np.ndarray:
+    if image.ndim == 3 and image.shape[2] == 3:
+        return cv.cvtColor(image, cv.COLOR_RGB2BGR)
+    if image.ndim == 3 and image.shape[2] == 4:
+        return cv.cvtColor(image, cv.COLOR_RGBA2BGR)
+    return image
@@ -0,0 +1,42 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Executor
+from typing import Callable, Iterable, Optional
+
+
+def ordered_parallel_map(
+        function: Callable,
+        iterable: Iterable,
+        workers: Optional[int],
+        prefetch: Optional[int] = None,
+        executor: Optional[Executor] = None):
+    """
+    Lazy equivalent of map(function, iterable) that runs function in a pool of workers. Results are yielded in the
+    order of iterable and at most prefetch items are submitted ahead of the consumer.
+    :param function:
+    :param iterable:
+    :param workers: number of worker threads. If it is None or 1, function runs in the calling thread.
+    :param prefetch: maximum number of items being processed or waiting to be consumed. Defaults to 2 * workers.
+    :param executor: optional executor to use instead of creating a thread pool.
+    :return:
+    """
+    if executor is None and (workers is None or workers <= 1):
+        yield from map(function, iterable)
+        return
+
+    workers = workers or 1
+    prefetch = max(1, prefetch or 2 * workers)
+    owns_executor = executor is None
+    executor = executor or ThreadPoolExecutor(workers)
+    pending = deque()
+    try:
+        for item in iterable:
+            pending.append(executor.submit(function, item))
+            if len(pending) >= prefetch:
+                yield pending.popleft().result()
+        while len(pending) > 0:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+        if owns_executor:
+            executor.shutdown(wait=True)
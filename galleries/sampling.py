@@ -0,0 +1,91 @@
+import itertools
+import math
+import random
+from typing import Any, Iterable, List, Optional, Sequence
+
+
+# marks the end of an iterator and the positions that were not selected
+_END = object()
+
+
+def _check_sample_size(n: int):
+    if n < 0:
+        raise ValueError(f"The sample size must not be negative, got {n}")
+
+
+def _uniform_open(rng: random.Random) -> float:
+    # uniform in (0, 1), its logarithm is finite
+    value = rng.random()
+    while value == 0.0:
+        value = rng.random()
+    return value
+
+
+def reservoir_sample(iterable: Iterable, n: int, seed: Optional[int] = None) -> List:
+    """
+    Returns n random items of an iterable in a single pass, keeping at most n items in memory. It uses reservoir
+    sampling with geometric skips (Li's algorithm L), so the random generator is called about n * log(N / n) times for
+    N items instead of N times. If the iterable has fewer than n items all of them are returned. Items are returned in
+    random order.
+    :param iterable:
+    :param n:
+    :param seed: seed of the random generator, None for a different sample in each call.
+    :return:
+    """
+    _check_sample_size(n)
+    rng = random.Random(seed)
+    iterator = iter(iterable)
+    reservoir = list(itertools.islice(iterator, n))
+    if n == 0 or len(reservoir) < n:
+        rng.shuffle(reservoir)
+        return reservoir
+    w = math.exp(math.log(_uniform_open(rng)) / n)
+    while True:
+        skip = math.floor(math.log(_uniform_open(rng)) / math.log1p(-w))
+        item = next(itertools.islice(iterator, skip, skip + 1), _END)
+        if item is _END:
+            break
+        reservoir[rng.randrange(n)] = item
+        w *= math.exp(math.log(_uniform_open(rng)) / n)
+    rng.shuffle(reservoir)
+    return reservoir
+
+
+def sample_positions(count: int, n: int, seed: Optional[int] = None) -> List[int]:
+    """
+    Returns min(n, count) distinct random positions in [0, count), in random order.
+    :param count:
+    :param n:
+    :param seed:
+    :return:
+    """
+    _check_sample_size(n)
+    return random.Random(seed).sample(range(count), min(n, count))
+
+
+def sample_sequence(sequence: Sequence, n: int, seed: Optional[int] = None) -> List:
+    """
+    Returns n random items of a sequence with random access, without copying it.
+    """
+    return [sequence[position] for position in sample_positions(len(sequence), n, seed)]
+
+
+def select_positions(iterable: Iterable, positions: List[int]) -> List:
+    """
+    Returns the items of an iterable at positions, in the order of positions, in a single pass that keeps only the
+    selected items in memory. Positions past the end of the iterable are ignored.
+    :param iterable:
+    :param positions:
+    :return:
+    """
+    order = {position: i for i, position in enumerate(positions)}
+    selected: List[Any] = [_END] * len(positions)
+    remaining = len(positions)
+    for position, item in enumerate(iterable):
+        if remaining == 0:
+            break
+        i = order.get(position, None)
+        if i is not None:
+            selected[i] = item
+            remaining -= 1
+    return [item for item in selected if item is not _END]
@@ -0,0 +1,61 @@
+import hashlib
+from typing import Any, Iterable, Iterator, Optional
+
+
+# stable_hash values are in [0, STABLE_HASH_RANGE)
+STABLE_HASH_RANGE = 2 ** 53
+# name of stable_hash in the connections of SqliteConnector
+SQL_STABLE_HASH_FUNCTION = "stable_hash"
+
+
+def stable_hash(index: Any, seed: Optional[int] = None) -> int:
+    """
+    Returns a 53 bits hash, in [0, STABLE_HASH_RANGE), of an index that is the same in every process and host, unlike
+    hash(), which is salted for strings. Indices are hashed by their string representation.
+    :param index:
+    :param seed: if it is not None, it is hashed together with the index, so each seed gives different hashes.
+    :return:
+    """
+    key = str(index) if seed is None else f"{seed}:{index}"
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+    # a non negative value that is exact as a double too, so sql functions that compute with floats, e.g. sqlite's
+    # MOD, give the same results
+    return int.from_bytes(digest, 'big') >> 11
+
+
+def check_shard(shard: int, num_shards: int):
+    if num_shards is None or num_shards < 1:
+        raise ValueError(f"The number of shards must be positive, got {num_shards}")
+    if not 0 <= shard < num_shards:
+        raise ValueError(f"Shard {shard} is not in [0, {num_shards})")
+
+
+def get_shard(index: Any, num_shards: int, seed: Optional[int] = None) -> int:
+    return stable_hash(index, seed) % num_shards
+
+
+def shard_indices(indices: Iterable, shard: int, num_shards: int, seed: Optional[int] = None) -> Iterator:
+    """
+    Yields the indices that belong to a shard. Indices are assigned to shards by a stable hash, so every worker gets
+    the same partition without communicating and shards have about the same size.
+
+    Without seed the partition is fixed and indices keep their order. With a seed, e.g. the epoch number, the
+    partition and the order of the indices of the shard change with the seed: it is a shuffle of all the indices that
+    is the same in every worker, split between the shards. The shard's indices are kept in memory to sort them.
+    :param indices:
+    :param shard: number of the shard, in [0, num_shards).
+    :param num_shards:
+    :param seed:
+    :return:
+    """
+    check_shard(shard, num_shards)
+    if seed is None:
+        for index in indices:
+            if stable_hash(index) % num_shards == shard:
+                yield index
+        return
+    hashed = ((stable_hash(index, seed), index) for index in indices)
+    shard_hashed = [(index_hash, index) for index_hash, index in hashed if index_hash % num_shards == shard]
+    shard_hashed.sort(key=lambda index_hash: index_hash[0])
+    for _, index in shard_hashed:
+        yield index
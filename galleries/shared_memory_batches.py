@@ -0,0 +1,187 @@
+import math
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Callable, Iterable, Optional, Tuple
+
+import numpy as np
+
+from galleries.igallery import IGallery
+from galleries.images_providers.decode_options import fit_image
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # python < 3.8
+    shared_memory = None
+
+
+# state of each worker process, set once by the pool initializer so the gallery is not pickled for every task
+_worker_gallery: Optional[IGallery] = None
+_worker_preprocess: Optional[Callable[[np.ndarray], np.ndarray]] = None
+_worker_slabs = {}
+
+
+def _init_worker(gallery: IGallery, preprocess: Optional[Callable[[np.ndarray], np.ndarray]]):
+    global _worker_gallery, _worker_preprocess
+    _worker_gallery = gallery
+    _worker_preprocess = preprocess
+    _worker_slabs.clear()
+
+
+def _attach_slab(name: str) -> 'shared_memory.SharedMemory':
+    slab = _worker_slabs.get(name, None)
+    if slab is None:
+        slab = shared_memory.SharedMemory(name=name)
+        _worker_slabs[name] = slab
+    return slab
+
+
+def _load_chunk(slab_name: str, batch_shape: tuple, dtype: str, start: int, indices: list) -> int:
+    slab = _attach_slab(slab_name)
+    batch = np.ndarray(batch_shape, dtype=np.dtype(dtype), buffer=slab.buf)
+    for position, index in enumerate(indices, start):
+        image = _worker_gallery.get_image_by_index(index)
+        if image is None:
+            batch[position] = 0
+            continue
+        if _worker_preprocess is not None:
+            image = _worker_preprocess(image)
+        batch[position] = fit_image(image, batch_shape[1:])
+    del batch
+    return len(indices)
+
+
+class SharedMemoryBatchIterator:
+    """
+    Iterates over the images of a gallery in batches loaded by a pool of processes. Each batch is a shared memory slab
+    shaped (batch_size, height, width, channels) and each worker decodes, preprocesses and resizes its images directly
+    into the slab, so images are never pickled back to the consumer process.
+
+    Iterating yields (images, indices) tuples where images is a view of the slab. A slab is reused once the next batch
+    is requested, so copy the view if it must outlive the iteration step. The last batch may be shorter.
+
+    Example:
+        with SharedMemoryBatchIterator(gallery, gallery.get_indices(), 64, (224, 224, 3), workers=8) as batches:
+            for images, indices in batches:
+                ...
+    """
+
+    def __init__(
+            self,
+            gallery: IGallery,
+            indices: Iterable[Any],
+            batch_size: int,
+            image_shape: Tuple[int, int, int],
+            dtype=np.uint8,
+            workers: Optional[int] = None,
+            buffered_batches: int = 2,
+            preprocess: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+            mp_context=None):
+        """
+        :param gallery: gallery to load images from. It is sent once to every worker, so it must be picklable.
+        :param indices:
+        :param batch_size:
+        :param image_shape: (height, width, channels) of the images in a batch. Images are resized to it.
+        :param dtype:
+        :param workers: number of processes. Defaults to the number of cpus.
+        :param buffered_batches: number of slabs, i.e. batches being loaded or consumed at the same time.
+        :param preprocess: optional function applied to each image in the workers before resizing it. It must be
+        picklable.
+        :param mp_context: multiprocessing context of the pool.
+        """
+        if shared_memory is None:
+            raise RuntimeError("SharedMemoryBatchIterator needs Python 3.8 or later")
+        self._gallery = gallery
+        self._indices = indices
+        self._batch_size = batch_size
+        self._image_shape = tuple(image_shape)
+        self._dtype = np.dtype(dtype)
+        self._workers = workers or os.cpu_count() or 1
+        self._buffered_batches = max(1, buffered_batches)
+        self._preprocess = preprocess
+        self._mp_context = mp_context
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slabs = []
+
+    @property
+    def batch_shape(self) -> tuple:
+        return (self._batch_size,) + self._image_shape
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __iter__(self):
+        self.close()
+        indices = iter(self._indices)
+        self._executor = ProcessPoolExecutor(
+            self._workers,
+            mp_context=self._mp_context,
+            initializer=_init_worker,
+            initargs=(self._gallery, self._preprocess)
+        )
+        slab_size = max(1, int(np.prod(self.batch_shape)) * self._dtype.itemsize)
+        self._slabs = [
+            shared_memory.SharedMemory(create=True, size=slab_size) for _ in range(self._buffered_batches)
+        ]
+        chunk_size = max(1, math.ceil(self._batch_size / self._workers))
+        pending = deque()
+
+        def submit(slab_number: int) -> bool:
+            batch_indices = list(islice(indices, self._batch_size))
+            if len(batch_indices) == 0:
+                return False
+            slab_name = self._slabs[slab_number].name
+            futures = [
+                self._executor.submit(
+                    _load_chunk,
+                    slab_name,
+                    self.batch_shape,
+                    self._dtype.str,
+                    start,
+                    batch_indices[start:start + chunk_size]
+                )
+                for start in range(0, len(batch_indices), chunk_size)
+            ]
+            pending.append((slab_number, batch_indices, futures))
+            return True
+
+        try:
+            for slab_number in range(len(self._slabs)):
+                if not submit(slab_number):
+                    break
+            while len(pending) > 0:
+                slab_number, batch_indices, futures = pending.popleft()
+                for future in futures:
+                    future.result()
+                batch = np.ndarray(self.batch_shape, dtype=self._dtype, buffer=self._slabs[slab_number].buf)
+                yield batch[:len(batch_indices)], batch_indices
+                del batch
+                submit(slab_number)
+        finally:
+            for _, _, futures in pending:
+                for future in futures:
+                    future.cancel()
+            self.close()
+
+    def close(self):
+        """
+        Stops the workers and frees the shared memory. Views of the slabs still referenced by the consumer remain
+        valid until they are released.
+        :return:
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        for slab in self._slabs:
+            try:
+                slab.close()
+            except BufferError:
+                # a view of the slab is still referenced, its memory is released when the view is
+                pass
+            slab.unlink()
+        self._slabs = []
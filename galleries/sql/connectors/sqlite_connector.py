@@ -1,8 +1,10 @@
 from propsettings.configurable import register_as_setting
 import sqlite3
+import sys
 
 from propsettings.setting_types.path_setting_type import Path
 
+from galleries.sharding import SQL_STABLE_HASH_FUNCTION, stable_hash
 from galleries.sql.connectors import GallerySqlConnector
 
 
@@ -12,7 +14,13 @@ class SqliteConnector(GallerySqlConnector):
         self._database_path = database_path
 
     def connect(self):
-        return sqlite3.connect(self._database_path)
+        connection = sqlite3.connect(self._database_path)
+        if sys.version_info >= (3, 8):
+            # deterministic functions can be used in indices
+            connection.create_function(SQL_STABLE_HASH_FUNCTION, 2, stable_hash, deterministic=True)
+        else:
+            connection.create_function(SQL_STABLE_HASH_FUNCTION, 2, stable_hash)
+        return connection
 
 
 register_as_setting(SqliteConnector, "_database_path", setting_type=Path(False, []))
@@ -1,9 +1,14 @@
 import abc
+import math
+import random
 import numpy as np
 from typing import List, Any, Dict, Optional, Callable
 
 from galleries.annotations_filtering import ComparisonType, comparison_type_to_sql_operator
 from galleries.annotations_filtering.filter import FilterStatement
+from galleries.change_feed import DELETED, INSERTED, UPDATED, GalleryChanges, collapse_changes
+from galleries.sampling import reservoir_sample
+from galleries.sharding import SQL_STABLE_HASH_FUNCTION, STABLE_HASH_RANGE, check_shard, shard_indices
 
 
 class SqlDataRetriever:
@@ -55,12 +60,238 @@ class SqlDataRetriever:
             annotations = self.get_annotations_by_index(cursor, index)
             yield image, annotations
 
+    def count(self, cursor, filters: List[List[FilterStatement]] = None) -> int:
+        """
+        Returns the number of rows that meet the filters. By default the indices are enumerated, retrievers should
+        override it with count_rows to count in the database.
+        """
+        return sum(1 for _ in self.get_indices(cursor, filters))
+
+    def get_indices_shard(
+            self,
+            cursor,
+            shard: int,
+            num_shards: int,
+            seed: Optional[int] = None,
+            filters: List[List[FilterStatement]] = None):
+        """
+        Get the indices of a shard, see IGallery.get_indices. By default all the indices are fetched and the ones of
+        other shards are discarded, retrievers should override it with get_shard_statement to select the shard in the
+        database.
+        """
+        return shard_indices(self.get_indices(cursor, filters), shard, num_shards, seed)
+
+    def sample(self, cursor, n: int, filters: List[List[FilterStatement]] = None, seed: Optional[int] = None) -> list:
+        """
+        Get n random indices that meet the filters, see IGallery.sample. By default the indices are fetched and
+        sampled with reservoir sampling, retrievers should override it with sample_rows to sample in the database.
+        """
+        return reservoir_sample(self.get_indices(cursor, filters), n, seed)
+
+    def get_changes(self, cursor, token: Optional[int] = None) -> GalleryChanges:
+        """
+        Get the indices added, removed and modified since token. Retrievers of tables with change tracking (see
+        create_change_tracking) implement it with get_changes_from_change_table.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not track changes")
+
+    @staticmethod
+    def create_change_tracking(cursor, table: str, index_column: str):
+        """
+        Creates a {table}_changes table and sqlite triggers that log every insertion, update and deletion of the
+        table's rows with an increasing version.
+        :param cursor:
+        :param table: table of the gallery's images.
+        :param index_column: column with the images' indices.
+        :return:
+        """
+        changes_table = f"{table}_changes"
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {changes_table} "
+            f"(version INTEGER PRIMARY KEY AUTOINCREMENT, idx, operation TEXT)"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {changes_table}_insert AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {changes_table} (idx, operation) VALUES (NEW.{index_column}, '{INSERTED}'); "
+            f"END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {changes_table}_update AFTER UPDATE ON {table} BEGIN "
+            f"INSERT INTO {changes_table} (idx, operation) "
+            f"SELECT OLD.{index_column}, '{DELETED}' WHERE OLD.{index_column} IS NOT NEW.{index_column}; "
+            f"INSERT INTO {changes_table} (idx, operation) "
+            f"SELECT NEW.{index_column}, "
+            f"CASE WHEN OLD.{index_column} IS NEW.{index_column} THEN '{UPDATED}' ELSE '{INSERTED}' END; "
+            f"END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {changes_table}_delete AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {changes_table} (idx, operation) VALUES (OLD.{index_column}, '{DELETED}'); "
+            f"END"
+        )
+
+    @staticmethod
+    def get_changes_from_change_table(cursor, table: str, index_column: str, token: Optional[int] = None):
+        """
+        Get the changes logged by the triggers of create_change_tracking after token. If token is None all the current
+        indices are returned as added.
+        """
+        changes_table = f"{table}_changes"
+        current_token, = cursor.execute(f"SELECT MAX(version) FROM {changes_table}").fetchone()
+        current_token = current_token or 0
+        if token is None:
+            indices = [index for index, in cursor.execute(f"SELECT {index_column} FROM {table}")]
+            return GalleryChanges(current_token, added=indices)
+        operations = cursor.execute(
+            f"SELECT idx, operation FROM {changes_table} WHERE version > ? AND version <= ? ORDER BY version",
+            [token, current_token]
+        )
+        return collapse_changes(current_token, operations)
+
+    @staticmethod
+    def count_rows(
+            cursor,
+            from_statement: str,
+            filters: List[List[FilterStatement]],
+            annotations_keys_to_sql_keys: dict,
+            annotations_types: dict,
+            annotation_list_subquery: Callable
+    ) -> int:
+        """
+        Counts the rows that meet the filters with a SELECT COUNT(*) query, so no row is transferred.
+        :param cursor:
+        :param from_statement: table or joined tables of the query, as in SELECT COUNT(*) FROM {from_statement}.
+        :param filters:
+        :param annotations_keys_to_sql_keys:
+        :param annotations_types:
+        :param annotation_list_subquery:
+        :return:
+        """
+        query = f"SELECT COUNT(*) FROM {from_statement}"
+        arguments = []
+        if filters:
+            where_statement, arguments = SqlDataRetriever.get_where_statement_from_filters(
+                filters,
+                annotations_keys_to_sql_keys,
+                annotations_types,
+                annotation_list_subquery
+            )
+            query = f"{query} {where_statement}"
+        cursor.execute(query, arguments)
+        count, = cursor.fetchone()
+        return count
+
+    @staticmethod
+    def get_shard_statement(hash_expression: str, shard: int, num_shards: int):
+        """
+        Returns an SQL condition, and its arguments, that selects the rows of a shard given an expression of a non
+        negative integer hash of the rows' key. With SqliteConnector use stable_hash(key, ?), with the seed as its
+        argument, to get the same partition and order as galleries.sharding. In Oracle use, e.g.,
+        ORA_HASH(key, 4294967295, ?). Order the rows by the same expression to shuffle them with the seed.
+        :param hash_expression:
+        :param shard:
+        :param num_shards:
+        :return:
+        """
+        check_shard(shard, num_shards)
+        return f"MOD({hash_expression}, ?) = ?", [num_shards, shard]
+
+    @staticmethod
+    def sample_rows(
+            cursor,
+            n: int,
+            seed: Optional[int],
+            key_column: str,
+            from_statement: str,
+            filters: List[List[FilterStatement]],
+            annotations_keys_to_sql_keys: dict,
+            annotations_types: dict,
+            annotation_list_subquery: Callable,
+            hash_expression: Optional[str] = None,
+            hash_range: int = STABLE_HASH_RANGE
+    ) -> list:
+        """
+        Samples n rows in the database without sorting the table by a random value, as ORDER BY RANDOM() does. Each
+        row has a pseudo random hash of its key and the seed, and the sample is the n rows with the lowest hashes. Only
+        the rows whose hash is below a threshold, about n of them, are fetched and sorted. The threshold is raised if
+        fewer than n rows are below it.
+        :param cursor:
+        :param n:
+        :param seed: seed of the sample, None for a different sample in each call.
+        :param key_column: column of the indices.
+        :param from_statement: table or joined tables of the query, as in count_rows.
+        :param filters:
+        :param annotations_keys_to_sql_keys:
+        :param annotations_types:
+        :param annotation_list_subquery:
+        :param hash_expression: SQL expression of a hash of key_column, uniform in [0, hash_range), with the seed as its
+        only argument. By default the stable_hash function of SqliteConnector's connections, e.g. in Oracle use
+        ORA_HASH(key, 4294967295, ?) with a hash_range of 2 ** 32.
+        :param hash_range:
+        :return:
+        """
+        if n < 0:
+            raise ValueError(f"The sample size must not be negative, got {n}")
+        if seed is None:
+            seed = random.randrange(2 ** 31)
+        hash_expression = hash_expression or f"{SQL_STABLE_HASH_FUNCTION}({key_column}, ?)"
+        count = SqlDataRetriever.count_rows(
+            cursor,
+            from_statement,
+            filters,
+            annotations_keys_to_sql_keys,
+            annotations_types,
+            annotation_list_subquery
+        )
+        n = min(n, count)
+        if n == 0:
+            return []
+
+        condition = "1 = 1"
+        filters_arguments = []
+        if filters:
+            condition, filters_arguments = SqlDataRetriever.get_condition_from_filters(
+                filters,
+                annotations_keys_to_sql_keys,
+                annotations_types,
+                annotation_list_subquery
+            )
+        query = f"SELECT {key_column}, {hash_expression} FROM {from_statement} " \
+                f"WHERE ({condition}) AND {hash_expression} < ?"
+        # n rows plus a margin of three standard deviations are expected below the threshold
+        fraction = min(1.0, (n + 3 * math.sqrt(n) + 10) / count)
+        while True:
+            threshold = math.ceil(fraction * hash_range)
+            cursor.execute(query, [seed] + filters_arguments + [seed, threshold])
+            rows = cursor.fetchall()
+            if len(rows) >= n or fraction >= 1.0:
+                break
+            fraction = min(1.0, fraction * 2)
+        rows.sort(key=lambda row: row[1])
+        return [index for index, _ in rows[:n]]
+
     @staticmethod
     def get_where_statement_from_filters(
             filters: List[List[FilterStatement]],
             annotations_keys_to_sql_keys: dict,
             annotations_types: dict,
             annotation_list_subquery: Callable
+    ):
+        complete_sql_statement, arguments = SqlDataRetriever.get_condition_from_filters(
+            filters,
+            annotations_keys_to_sql_keys,
+            annotations_types,
+            annotation_list_subquery
+        )
+        where_statement = f"WHERE {complete_sql_statement}"
+        return where_statement, arguments
+
+    @staticmethod
+    def get_condition_from_filters(
+            filters: List[List[FilterStatement]],
+            annotations_keys_to_sql_keys: dict,
+            annotations_types: dict,
+            annotation_list_subquery: Callable
     ):
         arguments = []
         sql_and_statements = [
@@ -73,10 +304,12 @@ class SqlDataRetriever:
         ]
         complete_sql_statement = " OR ".join(sql_and_statements)
         for and_statements in filters:
-            values = [value for _, _, value, _ in and_statements]
+            values = [
+                SqlDataRetriever.filter_statement_to_sql_argument(statement, annotations_types)
+                for statement in and_statements
+            ]
             arguments += values
-        where_statement = f"WHERE {complete_sql_statement}"
-        return where_statement, arguments
+        return complete_sql_statement, arguments
 
     @staticmethod
     def list_of_filter_statements_to_sql_statement(
@@ -113,7 +346,6 @@ class SqlDataRetriever:
             operator = comparison_type_to_sql_operator[comparison_type]
             sql_condition = f"{sql_key}{operator}?"
         elif key_type == str:
-            statement.filter_value = f"%{value}%"
             sql_condition = f"{sql_key} LIKE ?"
         elif key_type == list:
             subquery = annotation_list_subquery(key, alias_index)
@@ -124,3 +356,18 @@ class SqlDataRetriever:
         if is_negated:
             sql_condition = f"NOT {sql_condition}"
         return sql_condition
+
+    @staticmethod
+    def filter_statement_to_sql_argument(statement: FilterStatement, annotations_types: dict):
+        """
+        Returns the argument of the SQL condition of a statement, a LIKE pattern for CONTAINS statements of string
+        annotations. The statement is not modified, so the same filters can be used in several queries.
+        :param statement:
+        :param annotations_types:
+        :return:
+        """
+        key, comparison_type, value, _ = statement
+        key_type = annotations_types[key] if key in annotations_types else str
+        if comparison_type == ComparisonType.CONTAINS and key_type == str:
+            return f"%{value}%"
+        return value
@@ -82,6 +82,9 @@ if __name__ == '__main__':
                 'opencv-python',
                 'propsettings>=0.1.15',
             ],
+            extras_require={
+                'tiff': ['tifffile', 'zarr'],
+            },
             classifiers=[
                 "Programming Language :: Python :: 3",
                 "License :: OSI Approved :: MIT License",
@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from galleries.annotations_filtering import ComparisonType
+from galleries.annotations_filtering.filter import FilterStatement
+from galleries.annotations_index import AnnotationsIndex
+from galleries.annotations_parsers.file_name_parser import FileNameSepParser
+from galleries.gallery import Gallery
+from galleries.images_providers.local_files_image_providers import LocalFilesImageProvider
+from test.test_utils import CountingParser
+
+
+class AnnotationsIndexTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        for name in ["ana-F.jpg", "bob-M.jpg", "eva-F.jpg"]:
+            self._create_file(name)
+        self.parser = CountingParser(["name", "sex"])
+        self.index = AnnotationsIndex(os.path.join(self.directory, "index", "annotations.db"), refresh_interval=0.0)
+        self.gallery = Gallery("test", LocalFilesImageProvider(self.directory), self.parser, self.index)
+        self.filters = [[FilterStatement("sex", ComparisonType.EQUAL, "F", False)]]
+
+    def tearDown(self) -> None:
+        self.index.close()
+        shutil.rmtree(self.directory)
+
+    def _create_file(self, name):
+        with open(os.path.join(self.directory, name), "wb") as file:
+            file.write(b"")
+
+    def _get_names(self, filters):
+        return sorted(os.path.basename(index) for index in self.gallery.get_indices(filters))
+
+    def test_filtered_indices_are_the_same_as_without_index(self):
+        # arrange
+        gallery = Gallery("test", LocalFilesImageProvider(self.directory), FileNameSepParser(["name", "sex"]))
+        expected = sorted(os.path.basename(index) for index in gallery.get_indices(self.filters))
+
+        # act
+        names = self._get_names(self.filters)
+
+        # assert
+        self.assertListEqual(expected, names)
+
+    def test_unchanged_files_are_not_parsed_again(self):
+        # arrange
+        self._get_names(self.filters)
+        self.parser.parsed.clear()
+
+        # act
+        self._get_names(self.filters)
+
+        # assert
+        self.assertListEqual([], self.parser.parsed)
+
+    def test_new_and_removed_files_are_updated(self):
+        # arrange
+        self._get_names(self.filters)
+        self.parser.parsed.clear()
+        self._create_file("zoe-F.jpg")
+        os.remove(os.path.join(self.directory, "ana-F.jpg"))
+
+        # act
+        names = self._get_names(self.filters)
+
+        # assert
+        self.assertListEqual(["eva-F.jpg", "zoe-F.jpg"], names)
+        self.assertListEqual(["zoe-F.jpg"], [os.path.basename(index) for index in self.parser.parsed])
+
+    def test_index_is_invalidated_when_parser_changes(self):
+        # arrange
+        self._get_names(self.filters)
+        self.gallery.annotations_parser = FileNameSepParser(["sex", "name"])
+
+        # act
+        names = self._get_names([[FilterStatement("name", ComparisonType.EQUAL, "M", False)]])
+
+        # assert
+        self.assertListEqual(["bob-M.jpg"], names)
+
+    def test_index_is_kept_when_parser_state_changes(self):
+        # arrange
+        self._get_names(self.filters)
+        self.parser.parsed.clear()
+        self.parser.parsed.append("state that is not configuration")
+
+        # act
+        self._get_names(self.filters)
+
+        # assert
+        self.assertListEqual(["state that is not configuration"], self.parser.parsed)
+
+    def test_files_are_not_checked_again_during_refresh_interval(self):
+        # arrange
+        self.index.close()
+        self.index = AnnotationsIndex(os.path.join(self.directory, "index", "interval.db"), refresh_interval=60.0)
+        self.gallery.annotations_index = self.index
+        self._get_names(self.filters)
+        self._create_file("zoe-F.jpg")
+
+        # act
+        names = self._get_names(self.filters)
+        self.index.update(self.gallery.images_provider.get_indices(), self.parser, force=True)
+        updated_names = self._get_names(self.filters)
+
+        # assert
+        self.assertListEqual(["ana-F.jpg", "eva-F.jpg"], names)
+        self.assertListEqual(["ana-F.jpg", "eva-F.jpg", "zoe-F.jpg"], updated_names)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+
+from galleries.collections.bloom_filter import BloomFilter
+
+
+class BloomFilterTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.capacity = 1000
+        self.bloom_filter = BloomFilter(self.capacity, error_rate=0.01)
+
+    def test_added_keys_are_contained(self):
+        # arrange
+        keys = [f"image_{i}.jpg" for i in range(self.capacity)]
+
+        # act
+        for key in keys:
+            self.bloom_filter.add(key)
+
+        # assert
+        for key in keys:
+            self.assertIn(key, self.bloom_filter)
+
+    def test_false_positive_rate_is_bounded(self):
+        # arrange
+        for i in range(self.capacity):
+            self.bloom_filter.add(i)
+
+        # act
+        false_positives = sum(i in self.bloom_filter for i in range(self.capacity, 11 * self.capacity))
+
+        # assert
+        self.assertLess(false_positives / (10 * self.capacity), 0.03)
+
+    def test_is_full_after_adding_more_keys_than_capacity(self):
+        # arrange
+        for i in range(self.capacity):
+            self.bloom_filter.add(i)
+
+        # act and assert
+        self.assertFalse(self.bloom_filter.is_full())
+        self.bloom_filter.add(self.capacity)
+        self.assertTrue(self.bloom_filter.is_full())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from galleries.images_providers.cached_images_provider import CachedImagesProvider
+from galleries.images_providers.gallery_images_provider import GalleryImagesProvider
+
+
+class CountingImagesProvider(GalleryImagesProvider):
+
+    def __init__(self, count=10):
+        self.count = count
+        self.offset = 0
+        self.decoded = 0
+
+    def get_fingerprint(self) -> str:
+        return repr(self.offset)
+
+    def get_indices(self):
+        return range(self.count)
+
+    def get_image_by_index(self, img_index):
+        self.decoded += 1
+        if img_index >= self.count:
+            return None
+        return np.full((4, 4, 3), img_index + self.offset, dtype=np.uint8)
+
+
+class CachedImagesProviderTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.provider = CountingImagesProvider()
+        self.image_bytes = 4 * 4 * 3
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory)
+
+    def test_when_image_is_read_twice__it_is_decoded_once(self):
+        # arrange
+        cache = CachedImagesProvider(self.provider, memory_bytes=10 * self.image_bytes)
+
+        # act
+        first = cache.get_image_by_index(3)
+        second = cache.get_image_by_index(3)
+
+        # assert
+        np.testing.assert_array_equal(first, second)
+        self.assertEqual(1, self.provider.decoded)
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(1, cache.misses)
+
+    def test_memory_tier_is_bounded_by_bytes(self):
+        # arrange
+        cache = CachedImagesProvider(self.provider, memory_bytes=3 * self.image_bytes)
+
+        # act
+        for index in range(5):
+            cache.get_image_by_index(index)
+        cache.get_image_by_index(0)
+
+        # assert
+        self.assertEqual(3, cache.evictions)
+        self.assertLessEqual(cache.cached_bytes, 3 * self.image_bytes)
+        self.assertEqual(6, self.provider.decoded)
+
+    def test_disk_tier_is_shared_between_instances(self):
+        # arrange
+        CachedImagesProvider(self.provider, cache_directory=self.directory).get_image_by_index(7)
+        cache = CachedImagesProvider(self.provider, cache_directory=self.directory)
+
+        # act
+        image = cache.get_image_by_index(7)
+
+        # assert
+        np.testing.assert_array_equal(self.provider.get_image_by_index(7), image)
+        self.assertEqual(1, cache.disk_hits)
+        self.assertEqual(0, cache.misses)
+
+    def test_disk_tier_entries_are_memory_mapped(self):
+        # arrange
+        CachedImagesProvider(self.provider, cache_directory=self.directory).get_image_by_index(7)
+        cache = CachedImagesProvider(self.provider, cache_directory=self.directory, copy=False)
+
+        # act
+        image = cache.get_image_by_index(7)
+
+        # assert
+        self.assertIsInstance(image, np.memmap)
+        self.assertEqual(1, cache.disk_hits)
+
+    def test_when_wrapped_provider_changes__images_are_not_stale(self):
+        # arrange
+        cache = CachedImagesProvider(self.provider, memory_bytes=10 * self.image_bytes, cache_directory=self.directory)
+        cache.get_image_by_index(3)
+
+        # act
+        self.provider.offset = 100
+        image = cache.get_image_by_index(3)
+
+        # assert
+        self.assertEqual(103, image[0, 0, 0])
+        self.assertEqual(2, cache.misses)
+
+    def test_images_not_found_are_counted_as_misses(self):
+        # arrange
+        cache = CachedImagesProvider(self.provider, memory_bytes=10 * self.image_bytes)
+
+        # act
+        image = cache.get_image_by_index(20)
+
+        # assert
+        self.assertIsNone(image)
+        self.assertEqual(1, cache.misses)
+
+
+if __name__ == '__main__':
+    unittest.main()
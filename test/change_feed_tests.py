@@ -0,0 +1,118 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from galleries.annotations_parsers.file_name_parser import FileNameSepParser
+from galleries.change_feed import ChangeFeed
+from galleries.gallery import Gallery
+from galleries.images_providers.local_files_image_providers import LocalFilesImageProvider
+from galleries.sql.queries.data_retriever import SqlDataRetriever
+
+
+class GalleryChangesTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.images_directory = os.path.join(self.directory, "images")
+        os.makedirs(self.images_directory)
+        for name in ["a.jpg", "b.jpg", "c.jpg"]:
+            self._create_file(name)
+        self.change_feed = ChangeFeed(os.path.join(self.directory, "changes.db"))
+        self.gallery = Gallery(
+            "test", LocalFilesImageProvider(self.images_directory), FileNameSepParser(), change_feed=self.change_feed)
+
+    def tearDown(self) -> None:
+        self.change_feed.close()
+        shutil.rmtree(self.directory)
+
+    def _path(self, name):
+        return os.path.join(self.images_directory, name)
+
+    def _create_file(self, name):
+        open(self._path(name), "w").close()
+
+    def test_when_token_is_none__all_indices_are_added(self):
+        # act
+        changes = self.gallery.get_changes()
+
+        # assert
+        self.assertListEqual(sorted(self.gallery.get_indices()), sorted(changes.added))
+
+    def test_changes_since_token(self):
+        # arrange
+        token = self.gallery.get_changes().token
+        self._create_file("d.jpg")
+        os.remove(self._path("a.jpg"))
+        os.utime(self._path("b.jpg"), ns=(0, 0))
+
+        # act
+        changes = self.gallery.get_changes(token)
+        next_changes = self.gallery.get_changes(changes.token)
+
+        # assert
+        self.assertListEqual([self._path("d.jpg")], changes.added)
+        self.assertListEqual([self._path("a.jpg")], changes.removed)
+        self.assertListEqual([self._path("b.jpg")], changes.modified)
+        self.assertFalse(next_changes.has_changes)
+
+
+class ChangeFeedTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.change_feed = ChangeFeed(os.path.join(self.directory, "changes.db"))
+
+    def tearDown(self) -> None:
+        self.change_feed.close()
+        shutil.rmtree(self.directory)
+
+    def test_changes_are_bounded_by_the_returned_token(self):
+        # arrange
+        self.change_feed.synchronize([("a", 1), ("b", 1)])
+        token = self.change_feed.get_token()
+        self.change_feed.synchronize([("a", 1), ("b", 1), ("c", 1), ("d", 1)])
+        # changes logged after the token was read, as by a concurrent synchronize
+        self.change_feed.get_token = lambda: token + 1
+
+        # act
+        changes = self.change_feed.get_changes(token)
+
+        # assert
+        self.assertEqual(token + 1, changes.token)
+        self.assertListEqual(["c"], changes.added)
+
+
+class SqlChangeTrackingTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.connection = sqlite3.connect(":memory:")
+        self.cursor = self.connection.cursor()
+        self.cursor.execute("CREATE TABLE Images (path TEXT, label TEXT)")
+        self.cursor.executemany("INSERT INTO Images VALUES (?, ?)", [("a", "x"), ("b", "y")])
+        SqlDataRetriever.create_change_tracking(self.cursor, "Images", "path")
+
+    def tearDown(self) -> None:
+        self.connection.close()
+
+    def test_changes_are_tracked_by_triggers(self):
+        # arrange
+        token = SqlDataRetriever.get_changes_from_change_table(self.cursor, "Images", "path").token
+        self.cursor.execute("INSERT INTO Images VALUES ('c', 'z')")
+        self.cursor.execute("UPDATE Images SET label = 'w' WHERE path = 'a'")
+        self.cursor.execute("DELETE FROM Images WHERE path = 'b'")
+        self.cursor.execute("INSERT INTO Images VALUES ('d', 'z')")
+        self.cursor.execute("DELETE FROM Images WHERE path = 'd'")
+
+        # act
+        changes = SqlDataRetriever.get_changes_from_change_table(self.cursor, "Images", "path", token)
+
+        # assert
+        self.assertListEqual(["c"], changes.added)
+        self.assertListEqual(["b"], changes.removed)
+        self.assertListEqual(["a"], changes.modified)
+
+
+if __name__ == '__main__':
+    unittest.main()
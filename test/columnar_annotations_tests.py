@@ -0,0 +1,60 @@
+import random
+import unittest
+
+from galleries.annotations_filtering import ComparisonType
+from galleries.annotations_filtering.columnar import ColumnarAnnotations
+from galleries.annotations_filtering.filter import FilterStatement
+from galleries.annotations_filtering.utils import does_annotations_meets_filter
+
+
+class ColumnarAnnotationsTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        r = random.Random(0)
+        self.annotations = [
+            (i, {
+                "name": r.choice(["ana", "bob", "eva", "juan"]),
+                "age": r.randint(0, 90),
+                "score": r.random(),
+                "tags": r.sample(["a", "b", "c", "d"], 2),
+                "glasses": r.random() < 0.5,
+            })
+            for i in range(1000)
+        ]
+        self.columnar = ColumnarAnnotations.from_annotations(self.annotations)
+
+    def _assert_same_as_row_by_row(self, filters):
+        expected = [i for i, annotations in self.annotations if does_annotations_meets_filter(annotations, filters)]
+        self.assertListEqual(expected, self.columnar.filter_indices(filters))
+
+    def test_without_filters__all_indices_are_returned(self):
+        self._assert_same_as_row_by_row([])
+
+    def test_and_groups_are_the_same_as_row_by_row(self):
+        self._assert_same_as_row_by_row([[
+            FilterStatement("age", ComparisonType.GREATER, 30, False),
+            FilterStatement("score", ComparisonType.LESS, 0.5, False),
+            FilterStatement("name", ComparisonType.EQUAL, "eva", True),
+        ]])
+
+    def test_or_groups_are_the_same_as_row_by_row(self):
+        self._assert_same_as_row_by_row([
+            [FilterStatement("name", ComparisonType.CONTAINS, "an", False)],
+            [FilterStatement("tags", ComparisonType.CONTAINS, "d", False),
+             FilterStatement("glasses", ComparisonType.EQUAL, True, False)],
+            [FilterStatement("age", ComparisonType.LESS_EQUAL, 10, False)],
+        ])
+
+    def test_when_annotation_is_missing__statement_is_not_met(self):
+        # arrange
+        columnar = ColumnarAnnotations.from_annotations([(0, {"name": "ana"}), (1, {"age": 3})])
+
+        # act
+        indices = columnar.filter_indices([[FilterStatement("name", ComparisonType.EQUAL, "bob", True)]])
+
+        # assert
+        self.assertListEqual([0], indices)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from galleries.annotations_filtering import ComparisonType
+from galleries.annotations_filtering.filter import FilterStatement
+from galleries.annotations_index import AnnotationsIndex
+from galleries.annotations_parsers.file_name_parser import FileNameSepParser
+from galleries.gallery import Gallery
+from galleries.images_providers.local_files_image_providers import LocalFilesImageProvider
+from galleries.sql.queries.data_retriever import SqlDataRetriever
+from test.test_utils import NotParsingParser
+
+
+class GalleryCountTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        for name in ["ana-F.jpg", "bob-M.jpg", "eva-F.jpg", "notes.txt"]:
+            open(os.path.join(self.directory, name), "w").close()
+        self.filters = [[FilterStatement("sex", ComparisonType.EQUAL, "F", False)]]
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory)
+
+    def test_count_without_filters_does_not_parse_annotations(self):
+        # arrange
+        gallery = Gallery("test", LocalFilesImageProvider(self.directory), NotParsingParser(["name", "sex"]))
+
+        # act
+        count = gallery.count()
+
+        # assert
+        self.assertEqual(3, count)
+        self.assertEqual(3, len(gallery))
+
+    def test_count_with_filters(self):
+        # arrange
+        gallery = Gallery("test", LocalFilesImageProvider(self.directory), FileNameSepParser(["name", "sex"]))
+
+        # act
+        count = gallery.count(self.filters)
+
+        # assert
+        self.assertEqual(2, count)
+
+    def test_count_with_annotations_index(self):
+        # arrange
+        index = AnnotationsIndex(os.path.join(self.directory, "annotations.db"))
+        parser = FileNameSepParser(["name", "sex"])
+        gallery = Gallery("test", LocalFilesImageProvider(self.directory), parser, index)
+
+        # act
+        count = gallery.count()
+        filtered_count = gallery.count(self.filters)
+
+        # assert
+        self.assertEqual(3, count)
+        self.assertEqual(2, filtered_count)
+        index.close()
+
+    def test_empty_gallery_is_truthy(self):
+        # arrange
+        empty_directory = os.path.join(self.directory, "empty")
+        os.makedirs(empty_directory)
+        gallery = Gallery("test", LocalFilesImageProvider(empty_directory), FileNameSepParser())
+
+        # act
+        length = len(gallery)
+
+        # assert
+        self.assertEqual(0, length)
+        self.assertTrue(gallery)
+
+
+class SqlCountTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.connection = sqlite3.connect(":memory:")
+        self.cursor = self.connection.cursor()
+        self.cursor.execute("CREATE TABLE Images (path TEXT, sex TEXT, age INTEGER)")
+        self.cursor.executemany(
+            "INSERT INTO Images VALUES (?, ?, ?)",
+            [("a", "F", 20), ("b", "M", 30), ("c", "F", 40)]
+        )
+
+    def tearDown(self) -> None:
+        self.connection.close()
+
+    def _count_rows(self, filters):
+        return SqlDataRetriever.count_rows(
+            self.cursor, "Images", filters, {"sex": "sex", "age": "age"}, {"sex": str, "age": int}, None)
+
+    def test_count_rows_without_filters(self):
+        # act
+        count = self._count_rows(None)
+
+        # assert
+        self.assertEqual(3, count)
+
+    def test_count_rows_with_filters(self):
+        # arrange
+        filters = [
+            [FilterStatement("sex", ComparisonType.EQUAL, "F", False),
+             FilterStatement("age", ComparisonType.GREATER, 25, False)],
+            [FilterStatement("sex", ComparisonType.EQUAL, "M", False)],
+        ]
+
+        # act
+        count = self._count_rows(filters)
+
+        # assert
+        self.assertEqual(2, count)
+
+    def test_count_rows_with_contains_filters_twice(self):
+        # arrange
+        filters = [[FilterStatement("sex", ComparisonType.CONTAINS, "F", False)]]
+
+        # act
+        first_count = self._count_rows(filters)
+        second_count = self._count_rows(filters)
+
+        # assert
+        self.assertEqual(2, first_count)
+        self.assertEqual(2, second_count)
+        self.assertEqual("F", filters[0][0].filter_value)
+
+
+if __name__ == '__main__':
+    unittest.main()
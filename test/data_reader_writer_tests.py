@@ -1,12 +1,22 @@
 import abc
+import glob
 import os
+import pickle
+import sqlite3
 import unittest
 
-from galleries.data_read_write import PickleDataReaderWriter, SqliteDataReaderWriter
+import numpy as np
+
+from galleries.data_read_write import BlockCompressedDataReaderWriter, NumpyDataReaderWriter, PickleDataReaderWriter, \
+    ShardedDataReaderWriter, SqliteBulkWriteOptions, SqliteDataReaderWriter
+from galleries.data_read_write.block_compressed_data_reader_writer import get_block_index_path
 from galleries.data_read_write.idata_reader_writer import IDataReaderWriter
+from galleries.data_read_write.numpy_data_reader_writer import get_matrix_path
+from galleries.data_read_write.offset_index import get_offset_index_path
+from galleries.data_read_write.pickle_data_reader_writer import get_bloom_filter_path
 from test.test_utils import TestGallery
 
-from test.test_utils_data_reading_writing import write_data
+from test.test_utils_data_reading_writing import get_data, write_data
 
 
 class DataReaderWriterTests(unittest.TestCase):
@@ -18,8 +28,8 @@ class DataReaderWriterTests(unittest.TestCase):
 
     def tearDown(self) -> None:
         self.rw.release()
-        if os.path.exists(self.file_path):
-            os.remove(self.file_path)
+        for path in glob.glob(f"{self.file_path}*"):
+            os.remove(path)
 
     @abc.abstractmethod
     def _get_reader_writer(self, file_path):
@@ -63,18 +73,520 @@ class DataReaderWriterTests(unittest.TestCase):
             expected = self._get_data(img)
             self.assertEqual(expected, d)
 
+    def test_when_read_not_existent_indices__data_is_none(self):
+        # arrange
+        write_data(self.gallery, self._get_data, self.rw)
+        indices = [-1, 100, 1000]
+
+        # act
+        data = list(self.rw.read_data(indices))
+
+        # assert
+        self.assertEqual([(i, None) for i in indices], data)
+
+
+class ReadDataInSinglePassTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.records = [(i, str(i)) for i in range(10)]
+
+    def test_when_keep_order__results_are_in_indices_order(self):
+        # arrange
+        indices = [7, 2, 11, 5]
+
+        # act
+        data = list(IDataReaderWriter.read_data_in_single_pass(self.records, indices))
+
+        # assert
+        self.assertEqual([(7, "7"), (2, "2"), (11, None), (5, "5")], data)
+
+    def test_when_not_keep_order__results_are_in_records_order(self):
+        # arrange
+        indices = [7, 2, 11, 5]
+
+        # act
+        data = list(IDataReaderWriter.read_data_in_single_pass(self.records, indices, keep_order=False))
+
+        # assert
+        self.assertEqual([(2, "2"), (5, "5"), (7, "7"), (11, None)], data)
+
+    def test_when_index_is_repeated__last_occurrence_wins(self):
+        # arrange
+        records = self.records + [(2, "rewritten")]
+
+        # act
+        ordered = list(IDataReaderWriter.read_data_in_single_pass(records, [2, 5]))
+        unordered = list(IDataReaderWriter.read_data_in_single_pass(records, [2, 5], keep_order=False))
+
+        # assert
+        self.assertEqual([(2, "rewritten"), (5, "5")], ordered)
+        self.assertEqual([(2, "rewritten"), (5, "5")], unordered)
+
 
 class PickleDataReaderWriterTests(DataReaderWriterTests):
 
     def _get_reader_writer(self, file_path):
         return PickleDataReaderWriter(None, "", file_path, 100)
 
+    def test_when_key_was_not_written__may_contain_returns_false(self):
+        # arrange
+        write_data(self.gallery, self._get_data, self.rw)
+        self.rw = self._get_reader_writer(self.file_path)
+
+        # act
+        written = [self.rw.may_contain(i) for i in range(100)]
+        not_written = [self.rw.may_contain(i) for i in range(1000, 1100)]
+
+        # assert
+        self.assertTrue(all(written))
+        self.assertLess(sum(not_written), 10)
+
+    def test_when_offset_index_is_missing__read_indices_rebuilds_it(self):
+        # arrange
+        write_data(self.gallery, self._get_data, self.rw)
+        os.remove(get_offset_index_path(self.file_path))
+        self.rw = self._get_reader_writer(self.file_path)
+        indices = [70, 3, 99, 0]
+
+        # act
+        data = list(self.rw.read_data(indices))
+
+        # assert
+        self.assertTrue(os.path.exists(get_offset_index_path(self.file_path)))
+        for i, d in data:
+            img = self.gallery.get_image_by_index(i)
+            expected = self._get_data(img)
+            self.assertEqual(expected, d)
+
+    def test_when_write_data_twice__read_indices_of_both_writes(self):
+        # arrange
+        first_gallery = TestGallery("Test", 50)
+        write_data(first_gallery, self._get_data, self.rw)
+        write_data(self.gallery, self._get_data, self.rw)
+        indices = [10, 75]
+
+        # act
+        data = list(self.rw.read_data(indices))
+
+        # assert
+        for i, d in data:
+            img = self.gallery.get_image_by_index(i)
+            expected = self._get_data(img)
+            self.assertEqual(expected, d)
+
+    def test_when_data_file_ends_in_partial_record__reads_do_not_grow_offset_index(self):
+        # arrange
+        write_data(self.gallery, self._get_data, self.rw)
+        with open(self.file_path, 'ab') as file:
+            file.write(pickle.dumps((1000, 'partial'))[:-4])
+        self.rw = self._get_reader_writer(self.file_path)
+        self.rw.contains(3)
+        index_size = os.path.getsize(get_offset_index_path(self.file_path))
+
+        # act
+        contained = [self.rw.contains(i) for i in [3, 1000]]
+        data = list(self.rw.read_data([3, 1000]))
+
+        # assert
+        self.assertListEqual([True, False], contained)
+        self.assertIsNone(data[1][1])
+        self.assertEqual(index_size, os.path.getsize(get_offset_index_path(self.file_path)))
+
+    def test_when_write_data_twice__sidecars_are_appended_to(self):
+        # arrange
+        first_gallery = TestGallery("Test", 50)
+        write_data(first_gallery, self._get_data, self.rw)
+        sidecar_paths = [get_offset_index_path(self.file_path), get_bloom_filter_path(self.file_path)]
+        first_sidecars = []
+        for path in sidecar_paths:
+            with open(path, 'rb') as file:
+                first_sidecars.append(file.read())
+
+        # act
+        write_data(self.gallery, self._get_data, self.rw)
+
+        # assert
+        for path, first_sidecar in zip(sidecar_paths, first_sidecars):
+            with open(path, 'rb') as file:
+                sidecar = file.read()
+            self.assertGreater(len(sidecar), len(first_sidecar))
+            self.assertEqual(first_sidecar, sidecar[:len(first_sidecar)])
+        self.rw = self._get_reader_writer(self.file_path)
+        self.assertTrue(all(self.rw.contains(i) for i in range(100)))
+        self.assertTrue(all(d is not None for _, d in self.rw.read_data(range(100))))
+
 
 class SqliteDataReaderWriterTests(DataReaderWriterTests):
 
     def _get_reader_writer(self, file_path):
         return SqliteDataReaderWriter(None, "", file_path, 100)
 
+    def _write_legacy_data(self):
+        connection = sqlite3.connect(self.file_path)
+        connection.execute("CREATE TABLE Data (data BLOB)")
+        for i, d in get_data(self.gallery, self._get_data):
+            connection.execute("INSERT INTO Data (data) VALUES(?)", [pickle.dumps((i, d))])
+        connection.commit()
+        connection.close()
+
+    def test_when_read_indices_from_legacy_table__data_is_correct(self):
+        # arrange
+        self._write_legacy_data()
+        indices = [70, 3, 99, 1000, 0]
+
+        # act
+        data = list(self.rw.read_data(indices))
+
+        # assert
+        self.assertEqual(indices, [i for i, _ in data])
+        self.assertIsNone(data[3][1])
+        for i, d in data[:3] + data[4:]:
+            img = self.gallery.get_image_by_index(i)
+            expected = self._get_data(img)
+            self.assertEqual(expected, d)
+
+    def test_when_write_data_to_legacy_table__read_old_and_new_data(self):
+        # arrange
+        self._write_legacy_data()
+        new_gallery = TestGallery("Test", 150)
+        new_data = ((i, d) for i, d in get_data(new_gallery, self._get_data) if i >= 100)
+
+        # act
+        self.rw.write_data(new_data)
+        data = list(self.rw.read_data([10, 120]))
+
+        # assert
+        for i, d in data:
+            img = new_gallery.get_image_by_index(i)
+            expected = self._get_data(img)
+            self.assertEqual(expected, d)
+
+    def test_when_file_does_not_exist__may_contain_returns_false_without_creating_it(self):
+        # arrange
+        path = f"{self.file_path}.missing"
+
+        # act
+        contained = self._get_reader_writer(path).may_contain(3)
+
+        # assert
+        self.assertFalse(contained)
+        self.assertFalse(os.path.exists(path))
+
+    def test_array_columns_are_read_as_writable_arrays(self):
+        # arrange
+        connection = sqlite3.connect(":memory:", detect_types=sqlite3.PARSE_DECLTYPES)
+        connection.execute("CREATE TABLE Arrays (value array)")
+        connection.execute("INSERT INTO Arrays (value) VALUES(?)", [np.arange(3)])
+
+        # act
+        array, = connection.execute("SELECT value FROM Arrays").fetchone()
+        array[0] = 5
+        connection.close()
+
+        # assert
+        self.assertListEqual([5, 1, 2], array.tolist())
+
+
+class SqliteBulkDataReaderWriterTests(SqliteDataReaderWriterTests):
+
+    def _get_reader_writer(self, file_path):
+        options = SqliteBulkWriteOptions(batch_size=7, commit_rows=30, defer_index=True)
+        return SqliteDataReaderWriter(None, "", file_path, 100, bulk_options=options)
+
+    def test_when_write_repeated_keys_with_deferred_index__read_last_written(self):
+        # arrange
+        write_data(self.gallery, self._get_data, self.rw)
+
+        # act
+        self.rw.write_data([(5, "new value")])
+        data = list(self.rw.read_data([5]))
+
+        # assert
+        self.assertEqual([(5, "new value")], data)
+
+
+class OutOfBandPickleDataReaderWriterTests(PickleDataReaderWriterTests):
+
+    def _get_reader_writer(self, file_path):
+        return PickleDataReaderWriter(None, "", file_path, 100, out_of_band_buffers=True)
+
+    def test_when_read_indices__arrays_are_views_over_the_file(self):
+        # arrange
+        write_data(self.gallery, lambda img: {"features": img.ravel()}, self.rw)
+
+        # act
+        (i, d), = self.rw.read_data([42])
+
+        # assert
+        expected = self.gallery.get_image_by_index(i).ravel()
+        self.assertTrue(np.array_equal(expected, d["features"]))
+        self.assertFalse(d["features"].flags.owndata)
+        self.assertFalse(d["features"].flags.writeable)
+
+
+class OutOfBandSqliteDataReaderWriterTests(SqliteDataReaderWriterTests):
+
+    def _get_reader_writer(self, file_path):
+        return SqliteDataReaderWriter(None, "", file_path, 100, out_of_band_buffers=True)
+
+    def test_when_read_indices__arrays_are_views_over_the_blobs(self):
+        # arrange
+        write_data(self.gallery, lambda img: {"features": img.ravel()}, self.rw)
+
+        # act
+        (i, d), = self.rw.read_data([42])
+
+        # assert
+        expected = self.gallery.get_image_by_index(i).ravel()
+        self.assertTrue(np.array_equal(expected, d["features"]))
+        self.assertFalse(d["features"].flags.owndata)
+
+
+class BlockCompressedDataReaderWriterTests(DataReaderWriterTests):
+
+    def _get_reader_writer(self, file_path):
+        return BlockCompressedDataReaderWriter(None, "", file_path, block_size=256, decompression_workers=3)
+
+    def test_when_block_index_is_missing__read_indices_rebuilds_it(self):
+        # arrange
+        write_data(self.gallery, self._get_data, self.rw)
+        os.remove(get_block_index_path(self.file_path))
+        self.rw = self._get_reader_writer(self.file_path)
+        indices = [70, 3, 99, 0]
+
+        # act
+        data = list(self.rw.read_data(indices, keep_order=False))
+
+        # assert
+        self.assertEqual(sorted(indices), [i for i, _ in data])
+        for i, d in data:
+            img = self.gallery.get_image_by_index(i)
+            expected = self._get_data(img)
+            self.assertEqual(expected, d)
+
+    def test_when_write_data_twice__block_index_is_appended_to(self):
+        # arrange
+        write_data(TestGallery("Test", 50), self._get_data, self.rw)
+        with open(get_block_index_path(self.file_path), 'rb') as file:
+            first_index = file.read()
+
+        # act
+        write_data(self.gallery, self._get_data, self.rw)
+
+        # assert
+        with open(get_block_index_path(self.file_path), 'rb') as file:
+            index = file.read()
+        self.assertGreater(len(index), len(first_index))
+        self.assertEqual(first_index, index[:len(first_index)])
+        self.rw = self._get_reader_writer(self.file_path)
+        data = list(self.rw.read_data([10, 75]))
+        for i, d in data:
+            img = self.gallery.get_image_by_index(i)
+            expected = self._get_data(img)
+            self.assertEqual(expected, d)
+
+    def test_when_write_data__file_is_smaller_than_uncompressed_data(self):
+        # arrange
+        uncompressed_path = f"{self.file_path}.uncompressed"
+        uncompressed_rw = PickleDataReaderWriter(None, "", uncompressed_path)
+
+        # act
+        write_data(self.gallery, self._get_data, self.rw)
+        write_data(self.gallery, self._get_data, uncompressed_rw)
+
+        # assert
+        self.assertLess(os.path.getsize(self.file_path), os.path.getsize(uncompressed_path))
+
+    def test_when_use_lzma__read_the_same(self):
+        # arrange
+        self.rw = BlockCompressedDataReaderWriter(None, "", self.file_path, compression='lzma', block_size=256)
+        write_data(self.gallery, self._get_data, self.rw)
+
+        # act
+        data = list(self.rw.read_all_data())
+
+        # assert
+        self.assertEqual(100, len(data))
+        for i, d in data:
+            img = self.gallery.get_image_by_index(i)
+            expected = self._get_data(img)
+            self.assertEqual(expected, d)
+
+
+class ShardedDataReaderWriterTests(DataReaderWriterTests):
+
+    def _get_reader_writer(self, file_path, shard_id="worker0"):
+        return ShardedDataReaderWriter(None, "", file_path, shard_id=shard_id)
+
+    def tearDown(self) -> None:
+        self.rw.clear_data()
+        super().tearDown()
+
+    def _write_data_in_two_shards(self):
+        data = list(get_data(self.gallery, self._get_data))
+        other_rw = self._get_reader_writer(self.file_path, "worker1")
+        self.rw.write_data(data[::2])
+        other_rw.write_data(data[1::2])
+
+    def test_when_write_data_from_two_writers__read_all_data(self):
+        # arrange
+        self._write_data_in_two_shards()
+
+        # act
+        data = dict(self.rw.read_all_data())
+
+        # assert
+        self.assertEqual(2, len(self.rw.read_shards_list()))
+        self.assertEqual(list(range(100)), sorted(data.keys()))
+        for i, d in data.items():
+            img = self.gallery.get_image_by_index(i)
+            expected = self._get_data(img)
+            self.assertEqual(expected, d)
+
+    def test_when_merge_shards__data_is_in_a_single_file(self):
+        # arrange
+        self._write_data_in_two_shards()
+
+        # act
+        self.rw.merge_shards()
+        data = list(self.rw.read_data([3, 98, 1000]))
+
+        # assert
+        self.assertEqual(0, len(self.rw.read_shards_list()))
+        self.assertEqual(100, len(list(PickleDataReaderWriter(None, "", self.file_path).read_all_data())))
+        self.assertEqual(self._get_data(self.gallery.get_image_by_index(3)), data[0][1])
+        self.assertEqual(self._get_data(self.gallery.get_image_by_index(98)), data[1][1])
+        self.assertIsNone(data[2][1])
+
+    def test_when_later_registered_shard_writes_key__it_wins_in_all_reads(self):
+        # arrange
+        newer_rw = self._get_reader_writer(self.file_path, "worker1")
+        self.rw.write_data([(1, 'old'), (2, 'kept')])
+        newer_rw.write_data([(1, None)])
+
+        # act
+        data = list(self.rw.read_data([1, 2]))
+        all_data = list(self.rw.read_all_data())
+
+        # assert
+        self.assertListEqual([(1, None), (2, 'kept')], data)
+        self.assertListEqual([(1, None), (2, 'kept')], all_data)
+
+    def test_when_earlier_registered_shard_writes_key_again__later_registered_shard_wins(self):
+        # arrange
+        newer_rw = self._get_reader_writer(self.file_path, "worker1")
+        self.rw.write_data([(1, 'first')])
+        newer_rw.write_data([(1, 'registered last')])
+        self.rw.write_data([(1, 'written last')])
+
+        # act
+        data = list(self.rw.read_data([1]))
+        all_data = list(self.rw.read_all_data())
+
+        # assert
+        self.assertListEqual([(1, 'registered last')], data)
+        self.assertListEqual([(1, 'registered last')], all_data)
+
+    def test_shards_are_registered_with_marker_files(self):
+        # act
+        self._write_data_in_two_shards()
+
+        # assert
+        self.assertListEqual(["file.worker0.pkl", "file.worker1.pkl"], sorted(os.listdir(self.rw.shards_directory)))
+
+
+class NumpyDataReaderWriterTests(DataReaderWriterTests):
+
+    def _get_reader_writer(self, file_path):
+        return NumpyDataReaderWriter(None, "", file_path, initial_capacity=8)
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        matrix_path = get_matrix_path(self.file_path)
+        if os.path.exists(matrix_path):
+            os.remove(matrix_path)
+
+    def _get_data(self, img):
+        return img[0, 0].astype(np.float32)
+
+    def test_when_write_data__read_all_as_array_returns_matrix_in_write_order(self):
+        # arrange
+        write_data(self.gallery, self._get_data, self.rw)
+
+        # act
+        keys, matrix = self.rw.read_all_as_array()
+
+        # assert
+        self.assertEqual(list(range(100)), keys)
+        self.assertEqual((100, 3), matrix.shape)
+        for i in keys:
+            expected = self._get_data(self.gallery.get_image_by_index(i))
+            self.assertTrue(np.array_equal(expected, matrix[i]))
+
+    def test_when_write_data_with_wrong_shape__raises_exception(self):
+        # arrange
+        write_data(self.gallery, self._get_data, self.rw)
+
+        # act and assert
+        self.assertRaises(ValueError, self.rw.write_data, [(100, np.zeros(5, dtype=np.float32))])
+
+    def test_when_read_data__values_are_views_of_the_matrix(self):
+        # arrange
+        write_data(self.gallery, self._get_data, self.rw)
+
+        # act
+        _, data = next(self.rw.read_data([3]))
+
+        # assert
+        self.assertIsInstance(data.base, np.memmap)
+
+    def test_when_read_indices__data_is_correct(self):
+        # arrange
+        write_data(self.gallery, self._get_data, self.rw)
+        indices = (i for i in range(45, 65))  # arbitrary range
+
+        # act
+        data = self.rw.read_data(indices)
+
+        # assert
+        for i, d in data:
+            img = self.gallery.get_image_by_index(i)
+            expected = self._get_data(img)
+            self.assertTrue(np.array_equal(expected, d))
+
+    def test_when_write_data__read_the_same(self):
+        # arrange
+        write_data(self.gallery, self._get_data, self.rw)
+
+        # act
+        data = self.rw.read_all_data()
+
+        # assert
+        for i, d in data:
+            img = self.gallery.get_image_by_index(i)
+            expected = self._get_data(img)
+            self.assertTrue(np.array_equal(expected, d))
+
+    def test_when_keys_file_ends_in_partial_record__it_is_ignored_and_new_keys_are_readable(self):
+        # arrange
+        write_data(self.gallery, self._get_data, self.rw)
+        with open(self.file_path, "ab") as file:
+            file.write(pickle.dumps([1000, 1001])[:-3])
+        self.rw = self._get_reader_writer(self.file_path)
+        value = np.ones(3, dtype=np.float32)
+
+        # act
+        keys_before, _ = self.rw.read_all_as_array()
+        self.rw.write_data([(1000, value)])
+        self.rw = self._get_reader_writer(self.file_path)
+        keys_after, _ = self.rw.read_all_as_array()
+        _, data = next(self.rw.read_data([1000]))
+
+        # assert
+        self.assertEqual(list(range(100)), keys_before)
+        self.assertEqual(list(range(100)) + [1000], keys_after)
+        self.assertTrue(np.array_equal(value, data))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import cv2 as cv
+import numpy as np
+
+from galleries.images_providers.decode_options import DecodeOptions, get_reduction_factor, read_image
+from galleries.images_providers.image_headers import JPEG, PNG, read_image_header
+from test.test_utils import write_jpeg_with_orientation
+
+
+class DecodeOptionsTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        image = np.zeros((480, 640, 3), dtype=np.uint8)
+        cv.circle(image, (320, 240), 100, (255, 128, 0), -1)
+        self.jpeg_path = os.path.join(self.directory, "image.jpg")
+        self.png_path = os.path.join(self.directory, "image.png")
+        cv.imwrite(self.jpeg_path, image)
+        cv.imwrite(self.png_path, image)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory)
+
+    def test_read_image_header(self):
+        # act
+        jpeg_header = read_image_header(self.jpeg_path)
+        png_header = read_image_header(self.png_path)
+
+        # assert
+        self.assertEqual((JPEG, 640, 480), (jpeg_header.format, jpeg_header.width, jpeg_header.height))
+        self.assertEqual((PNG, 640, 480), (png_header.format, png_header.width, png_header.height))
+
+    def test_read_image_header_of_rotated_jpeg(self):
+        # arrange
+        path = os.path.join(self.directory, "rotated.jpg")
+        write_jpeg_with_orientation(path, np.zeros((480, 640, 3), dtype=np.uint8), 6)
+
+        # act
+        header = read_image_header(path)
+
+        # assert
+        self.assertEqual((640, 480, 6), (header.width, header.height, header.orientation))
+        self.assertEqual((480, 640), header.get_oriented_size())
+
+    def test_rotated_jpeg_is_not_reduced_below_target_size(self):
+        # arrange
+        path = os.path.join(self.directory, "rotated.jpg")
+        stripes = np.zeros((400, 1200, 3), dtype=np.uint8)
+        stripes[::4] = 255
+        stripes[1::4] = 255
+        write_jpeg_with_orientation(path, stripes, 6)
+        expected = cv.resize(cv.imread(path), (300, 900), interpolation=cv.INTER_AREA)
+
+        # act
+        image = read_image(path, DecodeOptions(size=(300, None)))
+
+        # assert
+        self.assertTupleEqual((900, 300, 3), image.shape)
+        self.assertLess(np.abs(image.astype(int) - expected.astype(int)).mean(), 4)
+
+    def test_reduction_factor_does_not_decode_smaller_than_target(self):
+        self.assertEqual(4, get_reduction_factor(640, 480, 112, 112))
+        self.assertEqual(2, get_reduction_factor(640, 480, 224, 224))
+        self.assertEqual(1, get_reduction_factor(640, 480, 400, 300))
+
+    def test_when_size_is_given__images_have_that_size(self):
+        for path in [self.jpeg_path, self.png_path]:
+            # act
+            image = read_image(path, DecodeOptions(size=(112, 100)))
+
+            # assert
+            self.assertTupleEqual((100, 112, 3), image.shape)
+
+    def test_when_one_side_is_none__aspect_ratio_is_kept(self):
+        # act
+        image = read_image(self.jpeg_path, DecodeOptions(size=(None, 120), grayscale=True))
+
+        # assert
+        self.assertTupleEqual((120, 160), image.shape)
+
+    def test_reduced_decoding_is_similar_to_full_decoding(self):
+        # arrange
+        options = DecodeOptions(scale=0.25)
+        expected = cv.resize(cv.imread(self.jpeg_path), (160, 120), interpolation=cv.INTER_AREA)
+
+        # act
+        image = read_image(self.jpeg_path, options)
+
+        # assert
+        self.assertLess(np.abs(image.astype(int) - expected.astype(int)).mean(), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,4 @@
+import glob
 import os
 import unittest
 
@@ -18,8 +19,8 @@ class FileStreamDictionaryTests(unittest.TestCase):
 
     def tearDown(self) -> None:
         self.fsd.close()
-        if os.path.exists(self.file_path):
-            os.remove(self.file_path)
+        for path in glob.glob(f"{self.file_path}*"):
+            os.remove(path)
 
     def _write_test_data(self):
         data = self.test_data.items()
@@ -127,12 +128,24 @@ class FileStreamDictionaryTests(unittest.TestCase):
         # act
         self.fsd.push_data(new_index, new_value)
         self.fsd.close()
-        self.fsd = FileStreamDictionary(self.file_path, self.batch_size)
+        rw = PickleDataReaderWriter(None, "", self.file_path)
+        self.fsd = FileStreamDictionary(self.file_path, self.batch_size, data_reader_writer=rw)
 
         # assert
         v = self.fsd[new_index]
         self.assertTrue(v == new_value)
 
+    def test_without_reader_writer__file_path_is_used(self):
+        # arrange
+        self.fsd.close()
+        self.fsd = FileStreamDictionary(self.file_path, self.batch_size)
+
+        # act
+        value = self.fsd[7]
+
+        # assert
+        self.assertEqual("7", value)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from galleries import files_utils
+
+
+def walk_files(base_path, recursive=True):
+    paths = []
+    for root, _, filenames in os.walk(base_path):
+        paths.extend(os.path.join(root, filename) for filename in filenames)
+        if not recursive:
+            break
+    return paths
+
+
+class DirectoryScannerTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        for folder in ["a", "a/b", "c"]:
+            os.makedirs(os.path.join(self.directory, folder))
+        for file in ["1.jpg", "2.txt", "a/3.png", "a/b/4.jpg", "c/5.JPG"]:
+            self._create_file(file)
+        self.snapshot_path = os.path.join(self.directory, "snapshot.pkl")
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory)
+
+    def _create_file(self, name):
+        open(os.path.join(self.directory, name), "w").close()
+
+    def test_files_are_the_same_as_os_walk(self):
+        for recursive in [True, False]:
+            # act
+            files = list(files_utils.list_files(self.directory, recursive=recursive))
+
+            # assert
+            self.assertListEqual(walk_files(self.directory, recursive), files)
+
+    def test_images_are_filtered_by_extension(self):
+        # act
+        images = sorted(os.path.relpath(path, self.directory) for path in files_utils.list_images(self.directory))
+
+        # assert
+        self.assertListEqual(sorted(["1.jpg", "a/3.png", "a/b/4.jpg", "c/5.JPG"]), images)
+
+    def test_rescan_with_persisted_snapshot_sees_changes(self):
+        # arrange
+        images_directory = os.path.join(self.directory, "a")
+        files_utils.DirectoryScanner(self.snapshot_path).scan(images_directory)
+        self._create_file("a/b/6.jpg")
+        shutil.rmtree(os.path.join(self.directory, "a/b"))
+        os.makedirs(os.path.join(self.directory, "a/d"))
+        self._create_file("a/d/7.jpg")
+
+        # act
+        files = files_utils.DirectoryScanner(self.snapshot_path).scan(images_directory)
+
+        # assert
+        self.assertListEqual(walk_files(images_directory), files)
+
+    def test_unchanged_directories_are_not_listed_again(self):
+        # arrange
+        scanner = files_utils.DirectoryScanner()
+        scanner.scan(self.directory)
+        snapshot = scanner._get_snapshot()
+        _, files, subdirectories = snapshot[self.directory]
+        # a trusted modification time and a file that only exists in the snapshot
+        snapshot[self.directory] = (os.stat(self.directory).st_mtime_ns, files + ["phantom.jpg"], subdirectories)
+
+        # act
+        rescanned = scanner.scan(self.directory)
+
+        # assert
+        self.assertIn("phantom.jpg", rescanned)
+
+if __name__ == '__main__':
+    unittest.main()
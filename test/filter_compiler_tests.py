@@ -0,0 +1,70 @@
+import itertools
+import random
+import unittest
+
+from galleries.annotations_filtering import ComparisonType
+from galleries.annotations_filtering.filter import FilterStatement
+from galleries.annotations_filtering.utils import compile_filters, does_annotations_meets_filter, estimate_selectivity
+
+
+class FilterCompilerTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        r = random.Random(0)
+        self.annotations = [
+            {
+                "name": r.choice(["ana", "bob", "eva", "juan"]),
+                "age": r.randint(0, 90),
+                "tags": r.sample(["a", "b", "c", "d"], 2),
+            }
+            for _ in range(500)
+        ]
+        self.statements = [
+            FilterStatement("name", ComparisonType.EQUAL, "eva", False),
+            FilterStatement("name", ComparisonType.NOTEQUAL, "bob", True),
+            FilterStatement("name", ComparisonType.CONTAINS, "an", False),
+            FilterStatement("age", ComparisonType.GREATER_EQUAL, 30, False),
+            FilterStatement("age", ComparisonType.LESS, 60, True),
+            FilterStatement("tags", ComparisonType.CONTAINS, "c", False),
+        ]
+
+    def test_compiled_predicate_is_the_same_as_row_by_row(self):
+        for first, second, third in itertools.combinations(self.statements, 3):
+            # arrange
+            filters = [[first, second], [third]]
+
+            # act
+            predicate = compile_filters(filters, annotations_sample=self.annotations[:50])
+
+            # assert
+            for annotations in self.annotations:
+                self.assertEqual(does_annotations_meets_filter(annotations, filters), predicate(annotations))
+
+    def test_when_statement_fails__next_statements_are_not_evaluated(self):
+        # arrange
+        filters = [[
+            FilterStatement("missing", ComparisonType.EQUAL, 1, False),
+            FilterStatement("name", ComparisonType.EQUAL, "ana", False),
+        ]]
+        discrete_values = {"name": ["ana", "bob", "eva", "juan", "luis", "pepe", "sara", "zoe", "ivan", "raul", "rosa"]}
+
+        # act
+        predicate = compile_filters(filters, discrete_values=discrete_values)
+
+        # assert
+        self.assertFalse(predicate({"name": "bob"}))
+
+    def test_selectivity_from_sample(self):
+        # arrange
+        statement = FilterStatement("age", ComparisonType.LESS, 50, False)
+        sample = [{"age": age} for age in range(100)]
+
+        # act
+        selectivity = estimate_selectivity(statement, annotations_sample=sample)
+
+        # assert
+        self.assertAlmostEqual(0.5, selectivity)
+
+
+if __name__ == '__main__':
+    unittest.main()
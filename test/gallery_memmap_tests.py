@@ -0,0 +1,79 @@
+import shutil
+import tempfile
+import unittest
+from typing import List
+
+import numpy as np
+
+from galleries.annotations_filtering import ComparisonType
+from galleries.annotations_filtering.filter import FilterStatement
+from galleries.gallery_memmap import GalleryMemmap
+from galleries.igallery import IGallery
+from test.test_utils import TestGallery
+
+
+class AnnotatedTestGallery(TestGallery):
+
+    def get_indices(self, filters: List[List[FilterStatement]] = None):
+        for index in range(self._cant_images):
+            if filters is None or self.get_filter_predicate(filters)(self.get_annotations_by_index(index)):
+                yield index
+
+    def get_annotations_by_index(self, img_index) -> dict:
+        return {"even": img_index % 2 == 0, "index": img_index}
+
+
+class GalleryMemmapTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.source = AnnotatedTestGallery(cant_images=30)
+        self.gallery = GalleryMemmap.from_gallery(self.source, self.directory, (8, 8, 3))
+
+    def tearDown(self) -> None:
+        del self.gallery
+        shutil.rmtree(self.directory)
+
+    def test_images_and_annotations_are_the_same_as_source(self):
+        for index in self.source.get_indices():
+            np.testing.assert_array_equal(self.source.get_image_by_index(index), self.gallery.get_image_by_index(index))
+            self.assertDictEqual(
+                self.source.get_annotations_by_index(index), self.gallery.get_annotations_by_index(index))
+
+    def test_batch_is_fancy_indexed(self):
+        # arrange
+        indices = [5, 1, 7]
+
+        # act
+        batch = self.gallery.get_images_batch(indices)
+
+        # assert
+        self.assertTupleEqual((3, 8, 8, 3), batch.shape)
+        np.testing.assert_array_equal(np.stack(list(self.source.get_images_by_indices(indices))), batch)
+
+    def test_filters(self):
+        # arrange
+        filters = [[FilterStatement("even", ComparisonType.EQUAL, True, False),
+                    FilterStatement("index", ComparisonType.LESS, 10, False)]]
+
+        # act
+        indices = list(self.gallery.get_indices(filters))
+
+        # assert
+        self.assertListEqual([0, 2, 4, 6, 8], indices)
+
+    def test_when_gallery_is_serialized__it_is_loaded_from_directory(self):
+        # arrange
+        file_path = f"{self.directory}/gallery.json"
+
+        # act
+        IGallery.write_gallery(self.gallery, file_path, nice_format=True)
+        gallery = IGallery.read_gallery(file_path, nice_format=True)
+
+        # assert
+        self.assertEqual(30, len(gallery))
+        np.testing.assert_array_equal(self.gallery.get_image_by_index(3), gallery.get_image_by_index(3))
+
+
+if __name__ == '__main__':
+    unittest.main()
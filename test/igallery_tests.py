@@ -0,0 +1,40 @@
+import unittest
+
+import numpy as np
+
+from test.test_utils import TestGallery
+
+
+class IGalleryParallelLoadingTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.gallery = TestGallery(cant_images=200)
+
+    def test_parallel_images_are_in_the_same_order_as_serial(self):
+        # arrange
+        expected = list(self.gallery.get_images())
+
+        # act
+        images = list(self.gallery.get_images(workers=4, prefetch=3))
+
+        # assert
+        self.assertEqual(len(expected), len(images))
+        for expected_image, image in zip(expected, images):
+            np.testing.assert_array_equal(expected_image, image)
+
+    def test_parallel_images_and_annotations_by_indices_are_in_the_same_order_as_serial(self):
+        # arrange
+        indices = list(reversed(range(50)))
+        expected = list(self.gallery.get_images_and_annotations_by_indices(indices))
+
+        # act
+        results = list(self.gallery.get_images_and_annotations_by_indices(indices, workers=4))
+
+        # assert
+        for (expected_image, expected_annots), (image, annots) in zip(expected, results):
+            np.testing.assert_array_equal(expected_image, image)
+            self.assertDictEqual(expected_annots, annots)
+
+
+if __name__ == '__main__':
+    unittest.main()
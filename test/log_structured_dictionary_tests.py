@@ -0,0 +1,132 @@
+import os
+import shutil
+import unittest
+
+from galleries.collections.log_structured_dictionary import LogStructuredDictionary
+
+
+class LogStructuredDictionaryTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = "lsd_test"
+        self.segment_size = 512
+        self.test_data_size = 100
+        self.test_data = {k: str(k) for k in range(self.test_data_size)}
+        self.lsd = self._open()
+        for k, v in self.test_data.items():
+            self.lsd.push_data(k, v)
+
+    def tearDown(self) -> None:
+        self.lsd.close()
+        if os.path.exists(self.directory):
+            shutil.rmtree(self.directory)
+
+    def _open(self, compaction_threshold=None):
+        return LogStructuredDictionary(
+            self.directory,
+            segment_size=self.segment_size,
+            compaction_threshold=compaction_threshold,
+            background_compaction=False
+        )
+
+    def test_read_all_data(self):
+        # act and assert
+        for i in range(self.test_data_size):
+            self.assertEqual(str(i), self.lsd[i])
+
+    def test_data_is_split_in_segments(self):
+        # act and assert
+        self.assertGreater(self.lsd.segments_count, 1)
+
+    def test_get_item_doesnt_exists_raises_exception(self):
+        # arrange
+        s = self.test_data_size
+        not_existent_indices = [-1, s, s + 1, s * 2]
+
+        # act and assert
+        for i in not_existent_indices:
+            self.assertRaises(KeyError, self.lsd.__getitem__, i)
+
+    def test_push_existent_key_overrides_value(self):
+        # act
+        self.lsd.push_data(5, "new value")
+
+        # assert
+        self.assertEqual("new value", self.lsd[5])
+        self.assertEqual(self.test_data_size, len(self.lsd))
+
+    def test_read_all_data_as_iterator(self):
+        # act
+        data = dict(self.lsd)
+
+        # assert
+        self.assertEqual(self.test_data, data)
+
+    def test_read_data_raises_exception_after_closing(self):
+        # act
+        self.lsd.close()
+
+        # assert
+        self.assertRaises(IOError, self.lsd.__getitem__, 0)
+
+    def test_pushed_data_persists_after_closing(self):
+        # arrange
+        self.lsd.push_data(5, "new value")
+
+        # act
+        self.lsd.close()
+        self.lsd = self._open()
+
+        # assert
+        self.assertEqual("new value", self.lsd[5])
+        self.assertEqual(str(6), self.lsd[6])
+        self.assertEqual(self.test_data_size, len(self.lsd))
+
+    def test_compaction_drops_superseded_values(self):
+        # arrange
+        for k in self.test_data.keys():
+            self.lsd.push_data(k, f"new {k}")
+        size_before = sum(os.path.getsize(os.path.join(self.directory, f)) for f in os.listdir(self.directory))
+
+        # act
+        self.lsd.compact()
+
+        # assert
+        size_after = sum(os.path.getsize(os.path.join(self.directory, f)) for f in os.listdir(self.directory))
+        self.assertLess(size_after, size_before)
+        for k in self.test_data.keys():
+            self.assertEqual(f"new {k}", self.lsd[k])
+
+    def test_compacted_data_persists_after_closing(self):
+        # arrange
+        for k in self.test_data.keys():
+            self.lsd.push_data(k, f"new {k}")
+        self.lsd.compact()
+
+        # act
+        self.lsd.close()
+        self.lsd = self._open()
+
+        # assert
+        for k in self.test_data.keys():
+            self.assertEqual(f"new {k}", self.lsd[k])
+
+    def test_automatic_compaction_keeps_segments_bounded(self):
+        # arrange
+        self.lsd.close()
+        self.lsd = self._open(compaction_threshold=3)
+
+        # act
+        for _ in range(5):
+            for k in self.test_data.keys():
+                self.lsd.push_data(k, f"new {k}")
+
+        # assert
+        self.assertLessEqual(self.lsd.segments_count, 4)
+        self.assertEqual(self.test_data_size, len(self.lsd))
+        for k in self.test_data.keys():
+            self.assertEqual(f"new {k}", self.lsd[k])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import cv2 as cv
+import numpy as np
+
+from galleries.annotations_parsers.file_name_parser import FileNameSepParser
+from galleries.gallery import Gallery
+from galleries.images_providers.decode_options import DecodeOptions
+from galleries.images_providers.local_files_image_providers import LocalFilesImageProvider
+from galleries.images_providers.packed_shards_images_provider import PackedShardsImagesProvider, pack_images
+
+
+class PackedShardsImagesProviderTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.images_directory = os.path.join(self.directory, "images")
+        os.makedirs(self.images_directory)
+        for i in range(10):
+            image = np.full((64, 48, 3), i * 20, dtype=np.uint8)
+            cv.imwrite(os.path.join(self.images_directory, f"person{i}-{i % 2}.png"), image)
+        self.local_provider = LocalFilesImageProvider(self.images_directory)
+        index_path = pack_images(self.local_provider.get_indices(), self.directory, shard_size=500)
+        self.provider = PackedShardsImagesProvider(index_path)
+
+    def tearDown(self) -> None:
+        self.provider.release()
+        shutil.rmtree(self.directory)
+
+    def test_packed_images_are_the_same_as_local_images(self):
+        # arrange
+        indices = sorted(self.local_provider.get_indices())
+
+        # act
+        packed_indices = sorted(self.provider.get_indices())
+
+        # assert
+        self.assertListEqual(indices, packed_indices)
+        self.assertGreater(len(os.listdir(self.directory)), 3)
+        for index in indices:
+            np.testing.assert_array_equal(
+                self.local_provider.get_image_by_index(index), self.provider.get_image_by_index(index))
+
+    def test_annotations_parsers_work_with_packed_indices(self):
+        # arrange
+        gallery = Gallery("packed", self.provider, FileNameSepParser(["name", "group"]))
+
+        # act
+        indices_annots = list(gallery.get_indices_annots())
+
+        # assert
+        self.assertEqual(10, len(indices_annots))
+        for index, annotations in indices_annots:
+            self.assertEqual(os.path.basename(index).split("-")[0], annotations["name"])
+
+    def test_decode_options_are_applied(self):
+        # arrange
+        index = next(self.provider.get_indices())
+
+        # act
+        image = self.provider.get_image_by_index_with_options(index, DecodeOptions(size=(24, 32), grayscale=True))
+
+        # assert
+        self.assertTupleEqual((32, 24), image.shape)
+
+
+if __name__ == '__main__':
+    unittest.main()
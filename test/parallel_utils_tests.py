@@ -0,0 +1,58 @@
+import threading
+import time
+import unittest
+
+from galleries.parallel_utils import ordered_parallel_map
+
+
+class OrderedParallelMapTests(unittest.TestCase):
+
+    def test_results_are_in_input_order(self):
+        # arrange
+        def slow_identity(x):
+            time.sleep(0.001 * (10 - x % 10))
+            return x
+
+        # act
+        results = list(ordered_parallel_map(slow_identity, range(50), workers=4))
+
+        # assert
+        self.assertEqual(list(range(50)), results)
+
+    def test_prefetch_bounds_items_in_flight(self):
+        # arrange
+        lock = threading.Lock()
+        submitted = []
+
+        def record(x):
+            with lock:
+                submitted.append(x)
+            return x
+
+        # act
+        results = ordered_parallel_map(record, range(100), workers=2, prefetch=3)
+        first = next(results)
+        time.sleep(0.05)
+
+        # assert
+        self.assertEqual(0, first)
+        self.assertLessEqual(len(submitted), 4)
+        results.close()
+
+    def test_single_worker_runs_in_calling_thread(self):
+        # arrange
+        thread_ids = set()
+
+        def record_thread(x):
+            thread_ids.add(threading.get_ident())
+            return x
+
+        # act
+        list(ordered_parallel_map(record_thread, range(10), workers=1))
+
+        # assert
+        self.assertEqual({threading.get_ident()}, thread_ids)
+
+
+if __name__ == '__main__':
+    unittest.main()
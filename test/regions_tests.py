@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import cv2 as cv
+import numpy as np
+
+from galleries.images_providers.decode_options import DecodeOptions
+from galleries.images_providers.local_files_image_providers import LocalFilesImageProvider
+from galleries.images_providers.regions import crop_image, tifffile
+from test.test_utils import TestGallery, write_jpeg_with_orientation
+
+
+class ImageRegionsTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        image = np.zeros((800, 1200, 3), dtype=np.uint8)
+        cv.rectangle(image, (400, 200), (800, 600), (30, 200, 90), -1)
+        self.jpeg_path = os.path.join(self.directory, "image.jpg")
+        self.png_path = os.path.join(self.directory, "image.png")
+        cv.imwrite(self.jpeg_path, image)
+        cv.imwrite(self.png_path, image)
+        self.provider = LocalFilesImageProvider(self.directory)
+        self.bboxes = [(350, 150, 400, 400), (1000, 700, 400, 400)]
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory)
+
+    def test_regions_are_the_same_as_cropping_the_image(self):
+        # arrange
+        image = cv.imread(self.png_path)
+
+        # act
+        regions = self.provider.get_image_regions(self.png_path, self.bboxes)
+
+        # assert
+        np.testing.assert_array_equal(image[150:550, 350:750], regions[0])
+        np.testing.assert_array_equal(image[700:800, 1000:1200], regions[1])
+
+    def test_reduced_jpeg_regions_are_similar_to_resized_crops(self):
+        # arrange
+        options = DecodeOptions(size=(100, 100))
+        image = cv.imread(self.jpeg_path)
+        expected = cv.resize(crop_image(image, self.bboxes[0]), (100, 100), interpolation=cv.INTER_AREA)
+
+        # act
+        region = self.provider.get_image_region(self.jpeg_path, self.bboxes[0], options)
+
+        # assert
+        self.assertTupleEqual((100, 100, 3), region.shape)
+        self.assertLess(np.abs(region.astype(int) - expected.astype(int)).mean(), 4)
+
+    def test_regions_of_rotated_jpeg_are_in_rotated_coordinates(self):
+        # arrange
+        path = os.path.join(self.directory, "rotated.jpg")
+        image = np.zeros((400, 1200, 3), dtype=np.uint8)
+        cv.rectangle(image, (100, 100), (300, 300), (30, 200, 90), -1)
+        write_jpeg_with_orientation(path, image, 6)
+        rotated = cv.imread(path)
+        bbox = (0, 800, 400, 400)
+        expected = cv.resize(crop_image(rotated, bbox), (100, 100), interpolation=cv.INTER_AREA)
+
+        # act
+        region = self.provider.get_image_region(path, bbox, DecodeOptions(size=(100, 100)))
+
+        # assert
+        self.assertTupleEqual((1200, 400, 3), rotated.shape)
+        self.assertTupleEqual((100, 100, 3), region.shape)
+        self.assertLess(np.abs(region.astype(int) - expected.astype(int)).mean(), 4)
+
+    @unittest.skipIf(tifffile is None, "tifffile and zarr are not installed")
+    def test_tiled_tiff_regions_are_the_same_as_cropping_the_image(self):
+        # arrange
+        path = os.path.join(self.directory, "image.tif")
+        image = cv.imread(self.png_path)
+        image[::7, ::5] = (10, 20, 30)
+        tifffile.imwrite(path, cv.cvtColor(image, cv.COLOR_BGR2RGB), tile=(64, 64), photometric='rgb')
+
+        # act
+        regions = self.provider.get_image_regions(path, self.bboxes)
+
+        # assert
+        np.testing.assert_array_equal(image[150:550, 350:750], regions[0])
+        np.testing.assert_array_equal(image[700:800, 1000:1200], regions[1])
+
+    def test_batched_regions_are_in_order(self):
+        # arrange
+        gallery = TestGallery(cant_images=10)
+        indices_bboxes = [(index, [(0, 0, 2, 2), (4, 4, 2, 2)]) for index in range(10)]
+
+        # act
+        regions = list(gallery.get_images_regions(indices_bboxes, workers=3))
+
+        # assert
+        for index, image_regions in enumerate(regions):
+            image = gallery.get_image_by_index(index)
+            np.testing.assert_array_equal(image[:2, :2], image_regions[0])
+            np.testing.assert_array_equal(image[4:6, 4:6], image_regions[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+import collections
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from galleries.annotations_filtering import ComparisonType
+from galleries.annotations_filtering.filter import FilterStatement
+from galleries.annotations_index import AnnotationsIndex
+from galleries.annotations_parsers.file_name_parser import FileNameSepParser
+from galleries.gallery import Gallery
+from galleries.images_providers.local_files_image_providers import LocalFilesImageProvider
+from galleries.sampling import reservoir_sample, select_positions
+from galleries.sharding import stable_hash
+from galleries.sql.queries.data_retriever import SqlDataRetriever
+from test.test_utils import NotParsingParser
+
+
+class SamplingTests(unittest.TestCase):
+
+    def test_reservoir_sample_is_deterministic_with_seed(self):
+        # act
+        first = reservoir_sample(range(10000), 50, seed=1)
+        second = reservoir_sample(iter(range(10000)), 50, seed=1)
+
+        # assert
+        self.assertListEqual(first, second)
+        self.assertEqual(50, len(set(first)))
+        self.assertTrue(all(0 <= item < 10000 for item in first))
+
+    def test_reservoir_sample_returns_all_items_if_there_are_fewer(self):
+        # act
+        sample = reservoir_sample(range(5), 10, seed=1)
+
+        # assert
+        self.assertListEqual([0, 1, 2, 3, 4], sorted(sample))
+
+    def test_reservoir_sample_is_uniform(self):
+        # act
+        counts = collections.Counter()
+        for seed in range(2000):
+            counts.update(reservoir_sample(range(20), 5, seed=seed))
+
+        # assert
+        # each item is expected 500 times
+        self.assertTrue(all(400 < counts[item] < 600 for item in range(20)), counts)
+
+    def test_select_positions_keeps_positions_order(self):
+        # act
+        selected = select_positions("abcdef", [4, 1, 9])
+
+        # assert
+        self.assertListEqual(["e", "b"], selected)
+
+
+class GallerySampleTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        for i in range(30):
+            open(os.path.join(self.directory, f"{i}-{'F' if i % 3 == 0 else 'M'}.jpg"), "w").close()
+        self.filters = [[FilterStatement("sex", ComparisonType.EQUAL, "F", False)]]
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory)
+
+    def test_sample_without_filters_does_not_parse_annotations(self):
+        # arrange
+        gallery = Gallery("test", LocalFilesImageProvider(self.directory), NotParsingParser(["name", "sex"]))
+
+        # act
+        sample = gallery.sample(5, seed=2)
+
+        # assert
+        self.assertEqual(5, len(set(sample)))
+        self.assertListEqual(sample, gallery.sample(5, seed=2))
+        self.assertTrue(set(sample).issubset(gallery.get_indices()))
+
+    def test_sample_without_filters_lists_the_images_once(self):
+        # arrange
+        provider = LocalFilesImageProvider(self.directory)
+        listings = []
+        get_indices = provider.get_indices
+        provider.get_indices = lambda: listings.append(1) or get_indices()
+        gallery = Gallery("test", provider, NotParsingParser(["name", "sex"]))
+
+        # act
+        sample = gallery.sample(5, seed=2)
+
+        # assert
+        self.assertEqual(5, len(set(sample)))
+        self.assertEqual(1, len(listings))
+
+    def test_sample_with_filters(self):
+        # arrange
+        gallery = Gallery("test", LocalFilesImageProvider(self.directory), FileNameSepParser(["name", "sex"]))
+
+        # act
+        sample = gallery.sample(20, self.filters, seed=2)
+
+        # assert
+        self.assertListEqual(sorted(gallery.get_indices(self.filters)), sorted(sample))
+
+    def test_sample_with_annotations_index(self):
+        # arrange
+        index = AnnotationsIndex(os.path.join(self.directory, "annotations.db"))
+        gallery = Gallery("test", LocalFilesImageProvider(self.directory), FileNameSepParser(["name", "sex"]), index)
+
+        # act
+        sample = gallery.sample(4, self.filters, seed=2)
+
+        # assert
+        self.assertEqual(4, len(set(sample)))
+        self.assertTrue(all(index.endswith("-F.jpg") for index in sample))
+        index.close()
+
+
+class SqlSampleTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.connection = sqlite3.connect(":memory:")
+        # as SqliteConnector does
+        self.connection.create_function("stable_hash", 2, stable_hash, deterministic=True)
+        self.cursor = self.connection.cursor()
+        self.cursor.execute("CREATE TABLE Images (path TEXT, sex TEXT)")
+        self.rows = [(f"/images/{i}.jpg", "F" if i % 2 == 0 else "M") for i in range(1000)]
+        self.cursor.executemany("INSERT INTO Images VALUES (?, ?)", self.rows)
+
+    def tearDown(self) -> None:
+        self.connection.close()
+
+    def _sample_rows(self, n, seed, filters=None):
+        return SqlDataRetriever.sample_rows(
+            self.cursor, n, seed, "path", "Images", filters, {"sex": "sex"}, {"sex": str}, None)
+
+    def test_sample_rows_are_the_lowest_hashes(self):
+        # arrange
+        filters = [[FilterStatement("sex", ComparisonType.EQUAL, "F", False)]]
+        female_paths = [path for path, sex in self.rows if sex == "F"]
+
+        # act
+        sample = self._sample_rows(10, 5, filters)
+
+        # assert
+        expected = sorted(female_paths, key=lambda path: stable_hash(path, 5))[:10]
+        self.assertListEqual(expected, sample)
+
+    def test_sample_rows_does_not_modify_contains_statements(self):
+        # arrange
+        statement = FilterStatement("path", ComparisonType.CONTAINS, "/1", False)
+
+        # act
+        sample = SqlDataRetriever.sample_rows(
+            self.cursor, 5, 5, "path", "Images", [[statement]], {"path": "path"}, {"path": str}, None)
+
+        # assert
+        self.assertEqual(5, len(sample))
+        self.assertTrue(all("/1" in path for path in sample))
+        self.assertEqual("/1", statement.filter_value)
+
+    def test_sample_rows_returns_all_rows_if_there_are_fewer(self):
+        # act
+        sample = self._sample_rows(2000, 5)
+
+        # assert
+        self.assertListEqual(sorted(path for path, _ in self.rows), sorted(sample))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import io
+import pickle
+import unittest
+
+import numpy as np
+
+from galleries.data_read_write import serialization
+
+
+class SerializationTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.record = ("image.jpg", {"features": np.arange(100, dtype=np.float32), "label": "a"})
+
+    def test_loads_returns_same_record(self):
+        # arrange
+        data = serialization.dumps(self.record)
+
+        # act
+        index, value = serialization.loads(data)
+
+        # assert
+        self.assertEqual(self.record[0], index)
+        self.assertEqual("a", value["label"])
+        self.assertTrue(np.array_equal(self.record[1]["features"], value["features"]))
+
+    def test_loaded_arrays_are_views_over_data(self):
+        # arrange
+        data = bytearray(serialization.dumps(self.record))
+
+        # act
+        _, value = serialization.loads(data)
+        data[-4:] = bytes(4)  # last float of the features
+
+        # assert
+        self.assertEqual(0, value["features"][-1])
+
+    def test_load_reads_mixed_pickled_records_and_frames(self):
+        # arrange
+        file = io.BytesIO()
+        pickle.dump(("first", 1), file)
+        serialization.dump(self.record, file)
+        pickle.dump(("last", 2), file)
+        file.seek(0)
+
+        # act
+        records = [serialization.load(file, file.getbuffer()) for _ in range(3)]
+
+        # assert
+        self.assertEqual(["first", "image.jpg", "last"], [index for index, _ in records])
+        self.assertRaises(EOFError, serialization.load, file)
+
+
+if __name__ == '__main__':
+    unittest.main()
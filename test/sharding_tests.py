@@ -0,0 +1,119 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from galleries.annotations_filtering import ComparisonType
+from galleries.annotations_filtering.filter import FilterStatement
+from galleries.gallery import Gallery
+from galleries.images_providers.local_files_image_providers import LocalFilesImageProvider
+from galleries.sharding import shard_indices, stable_hash
+from galleries.sql.queries.data_retriever import SqlDataRetriever
+from test.test_utils import CountingParser, TestGallery
+
+
+class ShardIndicesTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.indices = [f"/images/{i}.jpg" for i in range(1000)]
+
+    def test_shards_are_a_partition(self):
+        # act
+        shards = [list(shard_indices(self.indices, shard, 4)) for shard in range(4)]
+
+        # assert
+        all_indices = [index for shard in shards for index in shard]
+        self.assertListEqual(sorted(self.indices), sorted(all_indices))
+        for shard in shards:
+            self.assertGreater(len(shard), 200)
+            self.assertListEqual([index for index in self.indices if index in set(shard)], shard)
+
+    def test_seed_shuffles_deterministically(self):
+        # act
+        first = list(shard_indices(self.indices, 1, 4, seed=7))
+        second = list(shard_indices(self.indices, 1, 4, seed=7))
+        other_epoch = list(shard_indices(self.indices, 1, 4, seed=8))
+        seeded_shards = [index for shard in range(4) for index in shard_indices(self.indices, shard, 4, seed=7)]
+
+        # assert
+        self.assertListEqual(first, second)
+        self.assertNotEqual(first, other_epoch)
+        self.assertNotEqual(sorted(first, key=self.indices.index), first)
+        self.assertListEqual(sorted(self.indices), sorted(seeded_shards))
+
+    def test_invalid_shard_raises(self):
+        # act & assert
+        with self.assertRaises(ValueError):
+            list(shard_indices(self.indices, 4, 4))
+
+
+class GalleryShardingTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        for i in range(20):
+            open(os.path.join(self.directory, f"{i}-{'F' if i % 2 == 0 else 'M'}.jpg"), "w").close()
+        self.parser = CountingParser(["name", "sex"])
+        self.gallery = Gallery("test", LocalFilesImageProvider(self.directory), self.parser)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory)
+
+    def test_only_the_shard_annotations_are_parsed(self):
+        # arrange
+        filters = [[FilterStatement("sex", ComparisonType.EQUAL, "F", False)]]
+
+        # act
+        indices = list(self.gallery.get_indices_shard(0, 3, filters=filters))
+
+        # assert
+        shard = list(shard_indices(self.gallery.get_indices(), 0, 3))
+        self.assertListEqual(shard, self.parser.parsed)
+        self.assertListEqual([index for index in shard if index.endswith("-F.jpg")], indices)
+
+    def test_gallery_without_own_sharding_is_sharded_by_default(self):
+        # arrange
+        gallery = TestGallery(cant_images=100)
+
+        # act
+        indices = list(gallery.get_indices_shard(1, 3, seed=4))
+        all_indices = list(gallery.get_indices())
+
+        # assert
+        self.assertListEqual(list(shard_indices(range(100), 1, 3, 4)), indices)
+        self.assertListEqual(list(range(100)), all_indices)
+
+
+class SqlShardingTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.connection = sqlite3.connect(":memory:")
+        # as SqliteConnector does
+        self.connection.create_function("stable_hash", 2, stable_hash, deterministic=True)
+        self.cursor = self.connection.cursor()
+        self.cursor.execute("CREATE TABLE Images (path TEXT)")
+        self.indices = [f"/images/{i}.jpg" for i in range(100)]
+        self.cursor.executemany("INSERT INTO Images VALUES (?)", [[index] for index in self.indices])
+
+    def tearDown(self) -> None:
+        self.connection.close()
+
+    def test_shard_statement_selects_the_same_shard(self):
+        # arrange
+        seed = 3
+        condition, arguments = SqlDataRetriever.get_shard_statement("stable_hash(path, ?)", 2, 5)
+
+        # act
+        self.cursor.execute(
+            f"SELECT path FROM Images WHERE {condition} ORDER BY stable_hash(path, ?)",
+            [seed] + arguments + [seed]
+        )
+        indices = [index for index, in self.cursor.fetchall()]
+
+        # assert
+        self.assertListEqual(list(shard_indices(self.indices, 2, 5, seed)), indices)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+
+import numpy as np
+
+from galleries.images_providers.decode_options import fit_image
+from galleries.shared_memory_batches import SharedMemoryBatchIterator
+from test.test_utils import TestGallery
+
+
+class SharedMemoryBatchIteratorTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.gallery = TestGallery(cant_images=50)
+        self.image_shape = (4, 4, 3)
+
+    def test_batches_are_the_same_as_serial_loading(self):
+        # arrange
+        indices = list(self.gallery.get_indices())
+        expected = [fit_image(self.gallery.get_image_by_index(index), self.image_shape) for index in indices]
+
+        # act
+        images = []
+        batches_indices = []
+        with SharedMemoryBatchIterator(self.gallery, indices, 16, self.image_shape, workers=2) as batches:
+            for batch, batch_indices in batches:
+                images.extend(batch.copy())
+                batches_indices.append(batch_indices)
+
+        # assert
+        self.assertListEqual([16, 16, 16, 2], [len(batch_indices) for batch_indices in batches_indices])
+        self.assertListEqual(indices, [index for batch_indices in batches_indices for index in batch_indices])
+        np.testing.assert_array_equal(np.stack(expected), np.stack(images))
+
+    def test_fit_image_converts_grayscale_to_color(self):
+        # arrange
+        image = np.arange(16, dtype=np.uint8).reshape((4, 4))
+
+        # act
+        fitted = fit_image(image, (4, 4, 3))
+
+        # assert
+        self.assertTupleEqual((4, 4, 3), fitted.shape)
+        np.testing.assert_array_equal(image, fitted[..., 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,11 @@
+import glob
 import os
+import shutil
+import tempfile
 import unittest
 
 from galleries.collections.stream_dictionary import StreamDictionary
-from galleries.data_read_write import PickleDataReaderWriter
+from galleries.data_read_write import PickleDataReaderWriter, SqliteDataReaderWriter
 
 
 class StreamDictionaryTests(unittest.TestCase):
@@ -17,8 +20,8 @@ class StreamDictionaryTests(unittest.TestCase):
 
     def tearDown(self) -> None:
         self.default_rw.release()
-        if os.path.exists(self.file_path):
-            os.remove(self.file_path)
+        for path in glob.glob(f"{self.file_path}*"):
+            os.remove(path)
 
     def _generator_provider(self):
         return self.default_rw.read_all_data()
@@ -76,6 +79,49 @@ class StreamDictionaryTests(unittest.TestCase):
         for i in not_existent_indices:
             self.assertRaises(KeyError, self.fsd.__getitem__, i)
 
+    def test_key_filter_rejection_doesnt_read_stream(self):
+        # arrange
+        read_keys = []
+
+        def generator_provider():
+            for key, value in self._generator_provider():
+                read_keys.append(key)
+                yield key, value
+
+        sd = StreamDictionary(generator_provider, self.batch_size, key_filter=lambda key: key >= 0)
+
+        # act
+        _, success = sd.try_get_item(-1)
+
+        # assert
+        self.assertFalse(success)
+        self.assertEqual(0, len(read_keys))
+
+
+class SqliteStreamDictionaryTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.rw = SqliteDataReaderWriter(None, "", os.path.join(self.directory, "data.db"))
+        self.test_data = {k: str(k) for k in range(100)}
+        self.rw.write_data(self.test_data.items())
+
+    def tearDown(self) -> None:
+        self.rw.release()
+        shutil.rmtree(self.directory)
+
+    def test_may_contain_as_key_filter_while_streaming(self):
+        # arrange
+        sd = StreamDictionary(self.rw.read_all_data, 5, key_filter=self.rw.may_contain)
+
+        # act
+        values = [sd[i] for i in range(100)]
+        _, success = sd.try_get_item(1000)
+
+        # assert
+        self.assertListEqual([str(i) for i in range(100)], values)
+        self.assertFalse(success)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,9 +1,12 @@
 import random
+import struct
 from typing import Dict, Optional, Any, List
 
+import cv2 as cv
 import numpy as np
 
 from galleries.annotations_filtering.filter import FilterStatement
+from galleries.annotations_parsers.file_name_parser import FileNameSepParser
 from galleries.igallery import IGallery
 
 
@@ -35,3 +38,27 @@ class TestGallery(IGallery):
 
     def get_discrete_annotations_values(self) -> Dict[str, list]:
         return {}
+
+
+def write_jpeg_with_orientation(path: str, image: np.ndarray, orientation: int):
+    _, encoded = cv.imencode('.jpg', image, [cv.IMWRITE_JPEG_QUALITY, 100])
+    data = encoded.tobytes()
+    tiff = b'II*\x00' + struct.pack('<IH', 8, 1) + struct.pack('<HHIHH', 0x0112, 3, 1, orientation, 0) + b'\x00' * 4
+    exif = b'Exif\x00\x00' + tiff
+    with open(path, 'wb') as file:
+        file.write(data[:2] + b'\xff\xe1' + struct.pack('>H', len(exif) + 2) + exif + data[2:])
+
+
+class CountingParser(FileNameSepParser):
+    def __init__(self, annot_names=None, sep='-'):
+        super().__init__(annot_names, sep)
+        self.parsed = []
+
+    def get_annotations_by_image_index(self, img_index: str) -> dict:
+        self.parsed.append(img_index)
+        return super().get_annotations_by_image_index(img_index)
+
+
+class NotParsingParser(FileNameSepParser):
+    def get_annotations_by_image_index(self, img_index: str) -> dict:
+        raise AssertionError("annotations must not be parsed")